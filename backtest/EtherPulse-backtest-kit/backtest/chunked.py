@@ -0,0 +1,153 @@
+"""
+backtest/chunked.py
+Backtest a blocchi (out-of-core) per storici 1m pluriennali: python -m backtest.run ... --chunk-days N.
+Il CSV 1m viene letto a blocchi di righe e spezzato in slice di N giorni (confini allineati alla
+griglia delle barre --tf dell'intero CSV); per ogni slice resample, feature, decisioni e simulazione
+come in run.py, con lo stato che passa alla slice successiva:
+- coda di barre delle slice precedenti (giorni interi, >= finestra 7d dell'OI, Donchian, ATR, conferme
+  dei break) anteposta alla slice: finestre rolling, VWAP del giorno, pivot del giorno prima e macchina
+  a stati dei break vedono la stessa storia del run in memoria; le righe della coda poi si scartano
+- CVD cumulato e ultimi cvd_window valori (CvdSlope): stessa somma sequenziale di compute_cvd
+- posizione aperta (sim.Simulator): l'uscita si cerca nelle slice successive
+Funding, OI, top-trader ratio e on-chain (serie lente, piccole) restano intere in memoria.
+Picco di memoria ~ una slice + coda, indipendente dalla lunghezza dello storico; risultati uguali
+al run in memoria (ATR a meno dell'arrotondamento della media mobile di pandas).
+"""
+import math, os
+from itertools import chain
+import numpy as np
+import pandas as pd
+from pandas.tseries.frequencies import to_offset
+
+from backtest.features import (iter_klines_csv, resample_to, enrich_features, bar_delta, infer_tf_minutes,
+                               load_funding_csv, load_oi_csv, load_onchain, load_top_ratio, load_trade_flow)
+from backtest.sim import Simulator, atr, bar_path, intrabar_path
+from backtest.run import decide_frame, feature_key, sides_from, date_range_ms, save_run, save_comparison
+
+ATR_N = 14
+OI_WINDOW_DAYS = 7
+
+class CvdSlope:
+    """compute_cvd a blocchi: CVD cumulato e ultimi `window` valori portati tra le slice."""
+    def __init__(self, window: int):
+        self.window = int(window)
+        self.last = 0.0
+        self.hist = np.empty(0)
+
+    def step(self, delta: np.ndarray) -> np.ndarray:
+        w = self.window
+        cvd = np.cumsum(np.concatenate(([self.last], np.asarray(delta, dtype=float))))[1:]
+        full = np.concatenate((self.hist, cvd))
+        prev = np.arange(len(self.hist), len(full)) - w
+        slope = np.where(prev >= 0, (cvd - full[np.maximum(prev, 0)]) / w, 0.0)
+        slope[np.isnan(slope)] = 0.0   # come fillna(0.0)
+        if len(cvd):
+            self.last = float(cvd[-1])
+        self.hist = full[-w:]
+        return slope
+
+def iter_slices(path: str, tf: str, start: str, end: str, days: int, rows: int = 200_000):
+    """
+    (origine della griglia, 1m della slice) per slice di ~`days` giorni su [start, end]: le barre
+    --tf che cadono in [start, end] (come resample_to(...).loc[start:end] sul CSV intero), mai
+    spezzate tra due slice.
+    """
+    parts = iter_klines_csv(path, rows)
+    first = next(parts, None)
+    if first is None or first.empty:
+        return
+    origin = first.index[0].floor("D")   # resample_to: origin "start_day" del CSV intero
+    step = pd.Timedelta(to_offset(tf)).value
+
+    def align(t: pd.Timestamp) -> pd.Timestamp:
+        return origin + pd.Timedelta(-(-(t - origin).value // step) * step, unit="ns")
+
+    t0_ms, t1_ms = date_range_ms(start, end)
+    lo = align(pd.Timestamp(t0_ms, unit="ms", tz="UTC"))
+    hi = align(pd.Timestamp(t1_ms, unit="ms", tz="UTC"))
+    span = pd.Timedelta(days=days)
+    bound = align(lo + span)
+    buf = []
+    for part in chain([first], parts):
+        if len(part) and part.index[0] >= hi:
+            break
+        part = part[(part.index >= lo) & (part.index < hi)]
+        while len(part):
+            cut = int(part.index.searchsorted(bound))
+            if cut:
+                buf.append(part.iloc[:cut])
+            if cut == len(part):
+                break
+            part = part.iloc[cut:]
+            if buf:
+                yield origin, pd.concat(buf)
+            buf = []
+            bound = align(bound + span)
+    if buf:
+        yield origin, pd.concat(buf)
+
+def run_chunked(args, cfgs) -> None:
+    """run.main con --chunk-days: stessi argomenti e stessi file di output."""
+    data, sym = args.data, args.symbol
+    fund = load_funding_csv(os.path.join(data, f"binance_funding_{sym}.csv")).loc[:args.end]
+    oi = load_oi_csv(os.path.join(data, f"binance_oi_hist_{sym}_1h.csv")).loc[:args.end]
+    onchain = load_onchain(data, sym) if args.with_onchain else None
+    top_ratio = load_top_ratio(data, sym)
+
+    step_ms = int(pd.Timedelta(to_offset(args.tf)).value // 1_000_000)
+    keys = {feature_key(cfg) for _, cfg in cfgs}
+    windows = {label: int(cfg.get("thresholds", {}).get("cvd_window_min", 60)) for label, cfg in cfgs}
+    tail_days = max([OI_WINDOW_DAYS] + [math.ceil(dw / 24) for mode, dw, _ in keys if mode == "donchian"]) + 1
+    sims = {label: Simulator(args.fees_bps, args.slip_bps) for label, _ in cfgs}
+    counts = {label: [0, 0] for label, _ in cfgs}
+    cvds = {w: CvdSlope(w) for w in set(windows.values())}
+    tail, tf_minutes, need_bars = None, None, ATR_N + 1
+
+    for origin, df1m in iter_slices(os.path.join(data, f"binance_klines_{sym}_1m.csv"), args.tf, args.start,
+                                    args.end, args.chunk_days):
+        bars = resample_to(df1m, args.tf, origin)
+        if bars.empty:
+            continue
+        if tf_minutes is None:   # come enrich_features sul frame intero: dalle prime due barre del run
+            tf_minutes = infer_tf_minutes(bars.index)
+            need_bars = max(need_bars, int((OI_WINDOW_DAYS * 24 * 60) / max(1, tf_minutes)),
+                            *(n + 1 for _, _, n in keys))
+        n = len(bars)
+        frame = bars if tail is None else pd.concat([tail, bars])
+        flow = None
+        if args.cvd_source == "trades":
+            flow = load_trade_flow(data, sym, args.tf, int(frame.index[0].value // 1_000_000),
+                                   int(frame.index[-1].value // 1_000_000) + step_ms)
+            if flow is None:
+                raise SystemExit(f"--cvd-source trades: nessun archivio aggTrade per {sym} in {data}")
+
+        feats_cache = {}
+        for key in keys:
+            pivot_mode, donchian_window, confirm_candles = key
+            feats_cache[key] = enrich_features(frame, fund, oi, min(cvds), pivot_mode, donchian_window, confirm_candles,
+                                               onchain, top_ratio, flow, tf_minutes).iloc[-n:]
+        any_feats = next(iter(feats_cache.values()))
+        delta = bar_delta(any_feats).to_numpy(dtype=float)
+        slopes = {w: pd.Series(c.step(delta), index=bars.index) for w, c in cvds.items()}
+        atr_v = atr(frame, ATR_N).to_numpy()[-n:]
+        path = (intrabar_path(df1m, bars.index, args.tf) if args.intrabar
+                else bar_path(bars["high"].to_numpy(), bars["low"].to_numpy()))
+
+        for label, cfg in cfgs:
+            feats = feats_cache[feature_key(cfg)]
+            dec = decide_frame(feats, cfg, cvd_slope=slopes[windows[label]])["decision"]
+            counts[label][0] += int((dec == "BUY").sum())
+            counts[label][1] += int((dec == "SELL").sum())
+            sims[label].feed(feats.index, feats["close"].to_numpy(), sides_from(dec), atr_v, path)
+
+        # coda per la slice successiva: giorni interi, almeno need_bars barre
+        keep = min((frame.index[-1] - pd.Timedelta(days=tail_days)).floor("D"),
+                   frame.index[max(0, len(frame) - need_bars)].floor("D"))
+        tail = frame.loc[keep:, list(bars.columns)]
+        print(f"{bars.index[0]} -> {bars.index[-1]}: {n} barre")
+
+    multi = len(cfgs) > 1
+    comparison = [save_run(os.path.join(args.outdir, label) if multi else args.outdir, label, sims[label].trades(),
+                           *counts[label]) for label, _ in cfgs]
+    if multi:
+        save_comparison(args.outdir, comparison)
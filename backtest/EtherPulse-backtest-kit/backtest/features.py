@@ -1,33 +1,52 @@
 
 """
 backtest/features.py
-Calcola le feature bar-by-bar (CVD, VWAP, pivot dinamici, allineamento OI/funding).
-Usa CSV generati da ingest.py.
+Calcola le feature bar-by-bar (CVD, VWAP, pivot dinamici, allineamento OI/funding, top-trader
+ratio, on-chain). Usa CSV generati da ingest.py (e, se presenti, le serie Glassnode dello store
+e l'archivio aggTrade per il CVD dai trade).
 """
+import os
+from typing import Dict, Optional
 import pandas as pd
 import numpy as np
 from datetime import datetime, timezone
 
-def load_klines_csv(path: str) -> pd.DataFrame:
-    df = pd.read_csv(path)
+from eth_signal_kit.indicators.breakout import confirm_breaks
+
+def _klines_frame(df: pd.DataFrame) -> pd.DataFrame:
     df["ts"] = pd.to_datetime(df["ts"], unit="ms", utc=True)
     df = df.sort_values("ts").set_index("ts")
     df[["open","high","low","close","volume","taker_buy_base"]] = df[["open","high","low","close","volume","taker_buy_base"]].astype(float)
     return df
 
-def resample_to(df: pd.DataFrame, tf: str) -> pd.DataFrame:
-    o = df["open"].resample(tf).first()
-    h = df["high"].resample(tf).max()
-    l = df["low"].resample(tf).min()
-    c = df["close"].resample(tf).last()
-    v = df["volume"].resample(tf).sum()
-    tb= df["taker_buy_base"].resample(tf).sum()
+def load_klines_csv(path: str) -> pd.DataFrame:
+    return _klines_frame(pd.read_csv(path))
+
+def iter_klines_csv(path: str, rows: int = 200_000):
+    """Come load_klines_csv, a blocchi di `rows` righe (CSV di ingest.py, gia' in ordine di ts)."""
+    for part in pd.read_csv(path, chunksize=rows):
+        yield _klines_frame(part)
+
+def resample_to(df: pd.DataFrame, tf: str, origin="start_day") -> pd.DataFrame:
+    # origin: inizio della griglia delle barre (backtest a blocchi: quella dell'intero CSV)
+    o = df["open"].resample(tf, origin=origin).first()
+    h = df["high"].resample(tf, origin=origin).max()
+    l = df["low"].resample(tf, origin=origin).min()
+    c = df["close"].resample(tf, origin=origin).last()
+    v = df["volume"].resample(tf, origin=origin).sum()
+    tb= df["taker_buy_base"].resample(tf, origin=origin).sum()
     out = pd.DataFrame({"open":o,"high":h,"low":l,"close":c,"volume":v,"taker_buy_base":tb}).dropna()
     return out
 
-def compute_cvd(df: pd.DataFrame, window:int) -> pd.Series:
+def bar_delta(df: pd.DataFrame) -> pd.Series:
+    """Delta taker per barra: dai trade (colonna trade_delta di enrich_features) se c'e', altrimenti proxy klines."""
+    if "trade_delta" in df:
+        return df["trade_delta"]
     sell = df["volume"] - df["taker_buy_base"]
-    delta = df["taker_buy_base"] - sell
+    return df["taker_buy_base"] - sell
+
+def compute_cvd(df: pd.DataFrame, window:int) -> pd.Series:
+    delta = bar_delta(df)
     cvd = delta.cumsum()
     slope = (cvd - cvd.shift(window)) / window
     return slope.fillna(0.0)
@@ -55,6 +74,118 @@ def load_oi_csv(path: str) -> pd.DataFrame:
     o["open_interest"] = o["open_interest"].astype(float)
     return o
 
+def infer_tf_minutes(index: pd.DatetimeIndex) -> int:
+    """Minuti tra le prime due barre (5 se non ricavabile): base della finestra 7d dell'OI."""
+    try:
+        return int(pd.Timedelta(index[1] - index[0]).total_seconds() // 60)
+    except Exception:
+        return 5
+
+def load_onchain(data_dir: str, symbol: str, resolution: str = "24h") -> Optional[Dict[str, pd.Series]]:
+    """
+    Serie Glassnode salvate nello store (python -m eth_signal_kit.data_sources.glassnode --out <data_dir>)
+    per l'asset del simbolo: {metrica: Series indicizzata per ts}; None se non ce ne sono.
+    """
+    from eth_signal_kit.data_sources.glassnode import METRICS, asset_for
+    out = {}
+    for name in METRICS:
+        path = os.path.join(data_dir, f"glassnode_{name}_{asset_for(symbol)}_{resolution}.csv")
+        if os.path.exists(path):
+            s = pd.read_csv(path)
+            s["ts"] = pd.to_datetime(s["ts"], unit="ms", utc=True)
+            out[name] = s.sort_values("ts").set_index("ts")["value"].astype(float)
+    return out or None
+
+def add_onchain(out: pd.DataFrame, onchain: Dict[str, pd.Series], resolution: str = "24h") -> None:
+    """
+    Colonne on-chain allineate alle barre, con le definizioni di glassnode.summarize: netflow
+    exchange 1d/7d (somma di 7 punti), indirizzi whale e variazione % a 7 punti. Un punto diventa
+    visibile a intervallo chiuso (ts + risoluzione), poi ffill; prima dei dati NaN (regole spente).
+    """
+    from eth_signal_kit.data_sources.glassnode import RESOLUTIONS
+    step = pd.Timedelta(seconds=RESOLUTIONS[resolution])
+    cols = {}
+    if "exchange_netflow" in onchain:
+        nf = onchain["exchange_netflow"]
+        cols["exchange_netflow_1d"] = nf
+        cols["exchange_netflow_7d"] = nf.rolling(7, min_periods=7).sum()
+    if "whale_addresses" in onchain:
+        wa = onchain["whale_addresses"]
+        prev = wa.shift(7)
+        cols["whale_addresses"] = wa
+        cols["whale_addresses_chg_7d_pct"] = ((wa - prev) / prev * 100.0).where(prev > 0)
+    for name, s in cols.items():
+        s = s.copy()
+        s.index = s.index + step
+        out[name] = s.reindex(out.index, method="ffill")
+
+def load_top_ratio(data_dir: str, symbol: str, source: str = "account", period: str = "4h") -> Optional[pd.Series]:
+    """Top-trader long/short ratio di ingest.py (binance_top_ls_<source>_<SYMBOL>_<period>.csv); None se assente."""
+    path = os.path.join(data_dir, f"binance_top_ls_{source}_{symbol}_{period}.csv")
+    if not os.path.exists(path):
+        return None
+    s = pd.read_csv(path)
+    s["ts"] = pd.to_datetime(s["ts"], unit="ms", utc=True)
+    return s.sort_values("ts").set_index("ts")["value"].astype(float)
+
+def whales_ratio_change(ratio: pd.Series, points: Optional[int] = None) -> pd.Series:
+    """
+    Variazione % del fallback whales live (pipeline: ultimi `points` punti, (ultimo - primo) / primo,
+    0 se primo <= 0) calcolata per ogni punto della serie. Nei primi punti la finestra e' piu'
+    corta, come l'API con meno storia; NaN sul primo punto (il live chiede almeno 2 punti).
+    """
+    from eth_signal_kit.engine import WHALES_RATIO_POINTS
+    points = int(points or WHALES_RATIO_POINTS)
+    v = ratio.to_numpy(dtype=float)
+    first = v[np.maximum(np.arange(len(v)) - (points - 1), 0)]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        chg = np.where(first > 0, (v - first) / first * 100.0, 0.0)
+    chg[:1] = np.nan
+    return pd.Series(chg, index=ratio.index)
+
+def whales_signal(chg, min_change: float):
+    """
+    whales_net_selling_7d da whales_ratio_chg_pct e thresholds.whales_ratio_min_change_pct:
+    1.0 net selling, 0.0 net buying, NaN nessun segnale (variazione sotto soglia o assente).
+    Vettoriale (array) o scalare.
+    """
+    chg = np.asarray(chg, dtype=float)
+    with np.errstate(invalid="ignore"):
+        return np.where(np.abs(chg) >= float(min_change), (chg < 0).astype(float), np.nan)
+
+def tf_ms(tf: str) -> int:
+    """Alias pandas del timeframe (5T, 15min, 1H) -> millisecondi."""
+    return int(pd.tseries.frequencies.to_offset(tf).nanos // 1_000_000)
+
+def load_trade_flow(data_dir: str, symbol: str, tf: str, start_ms: Optional[int] = None,
+                    end_ms: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """
+    Volume taker buy/sell per barra `tf` dall'archivio aggTrade (python -m
+    eth_signal_kit.data_sources.aggtrades --out <data_dir>), letto un chunk alla volta su
+    [start_ms, end_ms): anche mesi di trade senza caricarli in RAM. None se l'archivio non c'e'.
+    """
+    from eth_signal_kit.data_sources.aggtrades import Archive
+    from eth_signal_kit.indicators.cvd import trade_flow
+    archive = Archive(data_dir, symbol)
+    if not archive.days():
+        return None
+    return trade_flow(archive.iter_chunks(start_ms, end_ms), tf_ms(tf))
+
+def load_bars(data_dir: str, symbol: str, spec: str, start_ms: Optional[int] = None,
+                end_ms: Optional[int] = None) -> Optional[pd.DataFrame]:
+    """
+    Barre volume/dollar/imbalance (`spec` come "volume:500", indicators.bars) dall'archivio
+    aggTrade su [start_ms, end_ms), con le colonne di resample_to: si usano al posto del
+    timeframe a tempo in enrich_features e nel simulatore. None se l'archivio non c'e'.
+    """
+    from eth_signal_kit.data_sources.aggtrades import Archive
+    from eth_signal_kit.indicators.bars import build_bars, parse_spec
+    archive = Archive(data_dir, symbol)
+    if not archive.days():
+        return None
+    kind, threshold = parse_spec(spec)
+    return build_bars(archive.iter_chunks(start_ms, end_ms), kind, threshold)
+
 def add_pivots_floor(df_tf: pd.DataFrame, df_daily: pd.DataFrame) -> pd.DataFrame:
     # pivots calcolati dalla daily precedente, poi ffill sul timeframe operativo
     daily = df_daily.copy()
@@ -80,8 +211,27 @@ def enrich_features(df_tf: pd.DataFrame,
                     oi: pd.DataFrame,
                     cvd_window:int,
                     pivot_mode:str="floor",
-                    donchian_window:int=55) -> pd.DataFrame:
+                    donchian_window:int=55,
+                    confirm_candles:int=1,
+                    onchain: Optional[Dict[str, pd.Series]] = None,
+                    top_ratio: Optional[pd.Series] = None,
+                    trade_flow: Optional[pd.DataFrame] = None,
+                    tf_minutes: Optional[int] = None) -> pd.DataFrame:
+    """
+    confirm_candles = thresholds.breakout_confirm_candles: i break di pivot e VWAP scattano
+    dopo N chiusure oltre il livello (stessa macchina a stati del live, vedi
+    eth_signal_kit/indicators/breakout.py); 1 = cross singola barra.
+    onchain: serie di load_onchain -> colonne exchange_netflow_*, whale_addresses* (add_onchain).
+    top_ratio: serie di load_top_ratio -> colonna whales_ratio_chg_pct (punto visibile dal suo ts,
+    come nell'API; il segnale dipende dalla soglia del config: whales_signal, in decide_frame).
+    trade_flow: volume per barra di load_trade_flow -> colonna trade_delta (CVD dai trade); le
+    barre non coperte dall'archivio usano il proxy delle klines.
+    tf_minutes: durata delle barre per la finestra 7d dell'OI (default: dalle prime due barre).
+    """
     out = df_tf.copy()
+    if trade_flow is not None:
+        proxy = 2.0 * out["taker_buy_base"] - out["volume"]
+        out["trade_delta"] = trade_flow["delta"].reindex(out.index).fillna(proxy)
 
     # CVD slope
     out["cvd_slope"] = compute_cvd(out, cvd_window)
@@ -98,38 +248,46 @@ def enrich_features(df_tf: pd.DataFrame,
     oi_tf = oi["open_interest"].reindex(out.index, method="ffill").fillna(method="ffill")
     out["oi"] = oi_tf
     # rolling 7d max/min su base 1h ffillata sul tf target: approx accettabile
-    # Per robustezza usiamo 7*24*60 / tf_min come finestra in bar
-    tf_minutes = 5
-    try:
-        # infer frequency if possible
-        tf_minutes = int(pd.Timedelta(out.index[1] - out.index[0]).total_seconds() // 60)
-    except Exception:
-        pass
-    window_bars = int((7*24*60) / max(1, tf_minutes))
-    out["oi_max_7d"] = oi_tf.rolling(window_bars, min_periods=1).max()
-    out["oi_min_7d"] = oi_tf.rolling(window_bars, min_periods=1).min()
+    if out.attrs.get("bars"):
+        # barre volume/dollar/imbalance (load_bars): durata variabile, finestra a tempo
+        roll = oi_tf.rolling("7D", min_periods=1)
+    else:
+        # Per robustezza usiamo 7*24*60 / tf_min come finestra in bar
+        if tf_minutes is None:
+            tf_minutes = infer_tf_minutes(out.index)
+        window_bars = int((7*24*60) / max(1, tf_minutes))
+        roll = oi_tf.rolling(window_bars, min_periods=1)
+    out["oi_max_7d"] = roll.max()
+    out["oi_min_7d"] = roll.min()
     out["oi_drop_pct"] = (out["oi_max_7d"] - oi_tf) / out["oi_max_7d"] * 100.0
     out["oi_rise_pct"] = (oi_tf - out["oi_min_7d"]) / out["oi_min_7d"] * 100.0
 
     # Pivots
+    close = out["close"].to_numpy(dtype=float)
     if pivot_mode == "floor":
         daily = out.resample("1D").agg({"open":"first","high":"max","low":"min","close":"last","volume":"sum","taker_buy_base":"sum"})
         piv = add_pivots_floor(out, daily)
         out = out.join(piv)
-        out["broke_pivot_up"] = (out["close"].shift(1) <= out["P"]) & (out["close"] > out["P"])
-        out["broke_pivot_down"] = (out["close"].shift(1) >= out["P"]) & (out["close"] < out["P"])
+        up, down = confirm_breaks(close, out["P"].to_numpy(dtype=float), confirm_candles)
+        out["broke_pivot_up"], out["broke_pivot_down"] = up, down
     elif pivot_mode == "donchian":
         h1 = out.resample("1H").agg({"open":"first","high":"max","low":"min","close":"last","volume":"sum","taker_buy_base":"sum"})
         piv = add_pivots_donchian(h1, donchian_window, out.index)
         out = out.join(piv)
-        out["broke_pivot_up"] = (out["close"].shift(1) <= out["DONCH_MID"]) & (out["close"] > out["DONCH_MID"])
-        out["broke_pivot_down"] = (out["close"].shift(1) >= out["DONCH_MID"]) & (out["close"] < out["DONCH_MID"])
+        up, down = confirm_breaks(close, out["DONCH_MID"].to_numpy(dtype=float), confirm_candles)
+        out["broke_pivot_up"], out["broke_pivot_down"] = up, down
     else:
         out["broke_pivot_up"] = False
         out["broke_pivot_down"] = False
 
     # VWAP cross
-    out["broke_vwap_up"] = (out["close"].shift(1) <= out["vwap"]) & (out["close"] > out["vwap"])
-    out["broke_vwap_down"] = (out["close"].shift(1) >= out["vwap"]) & (out["close"] < out["vwap"])
+    up, down = confirm_breaks(close, out["vwap"].to_numpy(dtype=float), confirm_candles)
+    out["broke_vwap_up"], out["broke_vwap_down"] = up, down
+
+    if top_ratio is not None and len(top_ratio):
+        out["whales_ratio_chg_pct"] = whales_ratio_change(top_ratio).reindex(out.index, method="ffill")
+
+    if onchain:
+        add_onchain(out, onchain)
 
     return out
@@ -5,16 +5,26 @@ Scarica e normalizza CSV storici da Binance Futures per ETHUSDT:
 - klines 1m (poi si può resamplare a 5m)
 - funding 8h
 - open interest 1h (rolling 7d per min/max)
+- top-trader long/short ratio 4h (account e position), incrementale: fallback whales del live
+- (opz., --aggtrades true) archivio aggTrade tick-level dai dump giornalieri di data.binance.vision
+  (CVD dai trade: run.py --cvd-source trades)
 
 Uso:
     python -m backtest.ingest --symbol ETHUSDT --start 2025-06-01 --end 2025-09-30 --out data/
 Note:
     - Richiede internet (Binance public REST).
     - Nessuna API key necessaria.
+    - Binance conserva solo gli ultimi ~30 giorni di top-trader ratio: le serie vengono unite a
+      quelle gia' presenti in --out (store CSV ts,value), quindi lanciando l'ingest periodicamente
+      lo storico cresce oltre i 30 giorni.
 """
 import argparse, os, math, time, csv, datetime as dt, asyncio
 import httpx
 
+from eth_signal_kit.data_sources import codecs  # decodifica tipizzata (msgspec/orjson se installati)
+from eth_signal_kit.data_sources.store import SeriesStore
+from eth_signal_kit.indicators.breakout import interval_ms
+
 BINANCE_FAPI_BASE = os.getenv("BINANCE_FAPI_BASE", "https://fapi.binance.com")
 
 def to_ms(d: dt.datetime) -> int:
@@ -29,9 +39,40 @@ async def fetch_klines(symbol: str, interval: str, start_ms: int, end_ms: int, l
     async with httpx.AsyncClient(timeout=30) as client:
         r = await client.get(url, params=params)
         r.raise_for_status()
-        return r.json()
+        return codecs.decoder(codecs.Kline)(r.content)
+
+TOP_RATIO_ENDPOINTS = {"account": "topLongShortAccountRatio", "position": "topLongShortPositionRatio"}
+TOP_RATIO_HISTORY_DAYS = 30
+
+async def fetch_top_ratio(symbol: str, source: str, period: str, start_ms: int, end_ms: int,
+                          store: SeriesStore) -> str:
+    """
+    Top-trader ratio (`source` account/position) in <store>/binance_top_ls_<source>_<SYMBOL>_<period>.csv.
+    Riparte dall'ultimo punto salvato (riscaricato: puo' essere stato rivisto); ritorna il path.
+    """
+    path = store.path("binance", f"top_ls_{source}", symbol, period)
+    step = interval_ms(period)
+    have = store.read(path)
+    oldest = int(time.time() * 1000) - TOP_RATIO_HISTORY_DAYS * 86_400_000 + step  # oltre: rifiutato
+    cur = max(start_ms, oldest, have[-1][0] if have else 0)
+    url = f"{BINANCE_FAPI_BASE}/futures/data/{TOP_RATIO_ENDPOINTS[source]}"
+    points = []
+    async with httpx.AsyncClient(timeout=30) as client:
+        while cur <= end_ms:
+            r = await client.get(url, params={"symbol": symbol, "period": period, "limit": 500,
+                                              "startTime": cur, "endTime": end_ms})
+            r.raise_for_status()
+            page = [x for x in codecs.decoder(codecs.LongShortRatio)(r.content) if cur <= x.timestamp <= end_ms]
+            if not page:
+                break
+            points.extend((x.timestamp, x.longShortRatio) for x in page)
+            cur = max(x.timestamp for x in page) + step
+            await asyncio.sleep(0.2)
+    store.merge(path, points)
+    return path
 
-async def fetch_series(symbol: str, start: str, end: str, outdir: str):
+async def fetch_series(symbol: str, start: str, end: str, outdir: str, top_ratio: bool = True,
+                       aggtrades: bool = False):
     os.makedirs(outdir, exist_ok=True)
     # 1) Klines 1m
     start_dt = parse_date(start)
@@ -47,7 +88,7 @@ async def fetch_series(symbol: str, start: str, end: str, outdir: str):
         data = await fetch_klines(symbol, "1m", cur, nxt)
         rows.extend(data)
         if data:
-            cur = int(data[-1][0]) + 60_000
+            cur = data[-1].open_time + 60_000
         else:
             cur = nxt
         await asyncio.sleep(0.2)
@@ -58,35 +99,49 @@ async def fetch_series(symbol: str, start: str, end: str, outdir: str):
         w = csv.writer(f)
         w.writerow(["ts","open","high","low","close","volume","taker_buy_base"])
         for k in rows:
-            w.writerow([k[0], k[1], k[2], k[3], k[4], k[5], k[9]])
+            w.writerow([k.open_time, k.open, k.high, k.low, k.close, k.volume, k.taker_buy_base])
 
     # 2) Funding history
     url_f = f"{BINANCE_FAPI_BASE}/fapi/v1/fundingRate"
     async with httpx.AsyncClient(timeout=30) as client:
         r = await client.get(url_f, params={"symbol": symbol, "limit": 1000, "startTime": start_ms, "endTime": end_ms})
         r.raise_for_status()
-        frows = r.json()
+        frows = codecs.decoder(codecs.FundingRate)(r.content)
     fpath = os.path.join(outdir, f"binance_funding_{symbol}.csv")
     with open(fpath, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["ts","funding_rate"])
         for x in frows:
-            w.writerow([x["fundingTime"], x["fundingRate"]])
+            w.writerow([x.fundingTime, x.fundingRate])
 
     # 3) OI 1h (ultimo mese per volta; qui preleviamo 7d per compatibilità con score)
     url_oi = f"{BINANCE_FAPI_BASE}/futures/data/openInterestHist"
     async with httpx.AsyncClient(timeout=30) as client:
         r = await client.get(url_oi, params={"symbol": symbol, "period": "1h", "limit": 168})
         r.raise_for_status()
-        oij = r.json()
+        oij = codecs.decoder(codecs.OpenInterestHist)(r.content)
     opath = os.path.join(outdir, f"binance_oi_hist_{symbol}_1h.csv")
     with open(opath, "w", newline="", encoding="utf-8") as f:
         w = csv.writer(f)
         w.writerow(["ts","open_interest"])
         for x in oij:
-            w.writerow([x["timestamp"], x["sumOpenInterest"]])
+            w.writerow([x.timestamp, x.sumOpenInterest])
+
+    saved = [kpath, fpath, opath]
+
+    # 4) Top-trader long/short ratio 4h (account: fallback whales del live; position: analisi)
+    if top_ratio:
+        store = SeriesStore(outdir)
+        for source in TOP_RATIO_ENDPOINTS:
+            saved.append(await fetch_top_ratio(symbol, source, "4h", start_ms, end_ms, store))
+
+    # 5) aggTrade: un file per giorno nell'archivio, solo i giorni mancanti
+    if aggtrades:
+        from eth_signal_kit.data_sources import aggtrades as agg
+        saved.extend(await agg.fetch_days(agg.Archive(outdir, symbol), start_dt.date().isoformat(),
+                                          end_dt.date().isoformat()))
 
-    print("Saved:", kpath, fpath, opath)
+    print("Saved:", *saved)
 
 def main():
     ap = argparse.ArgumentParser()
@@ -94,10 +149,14 @@ def main():
     ap.add_argument("--start", required=True, help="YYYY-MM-DD")
     ap.add_argument("--end", required=True, help="YYYY-MM-DD")
     ap.add_argument("--out", default="data")
+    ap.add_argument("--top-ratio", type=lambda x: x.lower()=="true", default=True,
+                    help="false = non scaricare il top-trader long/short ratio")
+    ap.add_argument("--aggtrades", type=lambda x: x.lower()=="true", default=False,
+                    help="true = archivio aggTrade tick-level (dump giornalieri, pesante: ~centinaia di MB/mese)")
     args = ap.parse_args()
 
     import asyncio
-    asyncio.run(fetch_series(args.symbol, args.start, args.end, args.out))
+    asyncio.run(fetch_series(args.symbol, args.start, args.end, args.out, args.top_ratio, args.aggtrades))
 
 if __name__ == "__main__":
     main()
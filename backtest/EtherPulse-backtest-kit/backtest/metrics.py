@@ -38,3 +38,31 @@ def kpi(trades: pd.DataFrame) -> dict:
         drawdown = eq["equity"]/roll_max - 1.0
         mdd = float(drawdown.min())
     return {"trades": int(len(trades)), "win_rate": float(win_rate), "pf": float(pf), "avg_pnl": float(avg_pnl), "max_dd": mdd, "sharpe": float(sharpe)}
+
+def portfolio_kpi(equity: pd.DataFrame, trades: pd.DataFrame, start_equity: float) -> dict:
+    """
+    KPI di portafoglio dalla curva mark-to-market per barra (portfolio.run_portfolio):
+    rendimento, drawdown, sharpe annualizzato sui rendimenti per barra, esposizione e fee.
+    """
+    if equity.empty:
+        return {"trades": 0, "final_equity": start_equity, "return": 0.0, "max_dd": 0.0, "sharpe": 0.0,
+                "win_rate": 0.0, "pf": 0.0, "fees": 0.0, "max_gross_leverage": 0.0, "max_positions": 0}
+    eq = equity["equity"]
+    rets = eq.pct_change().dropna()
+    step = (equity.index[1] - equity.index[0]) if len(equity) > 1 else pd.Timedelta(days=1)
+    per_year = pd.Timedelta(days=365) / step
+    sharpe = float(rets.mean() / (rets.std() + 1e-12) * per_year ** 0.5) if len(rets) > 1 else 0.0
+    mdd = float((eq / eq.cummax() - 1.0).min())
+    if trades.empty:
+        win_rate, pf, fees = 0.0, 0.0, 0.0
+    else:
+        pnl = trades["pnl_usd"]
+        gross_loss = -pnl[pnl <= 0].sum()
+        win_rate = float((pnl > 0).mean())
+        pf = float(pnl[pnl > 0].sum() / gross_loss) if gross_loss > 0 else float("inf")
+        fees = float(trades["fees"].sum())
+    return {"trades": int(len(trades)), "final_equity": float(eq.iloc[-1]),
+            "return": float(eq.iloc[-1] / start_equity - 1.0), "max_dd": mdd, "sharpe": sharpe,
+            "win_rate": win_rate, "pf": pf, "fees": fees,
+            "max_gross_leverage": float((equity["gross"] / eq).max()),
+            "max_positions": int(equity["positions"].max())}
@@ -0,0 +1,200 @@
+
+"""
+backtest/parity.py
+Replay di parita' backtest <-> live: le barre storiche registrate (CSV di ingest.py)
+passano, barra per barra, dalla pipeline live (eth_signal_kit.pipeline.evaluate) tramite
+un finto modulo Binance con orologio simulato; ogni campo di SignalInputs e la decisione
+vengono confrontati con enrich_features + decide_row sulla stessa barra.
+
+Uso:
+    python -m backtest.parity --data data --symbol ETHUSDT --tf 5T --config configs/strategy_severo.yaml \
+        --start 2025-06-01 --end 2025-06-07 --outdir runs/parity
+"""
+import argparse, asyncio, json, math, os, pandas as pd, numpy as np
+from eth_signal_kit import cli
+from eth_signal_kit import pipeline as live
+from eth_signal_kit.config import load as load_config
+from backtest.features import (load_klines_csv, resample_to, enrich_features, load_funding_csv, load_oi_csv,
+                               load_top_ratio)
+from backtest.run import decide_row, inputs_from_row
+
+_UNIT_MIN = {"m": 1, "h": 60, "d": 1440}
+
+def interval_minutes(interval: str) -> int:
+    return int(interval[:-1]) * _UNIT_MIN[interval[-1]]
+
+def tf_to_interval(tf: str) -> str:
+    """Alias pandas (5T, 15min, 1H) -> intervallo Binance (5m, 15m, 1h)."""
+    minutes = int(pd.Timedelta(pd.tseries.frequencies.to_offset(tf)).total_seconds() // 60)
+    if minutes % 1440 == 0:
+        return f"{minutes // 1440}d"
+    if minutes % 60 == 0:
+        return f"{minutes // 60}h"
+    return f"{minutes}m"
+
+def _ms(index: pd.DatetimeIndex) -> np.ndarray:
+    return index.asi8 // 1_000_000
+
+class ReplayBinance:
+    """
+    Stand-in di eth_signal_kit.data_sources.binance su dati registrati.
+    Risponde "as of" now_ms con lo stesso formato dell'API: la barra in corso
+    (per intervalli > 1m) e' aggregata solo dai minuti gia' chiusi, niente lookahead.
+    Le liquidazioni non sono registrate: lista vuota (come nel backtest). Il top-trader ratio
+    (load_top_ratio, account) viene servito se scaricato da ingest.py, altrimenti lista vuota.
+    """
+    def __init__(self, df1m: pd.DataFrame, funding: pd.DataFrame, oi: pd.DataFrame,
+                 top_ratio: pd.Series = None):
+        self.df1m = df1m
+        self.t1m = _ms(df1m.index)
+        self.cols = {c: df1m[c].to_numpy() for c in ("open", "high", "low", "close", "volume", "taker_buy_base")}
+        self.f_ts, self.f_val = _ms(funding.index), funding["funding_rate"].to_numpy()
+        self.o_ts, self.o_val = _ms(oi.index), oi["open_interest"].to_numpy()
+        if top_ratio is None:
+            top_ratio = pd.Series([], index=pd.DatetimeIndex([], tz="UTC"), dtype=float)
+        self.r_ts, self.r_val = _ms(top_ratio.index), top_ratio.to_numpy(dtype=float)
+        self.now_ms = 0
+        self._bars = {}
+
+    def clock(self) -> float:
+        return self.now_ms / 1000.0
+
+    @staticmethod
+    def _row(t, o, h, l, c, v, tb, step_ms):
+        # [openTime, open, high, low, close, volume, closeTime, quoteVol, trades, takerBuyBase, takerBuyQuote, ignore]
+        return [int(t), repr(float(o)), repr(float(h)), repr(float(l)), repr(float(c)), repr(float(v)),
+                int(t) + step_ms - 1, "0", 0, repr(float(tb)), "0", "0"]
+
+    def _series(self, interval: str):
+        if interval not in self._bars:
+            step_ms = interval_minutes(interval) * 60_000
+            if interval == "1m":
+                agg = self.df1m
+            else:
+                agg = resample_to(self.df1m, f"{interval_minutes(interval)}min")
+            t = _ms(agg.index)
+            rows = [self._row(*r, step_ms) for r in zip(t, agg["open"], agg["high"], agg["low"], agg["close"],
+                                                        agg["volume"], agg["taker_buy_base"])]
+            self._bars[interval] = (t, rows, step_ms)
+        return self._bars[interval]
+
+    async def get_klines(self, symbol, interval="1m", limit=500):
+        t, rows, step_ms = self._series(interval)
+        k = int(np.searchsorted(t, self.now_ms, side="right"))
+        out = rows[max(0, k - int(limit)):k]
+        if out and interval != "1m" and t[k - 1] + step_ms - 1 > self.now_ms:
+            # barra in corso: aggrega i soli minuti con open <= now
+            a = int(np.searchsorted(self.t1m, t[k - 1], side="left"))
+            b = int(np.searchsorted(self.t1m, self.now_ms, side="right"))
+            c = self.cols
+            out[-1] = self._row(t[k - 1], c["open"][a], c["high"][a:b].max(), c["low"][a:b].min(),
+                                c["close"][b - 1], c["volume"][a:b].sum(), c["taker_buy_base"][a:b].sum(), step_ms)
+        return out
+
+    async def get_funding_rates(self, symbol, limit=200):
+        k = int(np.searchsorted(self.f_ts, self.now_ms, side="right"))
+        return [{"symbol": symbol, "fundingTime": int(t), "fundingRate": repr(float(v))}
+                for t, v in zip(self.f_ts[max(0, k - limit):k], self.f_val[max(0, k - limit):k])]
+
+    async def get_open_interest_hist(self, symbol, period="5m", limit=200):
+        k = int(np.searchsorted(self.o_ts, self.now_ms, side="right"))
+        return [{"symbol": symbol, "timestamp": int(t), "sumOpenInterest": repr(float(v))}
+                for t, v in zip(self.o_ts[max(0, k - limit):k], self.o_val[max(0, k - limit):k])]
+
+    async def get_all_liquidations(self, symbol=None, startTime=None, endTime=None, limit=1000):
+        return []
+
+    async def get_top_accounts_long_short_ratio(self, symbol, period="4h", limit=100, source="account"):
+        k = int(np.searchsorted(self.r_ts, self.now_ms, side="right"))
+        return [{"symbol": symbol, "longShortRatio": repr(float(v)), "timestamp": int(t)}
+                for t, v in zip(self.r_ts[max(0, k - limit):k], self.r_val[max(0, k - limit):k])]
+
+def _same(a, b, rtol: float, atol: float) -> bool:
+    if isinstance(a, bool) or isinstance(b, bool) or a is None or b is None:
+        return a == b
+    a, b = float(a), float(b)
+    if math.isnan(a) or math.isnan(b):
+        return math.isnan(a) and math.isnan(b)
+    return abs(a - b) <= atol + rtol * abs(b)
+
+async def replay(df1m, fund, oi, feats, cfg, symbol, interval, every=1, rtol=1e-9, atol=1e-12,
+                 top_ratio=None):
+    """Ritorna (report dict, DataFrame delle differenze in formato lungo)."""
+    api = ReplayBinance(df1m, fund, oi, top_ratio)
+    args = cli.parse_args(["--symbol", symbol, "--interval", interval, "--exchange", "binance"])
+    step_ms = interval_minutes(interval) * 60_000
+    fields = list(inputs_from_row(feats.iloc[0], cfg).__dict__) if len(feats) else []
+    stats = {f: {"mismatches": 0, "max_abs_diff": 0.0, "first": None} for f in fields + ["decision", "score"]}
+    diffs, n = [], 0
+
+    for ts, row in feats.iloc[::every].iterrows():
+        # valutazione "live" a chiusura barra (ultimo secondo della barra)
+        api.now_ms = int(ts.value // 1_000_000) + step_ms - 1000
+        lv = await live.evaluate(args, cfg, api=api, clock=api.clock)
+        bt_inputs = inputs_from_row(row, cfg).__dict__
+        bt = decide_row(row, cfg)
+        n += 1
+        pairs = [(f, lv["inputs"][f], bt_inputs[f]) for f in fields]
+        pairs += [("decision", lv["decision"], bt["decision"]), ("score", lv["score"], bt["score"])]
+        for f, a, b in pairs:
+            ok = (a == b) if f in ("decision", "score") else _same(a, b, rtol, atol)
+            if ok:
+                continue
+            st = stats[f]
+            st["mismatches"] += 1
+            st["first"] = st["first"] or str(ts)
+            if f not in ("decision", "score") and not isinstance(a, bool) and a is not None and b is not None:
+                st["max_abs_diff"] = max(st["max_abs_diff"], abs(float(a) - float(b)))
+            diffs.append({"ts": ts, "field": f, "live": a, "backtest": b})
+
+    for st in stats.values():
+        st["rate"] = st["mismatches"] / n if n else 0.0
+    report = {"bars": n, "interval": interval, "rtol": rtol, "atol": atol, "fields": stats}
+    return report, pd.DataFrame(diffs, columns=["ts", "field", "live", "backtest"])
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data", help="Dir con CSV generati da ingest.py")
+    ap.add_argument("--symbol", default="ETHUSDT")
+    ap.add_argument("--tf", default="5T", help="pandas offset alias (5T=5m); la pipeline live usa l'intervallo equivalente")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--start", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--end", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--outdir", default="runs/parity")
+    ap.add_argument("--every", type=int, default=1, help="valuta una barra ogni N")
+    ap.add_argument("--rtol", type=float, default=1e-9)
+    ap.add_argument("--atol", type=float, default=1e-12)
+    args = ap.parse_args()
+
+    os.makedirs(args.outdir, exist_ok=True)
+    cfg = load_config(args.config)
+
+    df1m = load_klines_csv(os.path.join(args.data, f"binance_klines_{args.symbol}_1m.csv"))
+    fund = load_funding_csv(os.path.join(args.data, f"binance_funding_{args.symbol}.csv"))
+    oi   = load_oi_csv(os.path.join(args.data, f"binance_oi_hist_{args.symbol}_1h.csv"))
+    top_ratio = load_top_ratio(args.data, args.symbol)
+
+    # stesso percorso di backtest.run
+    df_tf = resample_to(df1m, args.tf).loc[args.start:args.end]
+    th = cfg.get("thresholds", {}) or {}
+    feats = enrich_features(df_tf, fund.loc[:args.end], oi.loc[:args.end],
+                            int(th.get("cvd_window_min", 60)), cfg.get("pivot_mode", "floor"),
+                            int(th.get("donchian_window", 55)), int(th.get("breakout_confirm_candles", 1)),
+                            top_ratio=top_ratio)
+
+    report, diffs = asyncio.run(replay(df1m, fund, oi, feats, cfg, args.symbol, tf_to_interval(args.tf),
+                                       every=args.every, rtol=args.rtol, atol=args.atol, top_ratio=top_ratio))
+
+    rep_path = os.path.join(args.outdir, "parity_report.json")
+    diff_path = os.path.join(args.outdir, "parity_diffs.csv")
+    with open(rep_path, "w") as f:
+        json.dump(report, f, indent=2)
+    diffs.to_csv(diff_path, index=False)
+
+    for name, st in report["fields"].items():
+        if st["mismatches"]:
+            print(f"{name:22s} {st['mismatches']:6d}/{report['bars']} ({st['rate']:.1%})  first={st['first']}")
+    print("Saved:", rep_path, diff_path)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+
+"""
+backtest/portfolio.py
+Backtest di portafoglio: piu' simboli sullo stesso orologio con capitale condiviso.
+- Segnali per simbolo come in run.py (engine live, decide_frame vettoriale)
+- Entry a close, stop/TP in ATR come sim.run_sim (anche intrabar sul percorso 1m)
+- Sizing a rischio: notional = equity * risk_per_trade / distanza dello stop
+- Tetti su esposizione lorda (max_gross x equity) e posizioni contemporanee
+- Fee per lato sul notional, slippage su entrata e uscita
+"""
+import argparse, heapq, os, json
+from typing import Dict, Optional
+import pandas as pd
+import numpy as np
+from eth_signal_kit.config import load as load_config
+from backtest.features import enrich_features, load_onchain, load_top_ratio
+from backtest.sim import atr, bar_path, intrabar_path, first_exit, PricePath
+from backtest.run import load_data, sides_from, decide_frame, feature_key
+from backtest.metrics import portfolio_kpi
+from eth_signal_kit.indicators.bars import parse_spec
+
+def common_clock(frames: Dict[str, pd.DataFrame]) -> pd.DatetimeIndex:
+    """Orologio comune: unione degli indici dei simboli (barre mancanti = NaN, nessun fill)."""
+    clock = None
+    for df in frames.values():
+        clock = df.index if clock is None else clock.union(df.index)
+    return clock
+
+def run_portfolio(frames: Dict[str, pd.DataFrame],
+                  side_col: str = "side",
+                  start_equity: float = 10_000.0,
+                  risk_per_trade: float = 0.01,
+                  max_gross: float = 1.0,
+                  max_positions: Optional[int] = None,
+                  fees_bps: float = 6.0,
+                  slip_bps: float = 2.0,
+                  atr_k_stop: float = 1.2,
+                  atr_k_tp: float = 1.8,
+                  atr_series: Dict[str, pd.Series] = None,
+                  paths: Dict[str, PricePath] = None):
+    """
+    frames: simbolo -> DataFrame [close, high, low, side_col] sul timeframe del simbolo.
+    paths: percorsi per le uscite sull'orologio comune (es. intrabar_path(df1m, clock, tf));
+    default: le barre stesse. Ritorna (trades, equity, segnali scartati per i tetti): equity per
+    barra dell'orologio [equity, cash, gross, positions] a mark-to-market sulle close.
+
+    Le uscite di una posizione non dipendono dal capitale: vengono cercate all'ingresso
+    (first_exit sul percorso del simbolo) e messe in coda per barra. Il loop visita solo gli
+    ingressi candidati in ordine di tempo (a parita' di barra, ordine di `frames`): prima
+    realizza le uscite fino a quella barra, poi dimensiona con l'equity corrente. Costo
+    proporzionale a segnali + trade, non a barre x simboli. Curva equity ed esposizione sono
+    ricostruite alla fine per slice sui periodi dei trade.
+    Posizioni aperte a fine dati: restano nella curva (mark-to-market), non in `trades`.
+    """
+    symbols = list(frames)
+    clock = common_clock(frames)
+    T = len(clock)
+    slip, fee_rate = slip_bps/1e4, fees_bps/1e4
+    closef, sym_paths, cands = [], [], []
+    for s_i, sym in enumerate(symbols):
+        df = frames[sym]
+        atr_s = atr_series[sym] if atr_series and sym in atr_series else atr(df, 14)
+        al = df[["close", "high", "low"]].reindex(clock)
+        closef.append(al["close"].ffill().to_numpy(dtype=float))
+        p = paths.get(sym) if paths else None
+        if p is None:
+            p = bar_path(al["high"].to_numpy(dtype=float), al["low"].to_numpy(dtype=float))
+        elif len(p.lo) != T:
+            raise ValueError(f"{sym}: path con {len(p.lo)} barre, orologio {T}")
+        sym_paths.append(p)
+        sides = df[side_col].reindex(clock).to_numpy()
+        atr_v = atr_s.reindex(clock).to_numpy(dtype=float)
+        t = np.flatnonzero(((sides == "LONG") | (sides == "SHORT")) & (atr_v > 0))
+        cands.append((t, np.full(len(t), s_i), sides[t] == "LONG", atr_v[t]))
+
+    t_all = np.concatenate([c[0] for c in cands]) if cands else np.empty(0, dtype=np.int64)
+    s_all = np.concatenate([c[1] for c in cands]) if cands else np.empty(0, dtype=np.int64)
+    long_all = np.concatenate([c[2] for c in cands]) if cands else np.empty(0, dtype=bool)
+    atr_all = np.concatenate([c[3] for c in cands]) if cands else np.empty(0)
+    order = np.lexsort((s_all, t_all))
+
+    cash = start_equity
+    gross = 0.0
+    open_pos = {}                  # s_i -> posizione aperta
+    free_at = [0] * len(symbols)   # prima barra in cui il simbolo puo' rientrare
+    exits = []                     # heap (barra di uscita, seq, s_i)
+    seq = 0
+    done, skipped = [], 0
+
+    def realize(pos):
+        nonlocal cash, gross
+        cash += pos["pnl_usd"] - pos["fee_exit"]
+        gross -= pos["notional"]
+
+    for n in order.tolist():
+        t, s_i = int(t_all[n]), int(s_all[n])
+        while exits and exits[0][0] <= t:
+            _, _, e_s = heapq.heappop(exits)
+            pos = open_pos.pop(e_s)
+            realize(pos)
+            done.append(pos)
+        if t < free_at[s_i]:
+            continue
+        if max_positions is not None and len(open_pos) >= max_positions:
+            skipped += 1
+            continue
+        equity = cash + sum(p["dir"] * p["qty"] * (closef[k][t] - p["entry"]) for k, p in open_pos.items())
+        long, atrv, price = bool(long_all[n]), float(atr_all[n]), closef[s_i][t]
+        if long:
+            entry = price * (1 + slip)
+            stop = entry - atrv * atr_k_stop
+            tp   = entry + atrv * atr_k_tp
+        else:
+            entry = price * (1 - slip)
+            stop = entry + atrv * atr_k_stop
+            tp   = entry - atrv * atr_k_tp
+        notional = min(equity * risk_per_trade * entry / (atrv * atr_k_stop), max_gross * equity - gross)
+        if not notional > 0:
+            skipped += 1
+            continue
+        qty = notional / entry
+        fee_entry = notional * fee_rate
+        cash -= fee_entry
+        gross += notional
+        pos = {"s_i": s_i, "dir": 1.0 if long else -1.0, "t": t, "entry": entry, "stop": stop, "tp": tp,
+               "qty": qty, "notional": notional, "fee_entry": fee_entry, "k": T}
+        open_pos[s_i] = pos
+        path = sym_paths[s_i]
+        j, px = first_exit(path, int(path.hi[t]), int(path.hi[-1]), long, stop, tp)
+        if j is None:
+            free_at[s_i] = T
+            continue
+        k = int(np.searchsorted(path.hi, j, side="right"))
+        fill = px * (1 - slip) if long else px * (1 + slip)
+        pos.update(k=k, exit_px=fill, pnl_usd=pos["dir"] * qty * (fill - entry), fee_exit=qty * fill * fee_rate)
+        free_at[s_i] = k
+        heapq.heappush(exits, (k, seq, s_i))
+        seq += 1
+    while exits:
+        _, _, e_s = heapq.heappop(exits)
+        pos = open_pos.pop(e_s)
+        realize(pos)
+        done.append(pos)
+
+    # curva per barra: realizzato a gradini + mark-to-market delle posizioni aperte
+    realized = np.zeros(T + 1)
+    unreal = np.zeros(T)
+    gross_d = np.zeros(T + 1)
+    npos_d = np.zeros(T + 1, dtype=np.int64)
+    for p in done + list(open_pos.values()):
+        t, k = p["t"], p["k"]
+        realized[t] -= p["fee_entry"]
+        if "pnl_usd" in p:
+            realized[k] += p["pnl_usd"] - p["fee_exit"]
+        unreal[t:k] += p["dir"] * p["qty"] * (closef[p["s_i"]][t:k] - p["entry"])
+        gross_d[t] += p["notional"]; gross_d[k] -= p["notional"]
+        npos_d[t] += 1; npos_d[k] -= 1
+    cash_curve = start_equity + np.cumsum(realized)[:T]
+    equity = pd.DataFrame({"equity": cash_curve + unreal, "cash": cash_curve,
+                           "gross": np.cumsum(gross_d)[:T], "positions": np.cumsum(npos_d)[:T]}, index=clock)
+    equity.index.name = "time"
+
+    if not done:
+        return pd.DataFrame(), equity, skipped
+    done.sort(key=lambda p: (p["k"], p["t"], p["s_i"]))
+    trades = pd.DataFrame({
+        "symbol": [symbols[p["s_i"]] for p in done],
+        "side": ["LONG" if p["dir"] > 0 else "SHORT" for p in done],
+        "entry_time": clock.take([p["t"] for p in done]),
+        "entry": [p["entry"] for p in done],
+        "stop": [p["stop"] for p in done],
+        "tp": [p["tp"] for p in done],
+        "exit": clock.take([p["k"] for p in done]),
+        "exit_px": [p["exit_px"] for p in done],
+        "qty": [p["qty"] for p in done],
+        "notional": [p["notional"] for p in done],
+        "fees": [p["fee_entry"] + p["fee_exit"] for p in done],
+        "pnl_usd": [p["pnl_usd"] - p["fee_entry"] - p["fee_exit"] for p in done],
+    })
+    trades["pnl"] = trades["pnl_usd"] / trades["notional"]
+    return trades, equity, skipped
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--data", default="data", help="Dir con CSV generati da ingest.py")
+    ap.add_argument("--symbols", nargs="+", required=True, help="es. ETHUSDT BTCUSDT SOLUSDT")
+    ap.add_argument("--tf", default="5T", help="pandas offset alias (5T=5m, 15T=15m) o barre dai trade "
+                    "(volume:<base>, dollar:<usd>, imbalance:<base>)")
+    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--start", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--end", required=True, help="YYYY-MM-DD")
+    ap.add_argument("--outdir", default="runs/portfolio_5m")
+    ap.add_argument("--equity", type=float, default=10_000.0, help="capitale iniziale (USD)")
+    ap.add_argument("--risk_per_trade", type=float, default=0.01, help="frazione di equity rischiata allo stop")
+    ap.add_argument("--max_gross", type=float, default=1.0, help="esposizione lorda massima in multipli di equity")
+    ap.add_argument("--max_positions", type=int, default=None)
+    ap.add_argument("--fees_bps", type=float, default=6.0)
+    ap.add_argument("--slip_bps", type=float, default=2.0)
+    ap.add_argument("--intrabar", type=lambda x: x.lower()=="true", default=False,
+                    help="true = stop/TP risolti sul percorso 1m dentro ogni barra --tf")
+    ap.add_argument("--with-onchain", type=lambda x: x.lower()=="true", default=False,
+                    help="true = serie Glassnode del data dir nelle feature (regole exchange_inflow/outflow), "
+                    "come --with-onchain del live")
+    args = ap.parse_args()
+    if args.intrabar and parse_spec(args.tf):
+        raise SystemExit("--intrabar: non disponibile con barre volume/dollar/imbalance (durata variabile)")
+
+    os.makedirs(args.outdir, exist_ok=True)
+    cfg = load_config(args.config)
+    th = cfg.get("thresholds", {}) or {}
+    pivot_mode, donchian_window, confirm_candles = feature_key(cfg)
+    frames, atrs, bars_1m = {}, {}, {}
+    for sym in args.symbols:
+        df1m, df_tf, fund, oi = load_data(args.data, sym, args.tf, args.start, args.end)
+        feats = enrich_features(df_tf, fund, oi, int(th.get("cvd_window_min", 60)), pivot_mode, donchian_window,
+                                confirm_candles, load_onchain(args.data, sym) if args.with_onchain else None,
+                                load_top_ratio(args.data, sym))
+        dec = decide_frame(feats, cfg)["decision"]
+        frames[sym] = pd.DataFrame({"close": feats["close"], "high": feats["high"], "low": feats["low"],
+                                    "side": sides_from(dec)}, index=feats.index)
+        atrs[sym] = atr(df_tf, 14)
+        if args.intrabar:
+            bars_1m[sym] = df1m[["high", "low"]]
+        print(f"{sym}: {len(df_tf)} barre, BUY {int((dec == 'BUY').sum())}, SELL {int((dec == 'SELL').sum())}")
+
+    paths = None
+    if args.intrabar:
+        clock = common_clock(frames)
+        paths = {sym: intrabar_path(d, clock, args.tf) for sym, d in bars_1m.items()}
+    trades, equity, skipped = run_portfolio(frames, start_equity=args.equity, risk_per_trade=args.risk_per_trade,
+                                            max_gross=args.max_gross, max_positions=args.max_positions,
+                                            fees_bps=args.fees_bps, slip_bps=args.slip_bps,
+                                            atr_series=atrs, paths=paths)
+    rep = portfolio_kpi(equity, trades, args.equity)
+    rep["skipped_signals"] = skipped
+    rep["by_symbol"] = ({} if trades.empty else
+                        {sym: {"trades": int(len(g)), "pnl_usd": float(g["pnl_usd"].sum()), "fees": float(g["fees"].sum())}
+                         for sym, g in trades.groupby("symbol")})
+
+    trades_path = os.path.join(args.outdir, "trades.csv")
+    eq_path = os.path.join(args.outdir, "equity_curve.csv")
+    report_path = os.path.join(args.outdir, "report.json")
+    trades.to_csv(trades_path, index=False)
+    equity.to_csv(eq_path)
+    with open(report_path, "w") as f:
+        json.dump(rep, f, indent=2)
+    print(json.dumps({k: v for k, v in rep.items() if k != "by_symbol"}, indent=2))
+    print("Saved:", trades_path, eq_path, report_path)
+
+if __name__ == "__main__":
+    main()
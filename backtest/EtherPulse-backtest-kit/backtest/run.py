@@ -2,112 +2,238 @@
 """
 backtest/run.py
 Esegue un backtest semplice usando l'engine live per la decisione.
+Accetta N config (--config a.yaml b.yaml ...): feature, ATR e dati vengono
+calcolati una sola volta e condivisi; in output un report comparativo.
 """
-import argparse, os, yaml, pandas as pd, numpy as np
+import argparse, os, json, pandas as pd, numpy as np
 from datetime import datetime
-from eth_signal_kit.engine import compute_score, BearWeights, BullWeights
-from eth_signal_kit.engine import SignalInputs
-from backtest.features import load_klines_csv, resample_to, enrich_features, load_funding_csv, load_oi_csv
-from backtest.sim import run_sim
+from dataclasses import fields
+from eth_signal_kit.engine import SignalInputs, model_for
+from eth_signal_kit.config import load as load_config, label as config_label
+from backtest.features import (load_klines_csv, resample_to, enrich_features, load_funding_csv, load_oi_csv,
+                               compute_cvd, load_onchain, load_top_ratio, load_trade_flow, load_bars, tf_ms,
+                               whales_signal)
+from eth_signal_kit.indicators.bars import parse_spec
+from backtest.sim import run_sim, atr, intrabar_path
 from backtest.metrics import kpi, equity_curve
 
+# input non disponibili in storico: valore fisso (le regole che li usano non scattano)
+HISTORY_FIXED = {"liq_usd_15m": 0.0}
+
+def whales_min_change(cfg) -> float:
+    return float(((cfg or {}).get("thresholds") or {}).get("whales_ratio_min_change_pct", 8.0))
+
+def _whales_from_row(row, cfg):
+    # whales_net_selling_7d dalla colonna whales_ratio_chg_pct (top-trader ratio di ingest.py)
+    chg = row.get("whales_ratio_chg_pct")
+    w = float(whales_signal(np.nan if chg is None else chg, whales_min_change(cfg)))
+    return None if np.isnan(w) else w == 1.0
+
+def _row_spec():
+    # (campo, conversione, default) per ogni campo di SignalInputs
+    conv = {"bool": bool, "float": float}
+    return [(f.name, conv.get(f.type), False if f.type == "bool" else 0.0 if f.type == "float" else f.default)
+            for f in fields(SignalInputs)]
+
+_ROW_SPEC = _row_spec()
+
+def inputs_from_row(row, cfg=None) -> SignalInputs:
+    """
+    Riga di enrich_features -> SignalInputs: ogni campo dalla colonna omonima (bool/float
+    secondo l'annotazione), HISTORY_FIXED per quelli non ricostruibili, altrimenti il default.
+    whales_net_selling_7d dipende dalla soglia del config (`cfg`, default come il live).
+    """
+    kw = {}
+    for name, conv, default in _ROW_SPEC:
+        if name == "whales_net_selling_7d":
+            kw[name] = _whales_from_row(row, cfg)
+        elif name in HISTORY_FIXED:
+            kw[name] = HISTORY_FIXED[name]
+        elif conv is not None:
+            kw[name] = conv(row.get(name, default))
+        else:
+            kw[name] = row.get(name, default)
+    return SignalInputs(**kw)
+
 def decide_row(row, cfg):
-    thresholds = cfg.get("thresholds", {})
-    bear_w = BearWeights(**cfg.get("bear_weights", {}))
-    bull_w = BullWeights(**cfg.get("bull_weights", {}))
-
-    x = SignalInputs(
-        funding_rate = float(row.get("funding_rate", 0.0)),
-        oi_drop_pct  = float(row.get("oi_drop_pct", 0.0)),
-        oi_rise_pct  = float(row.get("oi_rise_pct", 0.0)),
-        liq_usd_15m  = 0.0,  # non disponibile in storico: lasciamo 0
-        cvd_slope    = float(row.get("cvd_slope", 0.0)),
-        broke_pivot_down = bool(row.get("broke_pivot_down", False)),
-        broke_pivot_up   = bool(row.get("broke_pivot_up", False)),
-        above_vwap       = bool(row.get("above_vwap", False)),
-        broke_vwap_up    = bool(row.get("broke_vwap_up", False)),
-        broke_vwap_down  = bool(row.get("broke_vwap_down", False)),
-        vwap_distance_pct= float(row.get("vwap_distance_pct", 0.0)),
-        whales_net_selling_7d = None
-    )
-    out = compute_score(x, bear_w, bull_w, {
-        **thresholds,
-        "decision.sell_score": cfg.get("decision", {}).get("sell_score", 65),
-        "decision.buy_score":  cfg.get("decision", {}).get("buy_score", 65),
-    })
-    return out
+    """Decisione su una riga con l'engine live (ScoringModel compilato una volta per cfg)."""
+    return model_for(cfg).evaluate(inputs_from_row(row, cfg))
+
+def decide_frame(feats: pd.DataFrame, cfg, cvd_slope: pd.Series = None) -> pd.DataFrame:
+    """
+    Versione vettoriale di decide_row su tutto il frame: stesse regole (registro dell'engine,
+    ScoringModel.score_arrays), una colonna per input; HISTORY_FIXED per gli input non
+    ricostruibili, NaN per le colonne opzionali assenti (on-chain, top-trader ratio).
+    whales_net_selling_7d: 1.0/0.0/NaN da whales_ratio_chg_pct e dalla soglia del config.
+    cvd_slope: override opzionale (feature condivise tra config con cvd_window diverso).
+    Ritorna DataFrame [decision, score_bear, score_bull] indicizzato come feats.
+    """
+    model = model_for(cfg)
+    types = {f.name: f.type for f in fields(SignalInputs)}
+    cols = {}
+    for name in model.vector_inputs():
+        if name == "cvd_slope" and cvd_slope is not None:
+            cols[name] = cvd_slope.to_numpy(dtype=float)
+        elif name == "whales_net_selling_7d" and "whales_ratio_chg_pct" in feats:
+            cols[name] = whales_signal(feats["whales_ratio_chg_pct"].to_numpy(dtype=float), whales_min_change(cfg))
+        elif name in HISTORY_FIXED:
+            cols[name] = np.full(len(feats), HISTORY_FIXED[name] or 0.0)
+        elif name not in feats:  # input opzionale senza dati (es. on-chain non scaricato): regola spenta
+            cols[name] = np.full(len(feats), np.nan)
+        else:
+            cols[name] = feats[name].to_numpy(dtype=bool if types.get(name) == "bool" else float)
+    out = model.score_arrays(cols)
+    return pd.DataFrame({"decision": out["decision"], "score_bear": out["bear"], "score_bull": out["bull"]},
+                        index=feats.index)
+
+def feature_key(cfg):
+    """Parametri che cambiano il frame di feature (cvd_window escluso: si ricalcola a parte)."""
+    th = cfg.get("thresholds", {}) or {}
+    return (cfg.get("pivot_mode", "floor"), int(th.get("donchian_window", 55)),
+            int(th.get("breakout_confirm_candles", 1)))
+
+def date_range_ms(start: str, end: str):
+    """[start, end] come in .loc (una data YYYY-MM-DD include tutto il giorno) -> [start_ms, end_ms)."""
+    t0 = pd.Timestamp(start, tz="UTC")
+    t1 = pd.Timestamp(end, tz="UTC") + (pd.Timedelta(days=1) if len(end) <= 10 else pd.Timedelta(milliseconds=1))
+    return int(t0.value // 1_000_000), int(t1.value // 1_000_000)
+
+def load_data(data_dir: str, symbol: str, tf: str, start: str, end: str):
+    """
+    CSV di ingest.py per un simbolo -> (df1m, df_tf tagliato su [start, end], funding, OI).
+    tf "volume:<soglia>" / "dollar:<soglia>" / "imbalance:<soglia>": barre dall'archivio aggTrade
+    (features.load_bars, costruite da `start`) al posto del resample delle 1m.
+    """
+    df1m = load_klines_csv(os.path.join(data_dir, f"binance_klines_{symbol}_1m.csv"))
+    fund = load_funding_csv(os.path.join(data_dir, f"binance_funding_{symbol}.csv"))
+    oi   = load_oi_csv(os.path.join(data_dir, f"binance_oi_hist_{symbol}_1h.csv"))
+    if parse_spec(tf):
+        df_tf = load_bars(data_dir, symbol, tf, *date_range_ms(start, end))
+        if df_tf is None:
+            raise SystemExit(f"--tf {tf}: nessun archivio aggTrade per {symbol} in {data_dir}")
+    else:
+        df_tf = resample_to(df1m, tf).loc[start:end]
+    return df1m, df_tf, fund.loc[:end], oi.loc[:end]
+
+def sides_from(decision: pd.Series) -> np.ndarray:
+    """BUY/SELL/HOLD -> LONG/SHORT/None (colonna side dei simulatori)."""
+    return np.where(decision == "BUY", "LONG", np.where(decision == "SELL", "SHORT", None))
+
+def save_run(run_dir: str, label: str, trades: pd.DataFrame, buys: int, sells: int) -> dict:
+    """trades.csv, equity_curve.csv, report.json di una config; ritorna la riga di comparison."""
+    eq = equity_curve(trades)
+    rep = kpi(trades)
+    os.makedirs(run_dir, exist_ok=True)
+    trades_path = os.path.join(run_dir, "trades.csv")
+    eq_path = os.path.join(run_dir, "equity_curve.csv")
+    report_path = os.path.join(run_dir, "report.json")
+
+    trades.to_csv(trades_path, index=False)
+    eq.to_csv(eq_path)
+    with open(report_path, "w") as f:
+        json.dump(rep, f, indent=2)
+    print("Saved:", trades_path, eq_path, report_path)
+    return {"config": label, "buy_signals": buys, "sell_signals": sells, **rep}
+
+def save_comparison(outdir: str, comparison) -> None:
+    cmp_df = pd.DataFrame(comparison).set_index("config")
+    cmp_csv = os.path.join(outdir, "comparison.csv")
+    cmp_json = os.path.join(outdir, "comparison.json")
+    cmp_df.to_csv(cmp_csv)
+    with open(cmp_json, "w") as f:
+        json.dump(comparison, f, indent=2)
+    print(cmp_df.to_string())
+    print("Saved:", cmp_csv, cmp_json)
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", default="data", help="Dir con CSV generati da ingest.py")
     ap.add_argument("--symbol", default="ETHUSDT")
-    ap.add_argument("--tf", default="5T", help="pandas offset alias (5T=5m, 15T=15m)")
-    ap.add_argument("--config", default="config.yaml")
+    ap.add_argument("--tf", default="5T", help="pandas offset alias (5T=5m, 15T=15m) o barre dai trade: "
+                    "volume:<base>, dollar:<usd>, imbalance:<base> (archivio aggTrade)")
+    ap.add_argument("--config", nargs="+", default=["config.yaml"],
+                    help="Una o piu' config: con N>1 ogni run va in outdir/<nome-config>/ + comparison.csv")
     ap.add_argument("--start", required=True, help="YYYY-MM-DD")
     ap.add_argument("--end", required=True, help="YYYY-MM-DD")
     ap.add_argument("--outdir", default="runs/ETH_5m_backtest")
     ap.add_argument("--fees_bps", type=float, default=6.0)
     ap.add_argument("--slip_bps", type=float, default=2.0)
+    ap.add_argument("--cvd-source", default="klines", choices=["klines", "trades"],
+                    help="trades = CVD dall'archivio aggTrade in --data (proxy klines dove mancano giorni); "
+                    "implicito con --tf a barre")
+    ap.add_argument("--intrabar", type=lambda x: x.lower()=="true", default=False,
+                    help="true = stop/TP risolti sul percorso 1m dentro ogni barra --tf")
+    ap.add_argument("--with-onchain", type=lambda x: x.lower()=="true", default=False,
+                    help="true = serie Glassnode del data dir nelle feature (regole exchange_inflow/outflow), "
+                    "come --with-onchain del live")
+    ap.add_argument("--chunk-days", type=int, default=0,
+                    help="N>0 = backtest a blocchi di N giorni (backtest.chunked): memoria limitata, "
+                    "stessi risultati; per storici 1m pluriennali")
     args = ap.parse_args()
+    bars = parse_spec(args.tf) is not None
+    if bars and args.intrabar:
+        raise SystemExit("--intrabar: non disponibile con barre volume/dollar/imbalance (durata variabile)")
+    if bars and args.chunk_days:
+        raise SystemExit("--chunk-days: solo timeframe a tempo (le barre dai trade sono gia' in streaming)")
 
     os.makedirs(args.outdir, exist_ok=True)
 
-    with open(args.config, "r") as f:
-        cfg = yaml.safe_load(f)
-
-    # Load data
-    kpath = os.path.join(args.data, f"binance_klines_{args.symbol}_1m.csv")
-    fpath = os.path.join(args.data, f"binance_funding_{args.symbol}.csv")
-    opath = os.path.join(args.data, f"binance_oi_hist_{args.symbol}_1h.csv")
-
-    df1m = load_klines_csv(kpath)
-    df_tf = resample_to(df1m, args.tf)
-    fund = load_funding_csv(fpath)
-    oi   = load_oi_csv(opath)
-
-    # Clip by date
-    df_tf = df_tf.loc[args.start:args.end]
-    fund  = fund.loc[:args.end]
-    oi    = oi.loc[:args.end]
-
-    # Enrich features (match live semantics)
-    pivot_mode = cfg.get("pivot_mode", "floor")
-    donchian_window = int(cfg.get("thresholds", {}).get("donchian_window", 55))
-    cvd_window = int(cfg.get("thresholds", {}).get("cvd_window_min", 60))
-    feats = enrich_features(df_tf, fund, oi, cvd_window, pivot_mode, donchian_window)
-
-    # Decisions
-    dec_list = []
-    for ts, row in feats.iterrows():
-        dec = decide_row(row, cfg)
-        out = {"decision": dec["decision"], "score_bear": dec["score"]["bear"], "score_bull": dec["score"]["bull"]}
-        dec_list.append(out)
-    dec_df = pd.DataFrame(dec_list, index=feats.index)
-
-    # Convert to side for sim
-    def side_from_dec(row):
-        if row["decision"] == "BUY":
-            return "LONG"
-        elif row["decision"] == "SELL":
-            return "SHORT"
-        return None
-    feats["side"] = dec_df.apply(side_from_dec, axis=1)
-
-    # Simulate
-    trades = run_sim(feats, "side", fees_bps=args.fees_bps, slip_bps=args.slip_bps)
-    eq = equity_curve(trades)
-
-    trades_path = os.path.join(args.outdir, "trades.csv")
-    eq_path = os.path.join(args.outdir, "equity_curve.csv")
-    report_path = os.path.join(args.outdir, "report.json")
-
-    trades.to_csv(trades_path, index=False)
-    eq.to_csv(eq_path)
-    import json
-    with open(report_path, "w") as f:
-        json.dump(kpi(trades), f, indent=2)
-
-    print("Saved:", trades_path, eq_path, report_path)
+    cfgs = []
+    for path in args.config:
+        cfgs.append((config_label(path, [c[0] for c in cfgs]), load_config(path)))
+
+    if args.chunk_days:
+        from backtest.chunked import run_chunked
+        run_chunked(args, cfgs)
+        return
+
+    # Load data (clip by date)
+    df1m, df_tf, fund, oi = load_data(args.data, args.symbol, args.tf, args.start, args.end)
+    # serie Glassnode solo su richiesta (come il live): senza --with-onchain le regole on-chain non scattano
+    onchain = load_onchain(args.data, args.symbol) if args.with_onchain else None
+    top_ratio = load_top_ratio(args.data, args.symbol)  # fallback whales del live, se scaricato da ingest.py
+    flow = None
+    if args.cvd_source == "trades" and not bars:   # le barre dai trade hanno gia' il volume taker esatto
+        t0 = int(df_tf.index[0].value // 1_000_000)
+        flow = load_trade_flow(args.data, args.symbol, args.tf, t0, int(df_tf.index[-1].value // 1_000_000) + tf_ms(args.tf))
+        if flow is None:
+            raise SystemExit(f"--cvd-source trades: nessun archivio aggTrade per {args.symbol} in {args.data}")
+
+    # Lavoro condiviso tra config: feature per (pivot_mode, donchian_window, breakout_confirm_candles),
+    # CVD slope per cvd_window, ATR una volta sola
+    feats_cache, cvd_cache = {}, {}
+    atr_tf = atr(df_tf, 14)
+    path = intrabar_path(df1m, df_tf.index, args.tf) if args.intrabar else None
+    multi = len(cfgs) > 1
+    comparison = []
+
+    for label, cfg in cfgs:
+        # Enrich features (match live semantics)
+        key = feature_key(cfg)
+        pivot_mode, donchian_window, confirm_candles = key
+        cvd_window = int(cfg.get("thresholds", {}).get("cvd_window_min", 60))
+        if key not in feats_cache:
+            feats_cache[key] = enrich_features(df_tf, fund, oi, cvd_window, pivot_mode, donchian_window,
+                                                 confirm_candles, onchain, top_ratio, flow)
+            cvd_cache.setdefault(cvd_window, feats_cache[key]["cvd_slope"])
+        feats = feats_cache[key]
+        if cvd_window not in cvd_cache:
+            cvd_cache[cvd_window] = compute_cvd(feats, cvd_window)
+
+        # Decisions (vettoriale) -> side per sim
+        dec_df = decide_frame(feats, cfg, cvd_slope=cvd_cache[cvd_window])
+        side = sides_from(dec_df["decision"])
+        sim_df = pd.DataFrame({"close": feats["close"], "high": feats["high"], "low": feats["low"],
+                               "side": side}, index=feats.index)
+
+        # Simulate
+        trades = run_sim(sim_df, "side", fees_bps=args.fees_bps, slip_bps=args.slip_bps, atr_series=atr_tf,
+                         path=path)
+        comparison.append(save_run(args.outdir if not multi else os.path.join(args.outdir, label), label, trades,
+                                   int((dec_df["decision"] == "BUY").sum()), int((dec_df["decision"] == "SELL").sum())))
+
+    if multi:
+        save_comparison(args.outdir, comparison)
 
 if __name__ == "__main__":
     main()
@@ -5,9 +5,13 @@ Simulatore semplice con ordini a chiusura barra:
 - Entry a close
 - Stop/TP in ATR o su VWAP/Pivot
 - Fee + slippage
+- Uscite risolte sulle barre del timeframe oppure (intrabar) sul percorso 1m dentro ogni barra
 """
+from bisect import bisect_left
+from typing import NamedTuple
 import pandas as pd
 import numpy as np
+from pandas.tseries.frequencies import to_offset
 
 def atr(df: pd.DataFrame, n:int=14) -> pd.Series:
     tr1 = (df["high"] - df["low"]).abs()
@@ -16,65 +20,170 @@ def atr(df: pd.DataFrame, n:int=14) -> pd.Series:
     tr = pd.concat([tr1, tr2, tr3], axis=1).max(axis=1)
     return tr.rolling(n).mean()
 
+# ----------------------------
+# Percorso di prezzo per le uscite
+# ----------------------------
+class PricePath(NamedTuple):
+    """
+    high/low del percorso su cui cercare stop/TP e, per ogni barra del timeframe,
+    il range [lo, hi) dei suoi elementi. Senza sotto-barre: il percorso sono le barre
+    stesse (lo = i, hi = i + 1).
+    """
+    high: np.ndarray
+    low: np.ndarray
+    lo: np.ndarray
+    hi: np.ndarray
+
+def bar_path(high: np.ndarray, low: np.ndarray) -> PricePath:
+    idx = np.arange(len(high))
+    return PricePath(np.asarray(high, dtype=float), np.asarray(low, dtype=float), idx, idx + 1)
+
+def intrabar_path(df1m: pd.DataFrame, index_tf: pd.DatetimeIndex, tf: str) -> PricePath:
+    """
+    Percorso 1m sotto le barre `index_tf` (label = apertura, come resample_to): per ogni barra
+    gli indici [lo, hi) delle 1m con ts in [apertura, apertura + tf). Calcolato una volta
+    (due searchsorted) e riusabile tra config sullo stesso frame.
+    """
+    t1 = df1m.index
+    step = pd.Timedelta(to_offset(tf))
+    a = int(t1.searchsorted(index_tf[0])) if len(index_tf) else 0
+    b = int(t1.searchsorted(index_tf[-1] + step)) if len(index_tf) else 0
+    lo = t1[a:b].searchsorted(index_tf, side="left")
+    hi = t1[a:b].searchsorted(index_tf + step, side="left")
+    return PricePath(df1m["high"].to_numpy(dtype=float)[a:b], df1m["low"].to_numpy(dtype=float)[a:b],
+                     np.asarray(lo, dtype=np.int64), np.asarray(hi, dtype=np.int64))
+
+def first_exit(path: PricePath, a: int, end: int, long: bool, stop: float, tp: float, chunk: int = 256):
+    """
+    Primo elemento del percorso in [a, end) che tocca stop o TP -> (indice, prezzo di uscita),
+    (None, None) se la posizione resta aperta. Ricerca vettoriale a blocchi crescenti: i trade
+    brevi guardano pochi elementi, quelli lunghi non ripassano il percorso elemento per elemento.
+    Se stop e TP cadono nello stesso elemento vince lo stop (prudenziale, come il loop a barre).
+    """
+    high, low = path.high, path.low
+    while a < end:
+        b = min(end, a + chunk)
+        if long:
+            s = low[a:b] <= stop
+            t = high[a:b] >= tp
+        else:
+            s = high[a:b] >= stop
+            t = low[a:b] <= tp
+        hit = s | t
+        if hit.any():
+            j = int(hit.argmax())
+            return a + j, (stop if s[j] else tp)
+        a, chunk = b, chunk * 2
+    return None, None
+
+class Simulator:
+    """
+    Stato di run_sim tra slice consecutive di barre (backtest a blocchi, backtest.chunked):
+    feed() per ogni slice, la posizione aperta a fine slice cerca l'uscita nelle successive.
+    Stesse regole e stessi trade di run_sim sull'intera serie.
+    """
+    COLUMNS = ("side", "entry", "entry_time", "stop", "tp", "exit", "exit_px", "pnl")
+
+    def __init__(self, fees_bps: float = 6.0, slip_bps: float = 2.0, atr_k_stop: float = 1.2, atr_k_tp: float = 1.8):
+        self.slip_bps, self.atr_k_stop, self.atr_k_tp = slip_bps, atr_k_stop, atr_k_tp
+        self.cost = (fees_bps + slip_bps)/1e4
+        self.cols = {name: [] for name in self.COLUMNS}
+        self.open = None   # posizione senza uscita: (long, entry, entry_time, stop, tp)
+
+    def _close(self, pos, exit_time, exit_px) -> None:
+        long, entry, entry_time, stop, tp = pos
+        pnl = ((exit_px - entry) if long else (entry - exit_px)) / entry - self.cost
+        for name, v in zip(self.COLUMNS, ("LONG" if long else "SHORT", entry, entry_time, stop, tp, exit_time,
+                                           exit_px, pnl)):
+            self.cols[name].append(v)
+
+    def feed(self, index: pd.DatetimeIndex, close: np.ndarray, sides: np.ndarray, atr_v: np.ndarray,
+             path: PricePath) -> None:
+        if len(path.lo) != len(index):
+            raise ValueError(f"path: {len(path.lo)} barre, df: {len(index)}")
+        if not len(index):
+            return
+        end = int(path.hi[-1])
+        # tempi come posizioni nella slice, materializzati a fine slice (boxing per trade costa piu' della ricerca)
+        entries, exits = [], []
+        k = 0  # prima barra in cui si puo' entrare
+        if self.open is not None:
+            long, _, _, stop, tp = self.open
+            j, exit_px = first_exit(path, int(path.lo[0]), end, long, stop, tp)
+            if j is None:
+                return
+            k = int(np.searchsorted(path.hi, j, side="right"))  # barra che contiene l'elemento j
+            self._close(self.open, None, exit_px)
+            exits.append(k)
+            self.open = None
+
+        # solo le barre dove si puo' entrare (segnale e ATR > 0, NaN esclusi): il loop salta
+        # da un ingresso al successivo invece di visitare ogni barra
+        is_long = sides == "LONG"
+        cand = np.flatnonzero((is_long | (sides == "SHORT")) & (atr_v > 0)).tolist()
+        slip = self.slip_bps/1e4
+        while True:
+            c = bisect_left(cand, k)
+            if c == len(cand):
+                break
+            i = cand[c]
+            atrv = float(atr_v[i])
+            price = float(close[i])
+            long = bool(is_long[i])
+            if long:
+                entry = price * (1 + slip)
+                stop = entry - atrv * self.atr_k_stop
+                tp   = entry + atrv * self.atr_k_tp
+            else:
+                entry = price * (1 - slip)
+                stop = entry + atrv * self.atr_k_stop
+                tp   = entry - atrv * self.atr_k_tp
+
+            j, exit_px = first_exit(path, int(path.hi[i]), end, long, stop, tp)
+            if j is None:
+                self.open = (long, entry, index[i], stop, tp)
+                break
+            k = int(np.searchsorted(path.hi, j, side="right"))
+            self._close((long, entry, None, stop, tp), None, exit_px)
+            entries.append(i)
+            exits.append(k)
+
+        # entry_time/exit None appena aggiunti -> timestamp della slice
+        n = len(exits)
+        if n:
+            et, ex = self.cols["entry_time"], self.cols["exit"]
+            ex[-n:] = index.take(exits)
+            if entries:
+                et[-len(entries):] = index.take(entries)
+
+    def trades(self) -> pd.DataFrame:
+        """Trade chiusi finora (DataFrame vuoto se nessuno); la posizione aperta non compare."""
+        if not self.cols["pnl"]:
+            return pd.DataFrame()
+        return pd.DataFrame(self.cols)
+
 def run_sim(df: pd.DataFrame,
             side_col: str,
             fees_bps: float = 6.0,
             slip_bps: float = 2.0,
             risk_per_trade: float = 0.01,
             atr_k_stop: float = 1.2,
-            atr_k_tp: float = 1.8):
-    df = df.copy()
-    df["ATR"] = atr(df, 14)
-    trades = []
-    pos = None
-
-    for ts, row in df.iterrows():
-        signal = row[side_col]  # "LONG" / "SHORT" / None
-        price = row["close"]
-
-        # exit conditions if in position
-        if pos is not None:
-            if pos["side"] == "LONG":
-                if row["low"] <= pos["stop"]:
-                    exit_px = pos["stop"]
-                    pnl = (exit_px - pos["entry"]) / pos["entry"]
-                    pnl -= (fees_bps + slip_bps)/1e4
-                    trades.append({**pos, "exit": ts, "exit_px": exit_px, "pnl": pnl})
-                    pos = None
-                elif row["high"] >= pos["tp"]:
-                    exit_px = pos["tp"]
-                    pnl = (exit_px - pos["entry"]) / pos["entry"]
-                    pnl -= (fees_bps + slip_bps)/1e4
-                    trades.append({**pos, "exit": ts, "exit_px": exit_px, "pnl": pnl})
-                    pos = None
-            else:  # SHORT
-                if row["high"] >= pos["stop"]:
-                    exit_px = pos["stop"]
-                    pnl = (pos["entry"] - exit_px) / pos["entry"]
-                    pnl -= (fees_bps + slip_bps)/1e4
-                    trades.append({**pos, "exit": ts, "exit_px": exit_px, "pnl": pnl})
-                    pos = None
-                elif row["low"] <= pos["tp"]:
-                    exit_px = pos["tp"]
-                    pnl = (pos["entry"] - exit_px) / pos["entry"]
-                    pnl -= (fees_bps + slip_bps)/1e4
-                    trades.append({**pos, "exit": ts, "exit_px": exit_px, "pnl": pnl})
-                    pos = None
-
-        # entry at bar close (if flat)
-        if pos is None and signal in ("LONG","SHORT"):
-            atrv = row["ATR"]
-            if pd.isna(atrv) or atrv <= 0:
-                continue
-            if signal == "LONG":
-                entry = price * (1 + slip_bps/1e4)
-                stop = entry - atrv * atr_k_stop
-                tp   = entry + atrv * atr_k_tp
-            else:
-                entry = price * (1 - slip_bps/1e4)
-                stop = entry + atrv * atr_k_stop
-                tp   = entry - atrv * atr_k_tp
-            pos = {"side": signal, "entry": entry, "entry_time": ts, "stop": stop, "tp": tp}
-
-    trades_df = pd.DataFrame(trades)
-    return trades_df
+            atr_k_tp: float = 1.8,
+            atr_series: pd.Series = None,
+            path: PricePath = None):
+    """
+    Una posizione alla volta: entry a close della barra col segnale (se flat e ATR valido),
+    uscita al primo tocco di stop/TP dalla barra successiva; dopo un'uscita si puo' rientrare
+    alla close della stessa barra. Una posizione ancora aperta a fine dati non genera trade.
+    path: percorso per le uscite (default: barre di `df`, bar_path); con intrabar_path stop e TP
+    sono risolti nell'ordine in cui li tocca il percorso 1m dentro la barra, invece di
+    assumere sempre lo stop per primo. `exit` resta la barra del timeframe che contiene l'uscita.
+    """
+    # niente df.copy(): lavoriamo su array numpy
+    # atr_series: ATR precalcolato (riusabile tra piu' config sullo stesso frame)
+    atr_v = (atr_series if atr_series is not None else atr(df, 14)).to_numpy()
+    if path is None:
+        path = bar_path(df["high"].to_numpy(), df["low"].to_numpy())
+    sim = Simulator(fees_bps, slip_bps, atr_k_stop, atr_k_tp)
+    sim.feed(df.index, df["close"].to_numpy(), df[side_col].to_numpy(), atr_v, path)
+    return sim.trades()
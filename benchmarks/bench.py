@@ -0,0 +1,311 @@
+"""
+benchmarks/bench.py
+Benchmark riproducibili degli hot path (scoring, feature, simulatore, portafoglio, decodifica, CLI end-to-end, memoria).
+Risultati in JSON confrontabili tra commit con benchmarks/compare.py.
+
+Uso (dalla root della repo):
+    python benchmarks/bench.py --out bench_results.json            # dati sintetici (seed fisso)
+    python benchmarks/bench.py --quick                             # taglie ridotte (CI / smoke)
+    python benchmarks/bench.py --data data --symbol ETHUSDT        # CSV registrati da backtest.ingest
+    python benchmarks/bench.py --only score,sim                    # solo alcuni casi
+    python benchmarks/bench.py --only cli --baseline-rev <commit>  # import della CLI anche su <commit>
+Convenzione metriche: *_per_s piu' alto = meglio; *_us, *_ms, *_s, *_mb piu' basso = meglio.
+"""
+import argparse, asyncio, json, os, platform, statistics, subprocess, sys, threading, time, tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+KIT = os.path.join(ROOT, "backtest", "EtherPulse-backtest-kit")
+sys.path[:0] = [ROOT, KIT, os.path.dirname(os.path.abspath(__file__))]
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from eth_signal_kit.engine import compute_score, SignalInputs, BearWeights, BullWeights, ScoringModel
+from eth_signal_kit.mock_exchange import MockExchange, SyntheticMarket
+from eth_signal_kit.data_sources import codecs
+from backtest.features import resample_to, enrich_features
+from backtest.run import decide_frame, decide_row
+from backtest.sim import run_sim, intrabar_path
+from backtest.portfolio import run_portfolio
+import fixtures
+from reference import compute_score_baseline
+
+CONFIG = os.path.join(ROOT, "config.yaml")
+
+def _timeit(fn, repeat: int):
+    """Ritorna (min, mediana) in secondi su `repeat` esecuzioni."""
+    xs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        xs.append(time.perf_counter() - t0)
+    return min(xs), statistics.median(xs)
+
+def _peak_mb(fn) -> float:
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+def _features(df_tf, fund, oi, cfg):
+    th = cfg.get("thresholds", {}) or {}
+    return enrich_features(df_tf, fund, oi, int(th.get("cvd_window_min", 60)),
+                           cfg.get("pivot_mode", "floor"), int(th.get("donchian_window", 55)),
+                           int(th.get("breakout_confirm_candles", 1)))
+
+# ----------------------------
+# Casi
+# ----------------------------
+def bench_score(cfg, n_calls: int, repeat: int):
+    rng = np.random.default_rng(1)
+    xs = [SignalInputs(funding_rate=float(rng.normal(0.0001, 0.0003)), oi_drop_pct=float(rng.uniform(0, 10)),
+                       oi_rise_pct=float(rng.uniform(0, 10)), liq_usd_15m=float(rng.uniform(0, 3e8)),
+                       cvd_slope=float(rng.normal()), broke_pivot_down=bool(rng.random() < .1),
+                       broke_pivot_up=bool(rng.random() < .1), above_vwap=bool(rng.random() < .5),
+                       broke_vwap_up=bool(rng.random() < .1), broke_vwap_down=bool(rng.random() < .1),
+                       vwap_distance_pct=float(rng.uniform(0, 1)),
+                       whales_net_selling_7d=[None, True, False][int(rng.integers(3))]) for _ in range(1000)]
+    bw, uw = BearWeights(**cfg["bear_weights"]), BullWeights(**cfg["bull_weights"])
+    th = {**cfg["thresholds"], "decision.sell_score": cfg["decision"]["sell_score"],
+          "decision.buy_score": cfg["decision"]["buy_score"]}
+    rounds = max(1, n_calls // len(xs))
+
+    score = ScoringModel(bw, uw, th).score
+
+    def run():
+        for _ in range(rounds):
+            for x in xs:
+                compute_score(x, bw, uw, th)
+
+    def run_model():
+        for _ in range(rounds):
+            for x in xs:
+                score(x)
+
+    def run_baseline():
+        for _ in range(rounds):
+            for x in xs:
+                compute_score_baseline(x, bw, uw, th)
+
+    # compute_score e baseline alternati nello stesso processo (stesso rumore di fondo)
+    cur, base = [], []
+    for _ in range(repeat):
+        cur.append(_timeit(run, 1)[0])
+        base.append(_timeit(run_baseline, 1)[0])
+    best, med, b_best = min(cur), statistics.median(cur), min(base)
+    m_best, m_med = _timeit(run_model, repeat)
+    n = rounds * len(xs)
+    return {"calls": n, "calls_per_s": n / best, "per_call_us": best / n * 1e6, "median_s": med,
+            "baseline_calls_per_s": n / b_best, "vs_baseline": b_best / best,
+            "model_calls_per_s": n / m_best, "model_per_call_us": m_best / n * 1e6, "model_median_s": m_med}
+
+def bench_decide(feats, cfg, repeat: int, row_sample: int):
+    best, med = _timeit(lambda: decide_frame(feats, cfg), repeat)
+    sample = feats.iloc[:row_sample]
+    row_best, _ = _timeit(lambda: [decide_row(r, cfg) for _, r in sample.iterrows()], 1)
+    return {"rows": len(feats), "frame_rows_per_s": len(feats) / best, "frame_median_s": med,
+            "row_rows_per_s": len(sample) / row_best}
+
+def bench_features(df1m, fund, oi, cfg, tf: str, repeat: int):
+    r_best, _ = _timeit(lambda: resample_to(df1m, tf), repeat)
+    df_tf = resample_to(df1m, tf)
+    best, med = _timeit(lambda: _features(df_tf, fund, oi, cfg), repeat)
+    return {"bars_1m": len(df1m), "bars_tf": len(df_tf),
+            "resample_per_1m_bars_s": r_best / len(df1m) * 1e6,
+            "enrich_per_1m_bars_s": best / len(df_tf) * 1e6, "enrich_median_s": med}
+
+def bench_sim(feats, cfg, repeat: int, df1m, tf: str):
+    dec = decide_frame(feats, cfg)["decision"]
+    sim_df = feats[["close", "high", "low"]].assign(
+        side=np.where(dec == "BUY", "LONG", np.where(dec == "SELL", "SHORT", None)))
+    box = {}
+    best, med = _timeit(lambda: box.setdefault("t", run_sim(sim_df, "side")), repeat)
+    p_best, _ = _timeit(lambda: box.setdefault("p", intrabar_path(df1m, sim_df.index, tf)), repeat)
+    i_best, i_med = _timeit(lambda: run_sim(sim_df, "side", path=box["p"]), repeat)
+    return {"bars": len(sim_df), "trades": int(len(box["t"])), "bars_per_s": len(sim_df) / best, "median_s": med,
+            "intrabar_path_s": p_best, "intrabar_bars_per_s": len(sim_df) / i_best, "intrabar_median_s": i_med}
+
+def bench_portfolio(feats, cfg, repeat: int, n_symbols: int):
+    """run_portfolio su n_symbols copie del frame con segnali sfasati (capitale condiviso, tetti attivi)."""
+    dec = decide_frame(feats, cfg)["decision"].to_numpy()
+    frames = {}
+    for i in range(n_symbols):
+        d = np.roll(dec, i * 97)
+        frames[f"SYM{i}"] = feats[["close", "high", "low"]].assign(
+            side=np.where(d == "BUY", "LONG", np.where(d == "SELL", "SHORT", None)))
+    box = {}
+    best, med = _timeit(lambda: box.setdefault("r", run_portfolio(frames, max_gross=3.0, max_positions=10)), repeat)
+    return {"symbols": n_symbols, "bars": len(feats), "trades": int(len(box["r"][0])),
+            "bar_symbols_per_s": n_symbols * len(feats) / best, "median_s": med}
+
+def bench_memory(df1m, fund, oi, cfg, tf: str):
+    df_tf = resample_to(df1m, tf)
+    feats = _features(df_tf, fund, oi, cfg)
+    dec = decide_frame(feats, cfg)["decision"]
+    sim_df = feats[["close", "high", "low"]].assign(
+        side=np.where(dec == "BUY", "LONG", np.where(dec == "SELL", "SHORT", None)))
+    return {"resample_peak_mb": _peak_mb(lambda: resample_to(df1m, tf)),
+            "enrich_peak_mb": _peak_mb(lambda: _features(df_tf, fund, oi, cfg)),
+            "decide_peak_mb": _peak_mb(lambda: decide_frame(feats, cfg)),
+            "sim_peak_mb": _peak_mb(lambda: run_sim(sim_df, "side"))}
+
+def bench_decode(repeat: int, pages: int):
+    """Decodifica di pagine klines 1m (1500 righe): json + float() per campo vs codecs tipizzato."""
+    raw = [json.dumps(SyntheticMarket(seed=i).klines("1m", 1500, 1_750_000_000_000)).encode() for i in range(pages)]
+    dec = codecs.decoder(codecs.Kline)
+
+    def stdlib():
+        for b in raw:
+            [(int(k[0]), float(k[2]), float(k[3]), float(k[4]), float(k[5]), float(k[9])) for k in json.loads(b)]
+
+    def typed():
+        for b in raw:
+            dec(b)
+
+    rows = 1500 * pages
+    json_best, _ = _timeit(stdlib, repeat)
+    typed_best, typed_med = _timeit(typed, repeat)
+    return {"backend": codecs.BACKEND, "rows": rows, "json_rows_per_s": rows / json_best,
+            "typed_rows_per_s": rows / typed_best, "typed_median_s": typed_med}
+
+# import della CLI + moduli caricati da main() per una valutazione (pipeline, se esiste nella revisione)
+IMPORT_STMT = ("import importlib, importlib.util, eth_signal_kit.cli; "
+               "[importlib.import_module(m) for m in ('eth_signal_kit.pipeline',) if importlib.util.find_spec(m)]")
+
+def _import_ms(cwd: str, env: dict, n: int) -> float:
+    xs = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, "-c", IMPORT_STMT], cwd=cwd, env={**env, "PYTHONPATH": cwd}, check=True)
+        xs.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(xs)
+
+def _baseline_import_ms(rev: str, env: dict, n: int) -> float:
+    """import_p50_ms sul pacchetto eth_signal_kit di `rev` (git archive in una dir temporanea)."""
+    import tarfile, tempfile, io
+    blob = subprocess.run(["git", "archive", "--format=tar", rev, "eth_signal_kit"], cwd=ROOT,
+                          capture_output=True, check=True).stdout
+    with tempfile.TemporaryDirectory() as tmp:
+        with tarfile.open(fileobj=io.BytesIO(blob)) as tar:
+            tar.extractall(tmp)
+        return _import_ms(tmp, env, n)
+
+def bench_cli(runs: int, baseline_rev: str = None):
+    """
+    CLI one-shot in subprocess contro il mock exchange locale (latenza reale end-to-end).
+    Con `baseline_rev` anche l'import della stessa CLI a quella revisione (baseline_import_p50_ms,
+    import_vs_baseline = rapporto, > 1 = avvio piu' lento della baseline).
+    """
+    loop = asyncio.new_event_loop()
+    mx = MockExchange()
+    loop.run_until_complete(mx.start())
+    th = threading.Thread(target=loop.run_forever, daemon=True)
+    th.start()
+    env = {**os.environ, "BINANCE_FAPI_BASE": mx.base_url, "BYBIT_BASE": mx.base_url, "PYTHONPATH": ROOT}
+    wall, help_ms = {"binance": [], "bybit": []}, []
+    try:
+        for exchange, xs in wall.items():
+            for _ in range(runs):
+                t0 = time.perf_counter()
+                subprocess.run([sys.executable, "-m", "eth_signal_kit.cli", "--exchange", exchange],
+                               cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+                xs.append((time.perf_counter() - t0) * 1000)
+        for _ in range(max(1, runs // 2)):
+            # avvio: entry point da solo (--help) e stack importato da una valutazione binance
+            t0 = time.perf_counter()
+            subprocess.run([sys.executable, "-m", "eth_signal_kit.cli", "--help"], cwd=ROOT, env=env, check=True,
+                           stdout=subprocess.DEVNULL)
+            help_ms.append((time.perf_counter() - t0) * 1000)
+        import_p50 = _import_ms(ROOT, env, max(5, runs))
+        baseline_p50 = _baseline_import_ms(baseline_rev, env, max(5, runs)) if baseline_rev else None
+        # moduli pesanti che non devono finire sul percorso live (regressione = lista non vuota);
+        # il config arriva dallo snapshot (scritto dalle run sopra): niente yaml/pydantic
+        heavy = subprocess.run([sys.executable, "-c", "import sys, eth_signal_kit.cli, eth_signal_kit.pipeline; "
+                                "eth_signal_kit.cli.load_cfg(); "
+                                "print(','.join(m for m in ('numpy', 'pandas', 'yaml', 'pydantic', 'msgpack', 'msgspec') if m in sys.modules))"],
+                               cwd=ROOT, env=env, check=True, capture_output=True, text=True).stdout.strip()
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        th.join(5)
+    import resource
+    rss_mb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    out = {"runs": runs, "binance_wall_p50_ms": statistics.median(wall["binance"]),
+            "binance_wall_max_ms": max(wall["binance"]), "bybit_wall_p50_ms": statistics.median(wall["bybit"]),
+            "bybit_wall_max_ms": max(wall["bybit"]), "import_p50_ms": import_p50, "help_p50_ms": statistics.median(help_ms),
+            "heavy_modules": heavy or "-", "child_maxrss_mb": rss_mb,
+            "mock_requests": mx.requests}
+    if baseline_p50 is not None:
+        out.update(baseline_rev=baseline_rev, baseline_import_p50_ms=baseline_p50,
+                   import_vs_baseline=import_p50 / baseline_p50)
+    return out
+
+# ----------------------------
+# Runner
+# ----------------------------
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default="bench_results.json")
+    ap.add_argument("--quick", action="store_true", help="taglie ridotte")
+    ap.add_argument("--data", default=None, help="dir CSV registrati (default: sintetici)")
+    ap.add_argument("--symbol", default="ETHUSDT")
+    ap.add_argument("--bars", type=int, default=None, help="barre 1m sintetiche (default 2M, quick 200k)")
+    ap.add_argument("--tf", default="5min")
+    ap.add_argument("--config", default=CONFIG)
+    ap.add_argument("--only", default="score,decide,features,sim,portfolio,memory,decode,cli")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--baseline-rev", default=None,
+                    help="cli: misura anche l'import della CLI a questa revisione git (es. il commit prima di una serie)")
+    args = ap.parse_args()
+
+    with open(args.config) as f:
+        cfg = yaml.safe_load(f)
+    only = set(args.only.split(","))
+    repeat = 2 if args.quick else 5
+
+    if args.data:
+        df1m, fund, oi = fixtures.recorded(args.data, args.symbol)
+        source = f"recorded:{args.data}"
+    else:
+        n = args.bars or (200_000 if args.quick else 2_000_000)
+        df1m, fund, oi = fixtures.synthetic_1m(n, seed=args.seed)
+        source = f"synthetic:{n}:seed={args.seed}"
+    feats = _features(resample_to(df1m, args.tf), fund, oi, cfg)
+
+    results = {}
+    cases = [
+        ("score", lambda: bench_score(cfg, 50_000 if args.quick else 300_000, repeat)),
+        ("decide", lambda: bench_decide(feats, cfg, repeat, 2_000 if args.quick else 10_000)),
+        ("features", lambda: bench_features(df1m, fund, oi, cfg, args.tf, repeat)),
+        ("sim", lambda: bench_sim(feats, cfg, repeat, df1m, args.tf)),
+        ("portfolio", lambda: bench_portfolio(feats, cfg, repeat, 10 if args.quick else 30)),
+        ("memory", lambda: bench_memory(df1m, fund, oi, cfg, args.tf)),
+        ("decode", lambda: bench_decode(repeat, 5 if args.quick else 40)),
+        ("cli", lambda: bench_cli(3 if args.quick else 10, args.baseline_rev)),
+    ]
+    for name, fn in cases:
+        if name in only:
+            results[name] = fn()
+            print(f"{name:9s} " + "  ".join(f"{k}={v:.4g}" if isinstance(v, float) else f"{k}={v}"
+                                            for k, v in results[name].items()), flush=True)
+
+    out = {"meta": {"git": _git_rev(), "time": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "python": platform.python_version(), "numpy": np.__version__, "pandas": pd.__version__,
+                    "platform": platform.platform(), "source": source, "tf": args.tf,
+                    "config": os.path.relpath(args.config, ROOT), "quick": args.quick},
+           "results": results}
+    with open(args.out, "w") as f:
+        json.dump(out, f, indent=2)
+    print("Saved:", args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+benchmarks/compare.py
+Confronta due file di risultati di bench.py e segnala le regressioni.
+
+Uso:
+    python benchmarks/compare.py base.json new.json --threshold 0.10
+Exit code 1 se almeno una metrica peggiora oltre la soglia (utile in CI).
+"""
+import argparse, json, sys
+
+# direzione dal suffisso del nome metrica: +1 piu' alto = meglio, -1 piu' basso = meglio
+_SUFFIX = (("_per_s", 1), ("_us", -1), ("_ms", -1), ("_s", -1), ("_mb", -1))
+
+def direction(metric: str) -> int:
+    for suffix, d in _SUFFIX:
+        if metric.endswith(suffix):
+            return d
+    return 0  # informativa (conteggi, taglie): non confrontata
+
+def compare(base: dict, new: dict, threshold: float):
+    """Ritorna righe (caso, metrica, base, new, delta relativo, stato)."""
+    rows = []
+    for case, metrics in new["results"].items():
+        old = base["results"].get(case, {})
+        for name, v in metrics.items():
+            d = direction(name)
+            if not d or name not in old or not old[name]:
+                continue
+            delta = (v - old[name]) / abs(old[name])
+            worse = -delta * d  # > 0 = peggioramento
+            state = "REGRESSION" if worse > threshold else ("improved" if worse < -threshold else "ok")
+            rows.append((case, name, old[name], v, delta, state))
+    return rows
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("base")
+    ap.add_argument("new")
+    ap.add_argument("--threshold", type=float, default=0.10, help="variazione relativa tollerata (0.10 = 10%%)")
+    args = ap.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+
+    if base["meta"].get("source") != new["meta"].get("source"):
+        print(f"attenzione: dataset diversi ({base['meta'].get('source')} vs {new['meta'].get('source')})")
+    print(f"base {base['meta'].get('git')}  ->  new {new['meta'].get('git')}")
+    rows = compare(base, new, args.threshold)
+    for case, name, a, b, delta, state in rows:
+        print(f"{case:9s} {name:26s} {a:12.4g} {b:12.4g} {delta:+8.1%}  {state}")
+    sys.exit(1 if any(r[5] == "REGRESSION" for r in rows) else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+benchmarks/fixtures.py
+Dati per i benchmark: serie sintetiche deterministiche (seed) nello stesso formato
+di backtest.features.load_*_csv, oppure i CSV registrati da backtest.ingest.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+def synthetic_1m(n_bars: int, seed: int = 7, start: str = "2024-01-01"):
+    """Ritorna (df1m, funding, oi) con n_bars barre 1m, funding 8h e OI 1h."""
+    rng = np.random.default_rng(seed)
+    idx = pd.date_range(start, periods=n_bars, freq="1min", tz="UTC", name="ts")
+    ret = rng.normal(0, 0.0012, n_bars)
+    close = 3000 * np.exp(np.cumsum(ret))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.0006, n_bars)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.0006, n_bars)))
+    vol = rng.gamma(2, 50, n_bars)
+    tb = vol * np.clip(0.5 + ret * 200 + rng.normal(0, 0.05, n_bars), 0, 1)
+    df1m = pd.DataFrame({"open": open_, "high": high, "low": low, "close": close,
+                         "volume": vol, "taker_buy_base": tb}, index=idx)
+    f_idx = idx[::480]
+    funding = pd.DataFrame({"funding_rate": rng.normal(0.0001, 0.0002, len(f_idx))}, index=f_idx)
+    o_idx = idx[::60]
+    oi = pd.DataFrame({"open_interest": 1e6 * np.exp(np.cumsum(rng.normal(0, 0.01, len(o_idx))))}, index=o_idx)
+    return df1m, funding, oi
+
+def recorded(data_dir: str, symbol: str = "ETHUSDT"):
+    """CSV registrati con backtest.ingest (stessi path di backtest.run)."""
+    from backtest.features import load_klines_csv, load_funding_csv, load_oi_csv
+    return (load_klines_csv(os.path.join(data_dir, f"binance_klines_{symbol}_1m.csv")),
+            load_funding_csv(os.path.join(data_dir, f"binance_funding_{symbol}.csv")),
+            load_oi_csv(os.path.join(data_dir, f"binance_oi_hist_{symbol}_1h.csv")))
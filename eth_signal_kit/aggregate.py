@@ -0,0 +1,219 @@
+from __future__ import annotations
+import asyncio
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Tuple
+
+from .data_sources import binance as bapi
+from .data_sources import bybit as byapi
+from .indicators import breakout
+
+# ----------------------------
+# Modalita' aggregata cross-exchange (Binance + Bybit)
+# ----------------------------
+# Tutte le chiamate dei due venue partono insieme (un solo gather): la latenza e' quella
+# della chiamata piu' lenta, non la somma. Le quantita' vengono normalizzate in unita'
+# del sottostante (ETH) prima di combinarle:
+#   OI           : somma sulle ore comuni ai venue
+#   funding      : media pesata per volume intraday in USD (quote volume delle 1m dal giorno UTC)
+#   liquidazioni : somma in USD (Bybit non espone liquidazioni via REST: contributo solo Binance)
+#   CVD          : delta taker per barra, Binance da klines (taker_buy_base), Bybit da recent-trade
+#   VWAP         : sulle 1m di entrambi i venue (tp * volume base)
+# Close/break dei pivot usano il venue di riferimento (Binance, fallback Bybit).
+
+# unita' dell'open interest per (venue, category); "contracts" richiede contract_size
+OI_UNITS = {("binance", "linear"): "base", ("bybit", "linear"): "base", ("bybit", "inverse"): "usd"}
+
+def to_base(value: float, unit: str, price: float, contract_size: float = 1.0) -> float:
+    """Converte una quantita' in unita' del sottostante."""
+    if unit == "base":
+        return value
+    if unit == "usd":
+        return value / price if price > 0 else 0.0
+    if unit == "contracts":
+        return value * contract_size
+    raise ValueError(f"unita' sconosciuta: {unit}")
+
+# barra normalizzata: (open_time_ms, open, high, low, close, volume_base, quote_volume, taker_buy_base | None)
+Bar = Tuple[int, float, float, float, float, float, float, Optional[float]]
+
+@dataclass
+class VenueData:
+    venue: str
+    funding_rate: Optional[float] = None
+    oi: Dict[int, float] = field(default_factory=dict)          # ts_ms -> OI (base)
+    bars: List[Bar] = field(default_factory=list)               # timeframe richiesto
+    bars_1m: List[Bar] = field(default_factory=list)            # dal giorno UTC (VWAP, peso funding)
+    liq_usd: Optional[float] = None
+    trades: List[Tuple[int, float]] = field(default_factory=list)  # (ts_ms, qty firmata: + buy, - sell)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+# ----------------------------
+# Fetch concorrente
+# ----------------------------
+# le risposte arrivano gia' come righe tipizzate (data_sources.codecs): qui solo normalizzazione
+def _binance_bars(kl: List[Any]) -> List[Bar]:
+    return [(k.open_time, k.open, k.high, k.low, k.close, k.volume, k.quote_volume, k.taker_buy_base) for k in kl]
+
+def _bybit_bars(kl: List[Any]) -> List[Bar]:
+    # get_kline_rows le ordina gia' crescenti
+    return [(k.start, k.open, k.high, k.low, k.close, k.volume, k.turnover, None) for k in kl]
+
+def _parse_binance(res: Dict[str, Any], out: VenueData) -> None:
+    if "funding" in res:
+        fr = res["funding"]
+        out.funding_rate = fr[0].fundingRate if fr else None
+    if "oi" in res:
+        unit = OI_UNITS[("binance", "linear")]
+        out.oi = {x.timestamp: to_base(x.sumOpenInterest, unit, 0.0) for x in res["oi"]}
+    if "liq" in res:
+        out.liq_usd = sum((L.avgPrice or L.price) * (L.executedQty or L.origQty) for L in res["liq"])
+    if "klines" in res:
+        out.bars = _binance_bars(res["klines"])
+    if "klines_1m" in res:
+        out.bars_1m = _binance_bars(res["klines_1m"])
+
+def _parse_bybit(res: Dict[str, Any], out: VenueData, category: str) -> None:
+    if "klines" in res:
+        out.bars = _bybit_bars(res["klines"])
+    if "klines_1m" in res:
+        out.bars_1m = _bybit_bars(res["klines_1m"])
+    if "funding" in res:
+        lst = res["funding"]
+        out.funding_rate = lst[0].fundingRate if lst else None   # lista V5 decrescente
+    if "oi" in res:
+        unit = OI_UNITS[("bybit", category)]
+        price = out.bars[-1][4] if out.bars else 0.0
+        out.oi = {x.timestamp: to_base(x.openInterest, unit, price) for x in res["oi"]}
+    if "trades" in res:
+        out.trades = sorted((t.time, t.size * (1.0 if t.side == "Buy" else -1.0)) for t in res["trades"])
+
+async def _gather(calls: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    keys = list(calls)
+    vals = await asyncio.gather(*calls.values(), return_exceptions=True)
+    ok, err = {}, {}
+    for k, v in zip(keys, vals):
+        if isinstance(v, BaseException):
+            err[k] = f"{type(v).__name__}: {v}"
+        else:
+            ok[k] = v
+    return ok, err
+
+async def fetch(symbol: str, interval: str, lookback: int, limit_1m: int,
+                category: str = "linear") -> Dict[str, VenueData]:
+    """Scarica i due venue in parallelo; gli errori per endpoint finiscono in VenueData.errors."""
+    calls = {
+        ("binance", "funding"):   bapi.get_funding_rows(symbol, limit=1),
+        ("binance", "oi"):        bapi.get_open_interest_rows(symbol, period="1h", limit=168),
+        ("binance", "liq"):       bapi.get_liquidation_rows(symbol=symbol, limit=200),
+        ("binance", "klines"):    bapi.get_kline_rows(symbol, interval=interval, limit=max(lookback, 30)),
+        ("binance", "klines_1m"): bapi.get_kline_rows(symbol, interval="1m", limit=limit_1m),
+        ("bybit", "funding"):     byapi.get_funding_rows(symbol, category=category, limit=1),
+        ("bybit", "oi"):          byapi.get_open_interest_rows(symbol, interval="1h", category=category, limit=168),
+        ("bybit", "klines"):      byapi.get_kline_rows(symbol, interval=interval, category=category, limit=max(lookback, 30)),
+        ("bybit", "klines_1m"):   byapi.get_kline_rows(symbol, interval="1m", category=category, limit=limit_1m),
+        ("bybit", "trades"):      byapi.get_trade_rows(symbol, category=category, limit=1000),
+    }
+    ok, err = await _gather(calls)
+    venues = {v: VenueData(v) for v in ("binance", "bybit")}
+    for v, data in venues.items():
+        res = {k: val for (vv, k), val in ok.items() if vv == v}
+        data.errors = {k: e for (vv, k), e in err.items() if vv == v}
+        try:
+            _parse_binance(res, data) if v == "binance" else _parse_bybit(res, data, category)
+        except Exception as e:
+            data.errors["parse"] = f"{type(e).__name__}: {e}"
+    return venues
+
+# ----------------------------
+# Combinazione
+# ----------------------------
+def combined_oi(venues: Dict[str, VenueData]) -> List[float]:
+    """Serie OI (base) sommata sulle ore presenti in tutti i venue che hanno risposto."""
+    series = [v.oi for v in venues.values() if v.oi]
+    if not series:
+        return []
+    common = sorted(set.intersection(*(set(s) for s in series)))
+    return [sum(s[t] for s in series) for t in common]
+
+def weighted_funding(venues: Dict[str, VenueData]) -> Optional[float]:
+    """Funding medio pesato per quote volume intraday; media semplice se mancano i volumi."""
+    pts = [(v.funding_rate, sum(b[6] for b in v.bars_1m)) for v in venues.values() if v.funding_rate is not None]
+    if not pts:
+        return None
+    w = sum(q for _, q in pts)
+    if w <= 0:
+        return sum(f for f, _ in pts) / len(pts)
+    return sum(f * q for f, q in pts) / w
+
+def merged_cvd(venues: Dict[str, VenueData], ref: List[Bar], step_ms: int) -> List[float]:
+    """
+    CVD cumulato sulla timeline del venue di riferimento: per ogni barra somma i delta
+    taker (base) dei venue. Bybit contribuisce dai recent-trade, solo sulle barre coperte
+    per intero (la prima barra parziale viene scartata).
+    """
+    delta: Dict[int, float] = {}
+    for v in venues.values():
+        if v.bars and v.bars[0][7] is not None:
+            for b in v.bars:
+                delta[b[0]] = delta.get(b[0], 0.0) + b[7] - (b[5] - b[7])
+        elif v.trades:
+            first_full = v.trades[0][0] - v.trades[0][0] % step_ms + step_ms
+            for t, q in v.trades:
+                if t >= first_full:
+                    k = t - t % step_ms
+                    delta[k] = delta.get(k, 0.0) + q
+    out, acc = [], 0.0
+    for b in ref:
+        acc += delta.get(b[0], 0.0)
+        out.append(acc)
+    return out
+
+def build_inputs(venues: Dict[str, VenueData], pivot: float, thresholds: Dict[str, Any],
+                 step_ms: int, key: Tuple[Any, ...] = ("aggregate",)) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """
+    Ritorna (campi di SignalInputs senza whales, riepilogo per venue).
+    Stesse formule della modalita' singolo exchange di pipeline.evaluate; `key` identifica lo
+    stato dei break confermati (breakout_confirm_candles) tra una valutazione e l'altra.
+    """
+    ref = next((v.bars for v in (venues["binance"], venues["bybit"]) if v.bars), [])
+    x: Dict[str, Any] = {"funding_rate": weighted_funding(venues) or 0.0, "oi_drop_pct": 0.0, "oi_rise_pct": 0.0,
+                         "liq_usd_15m": sum(v.liq_usd for v in venues.values() if v.liq_usd is not None),
+                         "cvd_slope": 0.0, "broke_pivot_down": False, "broke_pivot_up": False,
+                         "above_vwap": False, "broke_vwap_up": False, "broke_vwap_down": False,
+                         "vwap_distance_pct": 0.0}
+
+    oi = combined_oi(venues)
+    if oi:
+        cur, peak, trough = oi[-1], max(oi), min(oi)
+        if peak > 0:
+            x["oi_drop_pct"] = (peak - cur) / peak * 100.0
+        if trough > 0 and cur >= trough:
+            x["oi_rise_pct"] = (cur - trough) / trough * 100.0
+
+    cvd = merged_cvd(venues, ref, step_ms)
+    window = min(int(thresholds.get("cvd_window_min", 60)), len(cvd))
+    x["cvd_slope"] = (cvd[-1] - cvd[-window]) / window if window >= 2 else 0.0
+
+    if ref:
+        n_confirm = int(thresholds.get("breakout_confirm_candles", 1))
+        times, closes = [b[0] for b in ref], [b[4] for b in ref]
+        last_close = closes[-1]
+        x["broke_pivot_up"], x["broke_pivot_down"] = breakout.tracker(
+            (*key, "pivot"), n_confirm, step_ms).update(times, closes, [pivot] * len(ref))
+        num = sum((b[2] + b[3] + b[4]) / 3.0 * b[5] for v in venues.values() for b in v.bars_1m)
+        den = sum(b[5] for v in venues.values() for b in v.bars_1m)
+        if den > 0:
+            vwap = num / den
+            x["above_vwap"] = last_close > vwap
+            bars_1m = [(b[0], (b[2] + b[3] + b[4]) / 3.0, b[5]) for v in venues.values() for b in v.bars_1m]
+            x["broke_vwap_up"], x["broke_vwap_down"] = breakout.tracker(
+                (*key, "vwap"), n_confirm, step_ms).update(times, closes, breakout.running_vwap(times, step_ms, bars_1m))
+            x["vwap_distance_pct"] = abs(last_close - vwap) / vwap * 100.0
+
+    summary = {name: {"funding_rate": v.funding_rate,
+                      "oi_base": v.oi[max(v.oi)] if v.oi else None,
+                      "quote_volume_1d": round(sum(b[6] for b in v.bars_1m), 2),
+                      "liq_usd": v.liq_usd,
+                      "errors": v.errors}
+               for name, v in venues.items()}
+    return x, summary
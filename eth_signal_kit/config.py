@@ -0,0 +1,240 @@
+from __future__ import annotations
+import hashlib, marshal, os, sys, time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from . import metrics
+
+# ----------------------------
+# Config validato + snapshot binario
+# ----------------------------
+# load(path) ritorna un Config: dict con le stesse chiavi dello YAML, valori validati e
+# normalizzati (schema pydantic) + provenienza (path, digest sha256 del file).
+# Il risultato della validazione viene salvato in uno snapshot marshal nella cache
+# (ETHERPULSE_CACHE_DIR, default ~/.cache/etherpulse), con chiave (mtime_ns, size) e digest:
+#   - file invariato        : una stat + marshal.loads (niente yaml, niente pydantic)
+#   - toccato ma uguale     : rilettura + sha256, snapshot riusato
+#   - contenuto cambiato    : yaml.safe_load + validazione, snapshot riscritto (atomico)
+# File modificati da meno di RACY_S secondi vengono sempre confrontati per digest (mtime a
+# granularita' grossa su alcuni filesystem). Le chiavi non presenti nello YAML restano
+# assenti: i default sono quelli di chi legge il config (pipeline, engine), come prima.
+# Watcher.poll() ricarica il file se cambia (daemon: hot reload senza restart).
+
+SCHEMA_VERSION = 4   # da incrementare quando cambia lo schema: invalida gli snapshot
+RACY_S = 2.0
+_MAGIC = "etherpulse-config"
+
+class ConfigError(ValueError):
+    """Config illeggibile o non conforme allo schema (messaggio con i campi errati)."""
+
+class Config(dict):
+    """Config validato (dict normalizzato) con provenienza: `path`, `digest` (sha256 del file)."""
+    __slots__ = ("path", "digest")
+
+    def __init__(self, data: Dict[str, Any], path: str = "<dict>", digest: str = ""):
+        super().__init__(data)
+        self.path, self.digest = path, digest
+
+@lru_cache(maxsize=1)
+def _schema():
+    # pydantic importato solo quando serve validare (cache miss): l'avvio resta leggero
+    from typing import Literal, Union
+    from pydantic import BaseModel, ConfigDict, Field, field_validator
+
+    Num = Union[int, float]   # smart union: gli interi restano interi (pesi -> score interi)
+
+    class _Section(BaseModel):
+        model_config = ConfigDict(extra="allow")
+
+    class Levels(_Section):
+        pivot_primary: Optional[float] = None
+        pivot_secondary_low: Optional[float] = None
+        pivot_secondary_low2: Optional[float] = None
+        pivot_invalid_up: Optional[float] = None
+
+    class Thresholds(_Section):
+        # solo tipi e intervalli: i default sono quelli di chi legge (engine: default delle regole
+        # registrate; pipeline/backtest: cvd_window_min, donchian_window, ...). Le soglie assenti
+        # restano assenti nel dict (exclude_unset), None non e' ammesso come valore esplicito.
+        # extra ammessi: soglie di regole registrate dall'utente (engine.register)
+        funding_neutral_max: Optional[float] = None
+        funding_bull_min: Optional[float] = None
+        oi_drop_pct: Optional[float] = Field(None, ge=0)
+        oi_rise_pct: Optional[float] = Field(None, ge=0)
+        liquidations_usd_15m: Optional[float] = Field(None, ge=0)
+        cvd_window_min: Optional[int] = Field(None, ge=1)
+        vwap_min_distance_pct: Optional[float] = Field(None, ge=0)
+        whales_ratio_min_change_pct: Optional[float] = Field(None, ge=0)
+        min_bull_reasons: Optional[int] = Field(None, ge=0)
+        min_bear_reasons: Optional[int] = Field(None, ge=0)
+        margin_buy_min: Optional[Num] = None
+        margin_sell_min: Optional[Num] = None
+        breakout_confirm_candles: Optional[int] = Field(None, ge=1)
+        donchian_window: Optional[int] = Field(None, ge=1)
+        exchange_netflow_min: Optional[float] = Field(None, ge=0)
+        book_depth_levels: Optional[int] = Field(None, ge=1)
+        book_imbalance_min: Optional[float] = Field(None, ge=0, le=1)
+        microprice_skew_min: Optional[float] = Field(None, ge=0, le=1)
+
+        @field_validator("*", mode="before")
+        @classmethod
+        def _not_null(cls, v):
+            if v is None:
+                raise ValueError("valore mancante (togliere la chiave per il default)")
+            return v
+
+    class Decision(_Section):
+        sell_score: Num = 65
+        buy_score: Num = 65
+
+    class AppConfig(_Section):
+        symbol: str = "ETHUSDT"
+        interval: str = Field("1m", pattern=r"^\d+[mhdw]$")
+        lookback_min: int = Field(60, ge=1)
+        pivot_mode: Optional[Literal["static", "floor", "donchian"]] = None
+        levels: Levels = Field(default_factory=Levels)
+        thresholds: Thresholds = Field(default_factory=Thresholds)
+        bear_weights: Dict[str, Num] = Field(default_factory=dict)
+        bull_weights: Dict[str, Num] = Field(default_factory=dict)
+        decision: Decision = Field(default_factory=Decision)
+        resilience: Optional[Dict[str, Any]] = None
+
+        @field_validator("pivot_mode", mode="before")
+        @classmethod
+        def _lower(cls, v):
+            return v.lower() if isinstance(v, str) else v
+
+        @field_validator("levels", "thresholds", "decision", "bear_weights", "bull_weights", mode="before")
+        @classmethod
+        def _empty(cls, v):
+            return {} if v is None else v   # sezione presente ma vuota nello YAML
+
+    return AppConfig
+
+def validate(raw: Any, source: str = "<dict>") -> Dict[str, Any]:
+    """Valida un config gia' caricato (dict) e ritorna il dict normalizzato; ConfigError se non valido."""
+    from pydantic import ValidationError
+    if raw is None:
+        raw = {}
+    if not isinstance(raw, dict):
+        raise ConfigError(f"{source}: atteso un mapping YAML, trovato {type(raw).__name__}")
+    try:
+        return _schema().model_validate(raw).model_dump(exclude_unset=True)
+    except ValidationError as e:
+        raise ConfigError(f"{source}: config non valido\n{e}") from None
+
+def from_dict(raw: Dict[str, Any], source: str = "<dict>") -> Config:
+    """Config da un dict (test, config generati): validato, senza snapshot."""
+    data = validate(raw, source)
+    return Config(data, source, hashlib.sha256(marshal.dumps(data)).hexdigest())
+
+def label(path: str, used: Iterable[str] = ()) -> str:
+    """Etichetta di un config nell'output (nome file senza estensione, suffisso _2, _3 se ripetuto)."""
+    used = set(used)
+    name = os.path.splitext(os.path.basename(path))[0]
+    out, i = name, 2
+    while out in used:
+        out, i = f"{name}_{i}", i + 1
+    return out
+
+# ----------------------------
+# Snapshot
+# ----------------------------
+def cache_dir() -> str:
+    return os.getenv("ETHERPULSE_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "etherpulse")
+
+def _snapshot_path(path: str) -> str:
+    key = hashlib.sha1(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(cache_dir(), f"config-{key}.snap")
+
+def _read_snapshot(snap: str) -> Optional[Tuple[Any, ...]]:
+    try:
+        with open(snap, "rb") as f:
+            rec = marshal.loads(f.read())
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if (not isinstance(rec, tuple) or len(rec) != 7 or rec[0] != _MAGIC or rec[1] != SCHEMA_VERSION
+            or rec[2] != sys.implementation.cache_tag):
+        return None
+    return rec
+
+def _write_snapshot(snap: str, st: os.stat_result, digest: str, data: Dict[str, Any]) -> None:
+    rec = (_MAGIC, SCHEMA_VERSION, sys.implementation.cache_tag, st.st_mtime_ns, st.st_size, digest, data)
+    tmp = f"{snap}.{os.getpid()}.tmp"
+    try:
+        blob = marshal.dumps(rec)
+        os.makedirs(os.path.dirname(snap), exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(blob)
+        os.replace(tmp, snap)
+    except (OSError, ValueError):  # cache non scrivibile (o valori non marshal): si valida a ogni avvio
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+
+def load(path: str = "config.yaml", cache: bool = True) -> Config:
+    """Config validato da `path`, dallo snapshot se il file non e' cambiato."""
+    try:
+        st = os.stat(path)
+    except OSError as e:
+        raise ConfigError(f"{path}: {e.strerror}") from None
+    snap = _snapshot_path(path) if cache else None
+    rec = _read_snapshot(snap) if snap else None
+    racy = time.time_ns() - st.st_mtime_ns < RACY_S * 1e9
+    if rec is not None and not racy and (rec[3], rec[4]) == (st.st_mtime_ns, st.st_size):
+        metrics.CACHE_REQUESTS.inc(cache="config", result="hit")
+        return Config(rec[6], path, rec[5])
+
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    hit = rec is not None and rec[5] == digest
+    metrics.CACHE_REQUESTS.inc(cache="config", result="hit" if hit else "miss")
+    if hit:
+        data = rec[6]
+    else:
+        import yaml
+        try:
+            raw = yaml.safe_load(content)
+        except yaml.YAMLError as e:
+            raise ConfigError(f"{path}: YAML non valido\n{e}") from None
+        data = validate(raw, path)
+    if snap and (rec is None or rec[3:6] != (st.st_mtime_ns, st.st_size, digest)):
+        _write_snapshot(snap, st, digest, data)
+    return Config(data, path, digest)
+
+class Watcher:
+    """
+    Hot reload: poll() fa una stat del file e, se mtime/size cambiano, ricarica e valida.
+    Ritorna (config corrente, cambiato?). Un file non valido non sostituisce il config in
+    uso: l'errore resta in `error` finche' il file non torna valido.
+    """
+    def __init__(self, path: str, cache: bool = True):
+        self.path, self.cache = path, cache
+        self.cfg = load(path, cache)
+        self.error: Optional[str] = None
+        self._stat = self._key()
+
+    def _key(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def poll(self) -> Tuple[Config, bool]:
+        key = self._key()
+        if key is None or key == self._stat:
+            return self.cfg, False
+        self._stat = key
+        try:
+            new = load(self.path, self.cache)
+        except ConfigError as e:
+            self.error = str(e)
+            return self.cfg, False
+        self.error = None
+        if new.digest == self.cfg.digest:
+            return self.cfg, False
+        self.cfg = new
+        return new, True
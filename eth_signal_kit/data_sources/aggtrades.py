@@ -0,0 +1,343 @@
+from __future__ import annotations
+import asyncio, hashlib, json, mmap, os, re, struct, zipfile, zlib
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+BINANCE_DATA_BASE = os.getenv("BINANCE_DATA_BASE", "https://data.binance.vision")
+
+# ----------------------------
+# Archivio aggTrade (tick-level): un file per simbolo/giorno UTC, a chunk compressi, in mmap
+# ----------------------------
+# <root>/aggtrades_<SYMBOL>/<YYYY-MM-DD>.agg:
+#   MAGIC | chunk 0 | chunk 1 | ... | indice JSON | footer (offset indice, lunghezza, MAGIC)
+# Ogni chunk contiene fino a CHUNK trade (ts, id, prezzo, quantita', buyer maker) e nell'indice ha
+# offset, lunghezza, n, t0/t1 (ms): un lettore apre il file in mmap e decodifica solo i chunk che
+# intersecano l'intervallo richiesto, uno alla volta -> memoria limitata a un chunk, qualunque sia
+# la lunghezza dello storico.
+#   codec "zlib": colonne separate, ts e id in delta int32, byte-shuffle (byte i-esimo di ogni
+#                 valore contiguo) e zlib: piu' compatto dello zip CSV dei dump.
+#   codec "raw" : record TRADE contigui, zero-copy (np.frombuffer sulla mmap), ~33 byte/trade.
+# Il file viene scritto in streaming (un chunk per volta) su un temporaneo e rinominato (atomico):
+# un giorno o c'e' intero o non c'e'. Import dai dump giornalieri pubblici di Binance
+# (data.binance.vision, zip con CSV) con verifica del CHECKSUM: import_zip / fetch_days / main.
+
+MAGIC = b"EPAGG\x00\x01\x00"
+FOOTER = struct.Struct("<QI8s")
+CHUNK = 65_536
+CODECS = ("zlib", "raw")
+
+TRADE = np.dtype([("ts", "<i8"), ("id", "<i8"), ("price", "<f8"), ("qty", "<f8"), ("m", "?")])
+
+# colonne dei dump futures UM (dal 2022 con header; prima senza)
+DUMP_COLUMNS = ["agg_trade_id", "price", "quantity", "first_trade_id", "last_trade_id", "transact_time",
+                "is_buyer_maker"]
+_DUMP_NAME = re.compile(r"(?P<symbol>[A-Z0-9]+)-aggTrades-(?P<day>\d{4}-\d{2}-\d{2})\.(zip|csv)$")
+
+def day_of(ts_ms: int) -> str:
+    return datetime.fromtimestamp(ts_ms / 1000, timezone.utc).strftime("%Y-%m-%d")
+
+def day_start_ms(day: str) -> int:
+    return int(datetime.fromisoformat(day).replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def _shuffle(a: np.ndarray) -> bytes:
+    return np.ascontiguousarray(a).view(np.uint8).reshape(len(a), a.itemsize).T.tobytes()
+
+def _unshuffle(buf: bytes, dtype, n: int) -> np.ndarray:
+    dt = np.dtype(dtype)
+    return np.frombuffer(buf, np.uint8).reshape(dt.itemsize, n).T.copy().view(dt).reshape(n)
+
+def encode_chunk(c: np.ndarray, codec: str) -> bytes:
+    if codec == "raw":
+        return np.ascontiguousarray(c, TRADE).tobytes()
+    ts, ids = c["ts"], c["id"]
+    parts = [_shuffle(np.diff(ts, prepend=ts[0]).astype("<i4")), _shuffle(np.diff(ids, prepend=ids[0]).astype("<i4")),
+             _shuffle(c["price"].astype("<f8")), _shuffle(c["qty"].astype("<f8")), c["m"].astype(np.uint8).tobytes()]
+    return zlib.compress(b"".join(parts), 6)
+
+def decode_chunk(buf, meta: Dict[str, Any], codec: str) -> np.ndarray:
+    n = int(meta["n"])
+    if codec == "raw":
+        return np.frombuffer(buf, TRADE, count=n)   # vista sulla mmap, nessuna copia
+    raw = zlib.decompress(buf)
+    out = np.empty(n, TRADE)
+    o = 0
+    for name, dt, first in (("ts", "<i4", meta["t0"]), ("id", "<i4", meta["id0"])):
+        d = _unshuffle(raw[o:o + 4 * n], dt, n).astype(np.int64)
+        d[0] = first
+        out[name] = np.cumsum(d)
+        o += 4 * n
+    for name in ("price", "qty"):
+        out[name] = _unshuffle(raw[o:o + 8 * n], "<f8", n)
+        o += 8 * n
+    out["m"] = np.frombuffer(raw, np.uint8, n, o).astype(bool)
+    return out
+
+class DayWriter:
+    """Scrittura in streaming di un giorno: append() di array (anche parziali), close() rende il file visibile."""
+    def __init__(self, path: str, symbol: str, day: str, codec: str = "zlib", chunk: int = CHUNK):
+        if codec not in CODECS:
+            raise ValueError(f"aggtrades: codec non supportato: {codec}")
+        self.path, self.symbol, self.day, self.codec, self.chunk = path, symbol.upper(), day, codec, max(1, int(chunk))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._tmp = f"{path}.{os.getpid()}.tmp"
+        self._f = open(self._tmp, "wb")
+        self._f.write(MAGIC)
+        self._pending: List[np.ndarray] = []
+        self._pending_n = 0
+        self.chunks: List[Dict[str, Any]] = []
+        self.n = 0
+
+    def append(self, trades: np.ndarray) -> None:
+        if len(trades):
+            self._pending.append(np.asarray(trades, TRADE))
+            self._pending_n += len(trades)
+        while self._pending_n >= self.chunk:
+            self._flush(self.chunk)
+
+    def _flush(self, n: int) -> None:
+        buf = np.concatenate(self._pending) if len(self._pending) > 1 else self._pending[0]
+        c, rest = buf[:n], buf[n:]
+        self._pending, self._pending_n = ([rest] if len(rest) else []), len(rest)
+        blob = encode_chunk(c, self.codec)
+        self.chunks.append({"off": self._f.tell(), "len": len(blob), "n": len(c), "t0": int(c["ts"][0]),
+                            "t1": int(c["ts"][-1]), "id0": int(c["id"][0])})
+        self._f.write(blob)
+        self.n += len(c)
+
+    def close(self) -> str:
+        if self._pending_n:
+            self._flush(self._pending_n)
+        index = json.dumps({"v": 1, "symbol": self.symbol, "day": self.day, "codec": self.codec, "n": self.n,
+                            "chunks": self.chunks}, separators=(",", ":")).encode()
+        off = self._f.tell()
+        self._f.write(index)
+        self._f.write(FOOTER.pack(off, len(index), MAGIC))
+        self._f.close()
+        os.replace(self._tmp, self.path)
+        return self.path
+
+    def abort(self) -> None:
+        self._f.close()
+        try:
+            os.unlink(self._tmp)
+        except OSError:
+            pass
+
+    def __enter__(self) -> "DayWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.abort() if exc_type else self.close()
+
+class DayFile:
+    """Un giorno in lettura (mmap): `chunks` = indice, chunk(i) = trade decodificati del chunk i."""
+    def __init__(self, path: str):
+        self.path = path
+        self._f = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:   # file vuoto
+            self._f.close()
+            raise ValueError(f"aggtrades: file non valido: {path}") from None
+        off, size, magic = FOOTER.unpack_from(self._mm, len(self._mm) - FOOTER.size)
+        if magic != MAGIC or self._mm[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"aggtrades: file non valido: {path}")
+        meta = json.loads(self._mm[off:off + size])
+        self.symbol, self.day, self.codec, self.n = meta["symbol"], meta["day"], meta["codec"], int(meta["n"])
+        self.chunks: List[Dict[str, Any]] = meta["chunks"]
+
+    @property
+    def t0(self) -> Optional[int]:
+        return self.chunks[0]["t0"] if self.chunks else None
+
+    @property
+    def t1(self) -> Optional[int]:
+        return self.chunks[-1]["t1"] if self.chunks else None
+
+    def chunk(self, i: int) -> np.ndarray:
+        c = self.chunks[i]
+        buf = memoryview(self._mm)[c["off"]:c["off"] + c["len"]]
+        return decode_chunk(buf if self.codec == "raw" else bytes(buf), c, self.codec)
+
+    def close(self) -> None:
+        # le viste "raw" ancora vive tengono esportato il buffer: la mmap si chiude con l'ultima
+        try:
+            self._mm.close()
+        except BufferError:
+            pass
+        self._f.close()
+
+    def __enter__(self) -> "DayFile":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+class Archive:
+    """
+    Archivio di un simbolo. iter_chunks()/iter_trades() attraversano i giorni in ordine
+    leggendo solo i chunk nell'intervallo [start_ms, end_ms) (None = senza limite).
+    """
+    def __init__(self, root: Optional[str] = None, symbol: str = "ETHUSDT"):
+        if root is None:
+            from ..config import cache_dir
+            root = os.getenv("ETHERPULSE_TRADES_DIR") or os.path.join(cache_dir(), "trades")
+        self.root, self.symbol = root, symbol.upper()
+
+    @property
+    def dir(self) -> str:
+        return os.path.join(self.root, f"aggtrades_{self.symbol}")
+
+    def path(self, day: str) -> str:
+        return os.path.join(self.dir, f"{day}.agg")
+
+    def days(self) -> List[str]:
+        try:
+            return sorted(f[:-4] for f in os.listdir(self.dir) if f.endswith(".agg"))
+        except FileNotFoundError:
+            return []
+
+    def has(self, day: str) -> bool:
+        return os.path.exists(self.path(day))
+
+    def writer(self, day: str, codec: str = "zlib", chunk: int = CHUNK) -> DayWriter:
+        return DayWriter(self.path(day), self.symbol, day, codec, chunk)
+
+    def iter_chunks(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[np.ndarray]:
+        lo = day_of(start_ms) if start_ms is not None else ""
+        hi = day_of(end_ms - 1) if end_ms is not None else "9999"
+        for day in self.days():
+            if not lo <= day <= hi:
+                continue
+            with DayFile(self.path(day)) as f:
+                for i, c in enumerate(f.chunks):
+                    if (start_ms is not None and c["t1"] < start_ms) or (end_ms is not None and c["t0"] >= end_ms):
+                        continue
+                    out = f.chunk(i)
+                    if (start_ms is not None and c["t0"] < start_ms) or (end_ms is not None and c["t1"] >= end_ms):
+                        ts = out["ts"]
+                        out = out[np.searchsorted(ts, start_ms if start_ms is not None else ts[0]):
+                                  np.searchsorted(ts, end_ms) if end_ms is not None else len(ts)]
+                    if f.codec == "raw":
+                        out = out.copy()   # il chunk sopravvive alla chiusura del file
+                    if len(out):
+                        yield out
+
+    def iter_trades(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """Replay trade per trade con le chiavi del payload aggTrade Binance (a, p, q, T, m)."""
+        for c in self.iter_chunks(start_ms, end_ms):
+            for ts, i, p, q, m in zip(c["ts"].tolist(), c["id"].tolist(), c["price"].tolist(), c["qty"].tolist(),
+                                      c["m"].tolist()):
+                yield {"a": i, "p": p, "q": q, "T": ts, "m": m}
+
+# ----------------------------
+# Import dai dump Binance (data.binance.vision)
+# ----------------------------
+def dump_url(symbol: str, day: str) -> str:
+    s = symbol.upper()
+    return f"{BINANCE_DATA_BASE}/data/futures/um/daily/aggTrades/{s}/{s}-aggTrades-{day}.zip"
+
+def _csv_chunks(f, chunk: int) -> Iterator[np.ndarray]:
+    import pandas as pd
+    head = f.readline()
+    f.seek(0)
+    header = 0 if head[:1].isalpha() else None   # dump recenti con header, vecchi senza
+    reader = pd.read_csv(f, header=header, names=DUMP_COLUMNS, usecols=["agg_trade_id", "price", "quantity",
+                         "transact_time", "is_buyer_maker"], chunksize=chunk,
+                         true_values=["true", "True", "TRUE"], false_values=["false", "False", "FALSE"],
+                         dtype={"agg_trade_id": "int64", "price": "float64", "quantity": "float64",
+                                "transact_time": "int64", "is_buyer_maker": "bool"})
+    for df in reader:
+        out = np.empty(len(df), TRADE)
+        out["ts"], out["id"] = df["transact_time"].to_numpy(), df["agg_trade_id"].to_numpy()
+        out["price"], out["qty"], out["m"] = df["price"].to_numpy(), df["quantity"].to_numpy(), df["is_buyer_maker"].to_numpy()
+        yield out
+
+def import_zip(archive: Archive, path: str, codec: str = "zlib", chunk: int = CHUNK) -> str:
+    """Dump giornaliero (zip o CSV `<SYMBOL>-aggTrades-<YYYY-MM-DD>`) -> file del giorno nell'archivio."""
+    m = _DUMP_NAME.search(os.path.basename(path))
+    if not m or m["symbol"] != archive.symbol:
+        raise ValueError(f"aggtrades: nome dump inatteso per {archive.symbol}: {path}")
+    with archive.writer(m["day"], codec, chunk) as w:
+        if path.endswith(".zip"):
+            with zipfile.ZipFile(path) as z, z.open(z.namelist()[0]) as raw:
+                for c in _csv_chunks(raw, chunk):
+                    w.append(c)
+        else:
+            with open(path, "rb") as f:
+                for c in _csv_chunks(f, chunk):
+                    w.append(c)
+    return w.path
+
+async def download_day(client, symbol: str, day: str, dest: str) -> Optional[str]:
+    """Scarica lo zip del giorno in `dest` verificando lo sha256 del .CHECKSUM; None se non pubblicato."""
+    url = dump_url(symbol, day)
+    r = await client.get(url + ".CHECKSUM")
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    expected = r.text.split()[0].lower()
+    path = os.path.join(dest, os.path.basename(url))
+    h = hashlib.sha256()
+    async with client.stream("GET", url) as resp:
+        resp.raise_for_status()
+        with open(path, "wb") as f:
+            async for part in resp.aiter_bytes(1 << 20):
+                f.write(part)
+                h.update(part)
+    if h.hexdigest() != expected:
+        os.unlink(path)
+        raise ValueError(f"aggtrades: checksum errato per {url}")
+    return path
+
+def day_range(start: str, end: str) -> List[str]:
+    d0, d1 = date.fromisoformat(start), date.fromisoformat(end)
+    return [(d0 + timedelta(days=i)).isoformat() for i in range((d1 - d0).days + 1)]
+
+async def fetch_days(archive: Archive, start: str, end: str, codec: str = "zlib", force: bool = False,
+                     keep_zip: bool = False) -> List[str]:
+    """Importa i giorni [start, end] mancanti nell'archivio (incrementale); ritorna i path scritti."""
+    import httpx
+    todo = [d for d in day_range(start, end) if force or not archive.has(d)]
+    written = []
+    os.makedirs(archive.dir, exist_ok=True)
+    async with httpx.AsyncClient(timeout=120, follow_redirects=True) as client:
+        for day in todo:
+            z = await download_day(client, archive.symbol, day, archive.dir)
+            if z is None:
+                print(f"aggtrades: {archive.symbol} {day} non ancora pubblicato")
+                continue
+            try:
+                written.append(await asyncio.to_thread(import_zip, archive, z, codec))
+            finally:
+                if not keep_zip:
+                    os.unlink(z)
+    return written
+
+def main():
+    import argparse
+    ap = argparse.ArgumentParser(description="Archivio aggTrade: import dei dump giornalieri Binance (futures UM)")
+    ap.add_argument("--symbol", default="ETHUSDT")
+    ap.add_argument("--start", help="YYYY-MM-DD (download da data.binance.vision)")
+    ap.add_argument("--end", help="YYYY-MM-DD (incluso)")
+    ap.add_argument("--files", nargs="*", default=[], help="dump gia' scaricati (<SYMBOL>-aggTrades-<giorno>.zip/.csv)")
+    ap.add_argument("--out", default=None, help="root dell'archivio (default ETHERPULSE_TRADES_DIR o cache del kit)")
+    ap.add_argument("--codec", default="zlib", choices=CODECS)
+    ap.add_argument("--force", type=lambda x: x.lower()=="true", default=False, help="true = reimporta i giorni presenti")
+    ap.add_argument("--keep-zip", type=lambda x: x.lower()=="true", default=False)
+    args = ap.parse_args()
+
+    archive = Archive(args.out, args.symbol)
+    written = [import_zip(archive, p, args.codec) for p in args.files]
+    if args.start:
+        written += asyncio.run(fetch_days(archive, args.start, args.end or args.start, args.codec, args.force,
+                                          args.keep_zip))
+    for p in written:
+        with DayFile(p) as f:
+            print(p, f.n, f"{os.path.getsize(p) / max(f.n, 1):.1f} B/trade")
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,8 @@ from __future__ import annotations
 
 import os
 from typing import Dict, Any, List, Optional
-import httpx
+from .transport import request_json
+from . import codecs
 
 # Permette override (es. per proxy o mirror)
 BINANCE_FAPI_BASE = os.getenv("BINANCE_FAPI_BASE", "https://fapi.binance.com")
@@ -31,16 +32,13 @@ async def get_top_accounts_long_short_ratio(
     )
     url = f"{BINANCE_FAPI_BASE}/futures/data/{ep}"
     params = {"symbol": symbol, "period": period, "limit": min(int(limit), 500)}
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json() or []
-        # tipicamente già in ordine crescente; non fa male assicurarsi
-        try:
-            data.sort(key=lambda x: int(x.get("timestamp", 0)))
-        except Exception:
-            pass
-        return data  # [{ "longShortRatio": "1.23", "timestamp": 123456789, ...}, ...]
+    data = await request_json("GET", url, params=params, label="binance.top_long_short_ratio") or []
+    # tipicamente già in ordine crescente; non fa male assicurarsi
+    try:
+        data.sort(key=lambda x: int(x.get("timestamp", 0)))
+    except Exception:
+        pass
+    return data  # [{ "longShortRatio": "1.23", "timestamp": 123456789, ...}, ...]
 
 # -----------------------------
 # Funding
@@ -52,10 +50,7 @@ async def get_funding_rates(symbol: str, limit: int = 200) -> List[Dict[str, Any
     """
     url = f"{BINANCE_FAPI_BASE}/fapi/v1/fundingRate"
     params = {"symbol": symbol, "limit": min(int(limit), 1000)}
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
+    return await request_json("GET", url, params=params, label="binance.funding_rate")
 
 async def get_funding_info() -> List[Dict[str, Any]]:
     """
@@ -63,10 +58,20 @@ async def get_funding_info() -> List[Dict[str, Any]]:
     Docs: GET /fapi/v1/fundingInfo
     """
     url = f"{BINANCE_FAPI_BASE}/fapi/v1/fundingInfo"
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url)
-        r.raise_for_status()
-        return r.json()
+    return await request_json("GET", url, label="binance.funding_info")
+
+# -----------------------------
+# Order book
+# -----------------------------
+async def get_depth(symbol: str, limit: int = 1000) -> Dict[str, Any]:
+    """
+    Snapshot del book (sync del diff stream <symbol>@depth, vedi data_sources.depth).
+    Docs: GET /fapi/v1/depth  (limit 5, 10, 20, 50, 100, 500, 1000)
+    Ritorna {"lastUpdateId", "E", "T", "bids": [[price, qty], ...], "asks": [...]}.
+    """
+    url = f"{BINANCE_FAPI_BASE}/fapi/v1/depth"
+    params = {"symbol": symbol, "limit": int(limit)}
+    return await request_json("GET", url, params=params, label="binance.depth")
 
 # -----------------------------
 # Open Interest
@@ -78,10 +83,7 @@ async def get_open_interest(symbol: str) -> Dict[str, Any]:
     """
     url = f"{BINANCE_FAPI_BASE}/fapi/v1/openInterest"
     params = {"symbol": symbol}
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
+    return await request_json("GET", url, params=params, label="binance.open_interest")
 
 async def get_open_interest_hist(
     symbol: str,
@@ -94,16 +96,13 @@ async def get_open_interest_hist(
     """
     url = f"{BINANCE_FAPI_BASE}/futures/data/openInterestHist"
     params = {"symbol": symbol, "period": period, "limit": min(int(limit), 500)}
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json() or []
-        # garantiamo ordinamento per time
-        try:
-            data.sort(key=lambda x: int(x.get("timestamp", 0)))
-        except Exception:
-            pass
-        return data
+    data = await request_json("GET", url, params=params, label="binance.open_interest_hist") or []
+    # garantiamo ordinamento per time
+    try:
+        data.sort(key=lambda x: int(x.get("timestamp", 0)))
+    except Exception:
+        pass
+    return data
 
 # -----------------------------
 # Klines (OHLCV)
@@ -121,16 +120,13 @@ async def get_klines(
     """
     url = f"{BINANCE_FAPI_BASE}/fapi/v1/klines"
     params = {"symbol": symbol, "interval": interval, "limit": min(int(limit), 1500)}
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json() or []
-        # in genere già ordinate per openTime crescente
-        try:
-            data.sort(key=lambda x: int(x[0]))
-        except Exception:
-            pass
-        return data
+    data = await request_json("GET", url, params=params, label="binance.klines") or []
+    # in genere già ordinate per openTime crescente
+    try:
+        data.sort(key=lambda x: int(x[0]))
+    except Exception:
+        pass
+    return data
 
 # -----------------------------
 # Liquidations (force orders)
@@ -156,13 +152,59 @@ async def get_all_liquidations(
         params["startTime"] = int(startTime)
     if endTime:
         params["endTime"] = int(endTime)
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json() or []
-        # spesso già ordinati; proviamo a normalizzare in ogni caso
-        try:
-            data.sort(key=lambda x: int(x.get("time", 0)))
-        except Exception:
-            pass
-        return data
+    data = await request_json("GET", url, params=params, label="binance.force_orders") or []
+    # spesso già ordinati; proviamo a normalizzare in ogni caso
+    try:
+        data.sort(key=lambda x: int(x.get("time", 0)))
+    except Exception:
+        pass
+    return data
+
+# -----------------------------
+# Varianti tipizzate (righe codecs con campi gia' numerici, decodificate in un passaggio)
+# -----------------------------
+async def get_kline_rows(symbol: str, interval: str = "1m", limit: int = 500) -> List[Any]:
+    """Come get_klines, ma ritorna codecs.Kline (open_time, open, ..., taker_buy_base) ordinate."""
+    url = f"{BINANCE_FAPI_BASE}/fapi/v1/klines"
+    params = {"symbol": symbol, "interval": interval, "limit": min(int(limit), 1500)}
+    rows = await request_json("GET", url, params=params, label="binance.klines",
+                              decoder=codecs.decoder(codecs.Kline)) or []
+    rows.sort(key=lambda k: k.open_time)
+    return rows
+
+async def get_funding_rows(symbol: str, limit: int = 200) -> List[Any]:
+    """Come get_funding_rates, ma ritorna codecs.FundingRate."""
+    url = f"{BINANCE_FAPI_BASE}/fapi/v1/fundingRate"
+    params = {"symbol": symbol, "limit": min(int(limit), 1000)}
+    return await request_json("GET", url, params=params, label="binance.funding_rate",
+                              decoder=codecs.decoder(codecs.FundingRate)) or []
+
+async def get_open_interest_rows(symbol: str, period: str = "5m", limit: int = 200) -> List[Any]:
+    """Come get_open_interest_hist, ma ritorna codecs.OpenInterestHist ordinate per timestamp."""
+    url = f"{BINANCE_FAPI_BASE}/futures/data/openInterestHist"
+    params = {"symbol": symbol, "period": period, "limit": min(int(limit), 500)}
+    rows = await request_json("GET", url, params=params, label="binance.open_interest_hist",
+                              decoder=codecs.decoder(codecs.OpenInterestHist)) or []
+    rows.sort(key=lambda x: x.timestamp)
+    return rows
+
+async def get_liquidation_rows(symbol: Optional[str] = None, limit: int = 1000) -> List[Any]:
+    """Come get_all_liquidations (senza finestra temporale), ma ritorna codecs.ForceOrder."""
+    url = f"{BINANCE_FAPI_BASE}/fapi/v1/allForceOrders"
+    params: Dict[str, Any] = {"limit": min(int(limit), 1000)}
+    if symbol:
+        params["symbol"] = symbol
+    rows = await request_json("GET", url, params=params, label="binance.force_orders",
+                              decoder=codecs.decoder(codecs.ForceOrder)) or []
+    rows.sort(key=lambda x: x.time)
+    return rows
+
+async def get_top_ratio_rows(symbol: str, period: str = "4h", limit: int = 100, source: str = "account") -> List[Any]:
+    """Come get_top_accounts_long_short_ratio, ma ritorna codecs.LongShortRatio."""
+    ep = "topLongShortAccountRatio" if source.lower().startswith("acc") else "topLongShortPositionRatio"
+    url = f"{BINANCE_FAPI_BASE}/futures/data/{ep}"
+    params = {"symbol": symbol, "period": period, "limit": min(int(limit), 500)}
+    rows = await request_json("GET", url, params=params, label="binance.top_long_short_ratio",
+                              decoder=codecs.decoder(codecs.LongShortRatio)) or []
+    rows.sort(key=lambda x: x.timestamp)
+    return rows
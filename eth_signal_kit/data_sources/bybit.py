@@ -1,7 +1,9 @@
 from __future__ import annotations
 import os
 from typing import Dict, Any, List
-import httpx
+
+from .transport import request_json
+from . import codecs
 
 # Permette override (es. testnet: https://api-testnet.bybit.com)
 BYBIT_BASE = os.getenv("BYBIT_BASE", "https://api.bybit.com")
@@ -23,10 +25,7 @@ async def get_open_interest(
         "intervalTime": interval,
         "limit": min(limit, 200)
     }
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
+    return await request_json("GET", url, params=params, label="bybit.open_interest")
 
 async def get_funding_history(
     symbol: str,
@@ -43,10 +42,25 @@ async def get_funding_history(
         "symbol": symbol,
         "limit": min(limit, 200)
     }
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
+    return await request_json("GET", url, params=params, label="bybit.funding_history")
+
+async def get_recent_trades(
+    symbol: str,
+    category: str = "linear",
+    limit: int = 500
+) -> Dict[str, Any]:
+    """
+    Bybit recent public trades (public).
+    Docs: GET /v5/market/recent-trade
+    result.list: [{execId, symbol, price, size, side: Buy|Sell, time, isBlockTrade}, ...] (piu' recenti prima)
+    """
+    url = f"{BYBIT_BASE}/v5/market/recent-trade"
+    params = {
+        "category": category,
+        "symbol": symbol,
+        "limit": min(limit, 1000)
+    }
+    return await request_json("GET", url, params=params, label="bybit.recent_trades")
 
 # ---- Klines --------------------------------------------------------
 
@@ -77,10 +91,41 @@ async def get_klines(
         "interval": iv,
         "limit": min(limit, 1000)
     }
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.get(url, params=params)
-        r.raise_for_status()
-        data = r.json()
-        lst = data.get("result", {}).get("list", []) or []
-        lst.sort(key=lambda x: int(x[0]))  # ensure ascending by timestamp
-        return lst
+    data = await request_json("GET", url, params=params, label="bybit.klines")
+    lst = data.get("result", {}).get("list", []) or []
+    lst.sort(key=lambda x: int(x[0]))  # ensure ascending by timestamp
+    return lst
+
+# ---- Varianti tipizzate (righe codecs, envelope V5 gia' verificato) ----
+
+async def get_kline_rows(symbol: str, interval: str = "1m", category: str = "linear", limit: int = 200) -> List[Any]:
+    """Come get_klines, ma ritorna codecs.BybitKline in ordine crescente."""
+    url = f"{BYBIT_BASE}/v5/market/kline"
+    params = {"category": category, "symbol": symbol, "interval": INTERVAL_MAP.get(interval, "1"),
+              "limit": min(limit, 1000)}
+    rows = await request_json("GET", url, params=params, label="bybit.klines",
+                              decoder=codecs.decoder(codecs.BybitKline, bybit=True))
+    rows.sort(key=lambda k: k.start)
+    return rows
+
+async def get_open_interest_rows(symbol: str, interval: str = "1h", category: str = "linear",
+                                 limit: int = 50) -> List[Any]:
+    """Come get_open_interest, ma ritorna result.list come codecs.BybitOpenInterest."""
+    url = f"{BYBIT_BASE}/v5/market/open-interest"
+    params = {"category": category, "symbol": symbol, "intervalTime": interval, "limit": min(limit, 200)}
+    return await request_json("GET", url, params=params, label="bybit.open_interest",
+                              decoder=codecs.decoder(codecs.BybitOpenInterest, bybit=True))
+
+async def get_funding_rows(symbol: str, category: str = "linear", limit: int = 200) -> List[Any]:
+    """Come get_funding_history, ma ritorna result.list come codecs.BybitFunding (piu' recenti prima)."""
+    url = f"{BYBIT_BASE}/v5/market/history-fund-rate"
+    params = {"category": category, "symbol": symbol, "limit": min(limit, 200)}
+    return await request_json("GET", url, params=params, label="bybit.funding_history",
+                              decoder=codecs.decoder(codecs.BybitFunding, bybit=True))
+
+async def get_trade_rows(symbol: str, category: str = "linear", limit: int = 500) -> List[Any]:
+    """Come get_recent_trades, ma ritorna result.list come codecs.BybitTrade."""
+    url = f"{BYBIT_BASE}/v5/market/recent-trade"
+    params = {"category": category, "symbol": symbol, "limit": min(limit, 1000)}
+    return await request_json("GET", url, params=params, label="bybit.recent_trades",
+                              decoder=codecs.decoder(codecs.BybitTrade, bybit=True))
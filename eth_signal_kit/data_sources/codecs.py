@@ -0,0 +1,236 @@
+from __future__ import annotations
+import json
+from typing import Any, Callable, Dict, List, Sequence, Tuple, Type, TYPE_CHECKING
+
+if TYPE_CHECKING:  # numpy solo per columns() (import lazy: avvio CLI)
+    import numpy as np
+
+# ----------------------------
+# Decodifica JSON veloce e modelli tipizzati dei payload exchange
+# ----------------------------
+# Backend in ordine di preferenza (dipendenze opzionali):
+#   msgspec : decodifica schema-aware in un solo passaggio, stringhe numeriche -> float/int
+#             direttamente nel parser (strict=False), righe come Struct slotted
+#   orjson  : loads veloce + conversione in Python
+#   json    : stdlib, sempre disponibile
+# Le API pubbliche (loads, decoder, columns) sono identiche con qualsiasi backend;
+# gli errori di schema sono ValueError in tutti i casi.
+# I backend si importano al primo uso, non all'import del modulo (msgspec da solo costa
+# ~25 ms di avvio): loads generico (pipeline one-shot) preferisce orjson, che si carica
+# prima ed e' veloce quanto msgspec senza schema; msgspec solo per i decoder tipizzati.
+# Anche i modelli (Kline, FundingRate, ...) sono creati al primo accesso (__getattr__).
+msgspec: Any = None
+orjson: Any = None
+_resolved = False
+
+def _resolve() -> None:
+    global msgspec, orjson, BACKEND, _resolved
+    if _resolved:
+        return
+    try:
+        import msgspec as _m
+        msgspec = _m
+    except ImportError:  # pragma: no cover - dipende dall'ambiente
+        pass
+    try:
+        import orjson as _o
+        orjson = _o
+    except ImportError:  # pragma: no cover
+        pass
+    BACKEND = "msgspec" if msgspec is not None else ("orjson" if orjson is not None else "json")
+    _resolved = True
+
+def _loads_impl() -> Callable[[bytes], Any]:
+    try:
+        import orjson as _o
+        return _o.loads
+    except ImportError:  # pragma: no cover
+        pass
+    _resolve()
+    return msgspec.json.decode if msgspec is not None else json.loads
+
+def loads(content: bytes) -> Any:
+    """JSON generico (bytes/str -> oggetti Python); al primo uso si lega al backend disponibile."""
+    global loads
+    loads = _loads_impl()
+    return loads(content)
+
+# campo: (nome, tipo) o (nome, tipo, default); tipi ammessi int, float, str, bool.
+# I campi con default vanno in coda (il costruttore posizionale segue l'ordine della spec).
+Field = Tuple[Any, ...]
+
+_field_types: Dict[Type, Dict[str, type]] = {}
+
+def _model(name: str, spec: Sequence[Field], array_like: bool = False) -> Type:
+    """
+    Crea la classe riga: msgspec.Struct (array_like per i payload a lista posizionale come
+    le klines) oppure, senza msgspec, una classe con __slots__ e lo stesso costruttore.
+    I campi in eccesso nel payload vengono ignorati.
+    """
+    _resolve()
+    if msgspec is not None:
+        cls = msgspec.defstruct(name, list(spec), array_like=array_like, gc=False, frozen=True)
+        _field_types[cls] = {f[0]: f[1] for f in spec}
+        return cls
+    names = tuple(f[0] for f in spec)
+    types = tuple(f[1] for f in spec)
+    defaults = {f[0]: f[2] for f in spec if len(f) > 2}
+
+    def __init__(self, *args, **kw):
+        vals = dict(zip(names, args), **kw)
+        for n in names:
+            object.__setattr__(self, n, vals[n] if n in vals else defaults[n])
+
+    def __repr__(self):
+        return f"{name}(" + ", ".join(f"{n}={getattr(self, n)!r}" for n in names) + ")"
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(getattr(self, n) == getattr(other, n) for n in names)
+
+    def __setattr__(self, n, v):
+        raise AttributeError(f"{name} e' immutabile")
+
+    cls = type(name, (), {"__slots__": names, "__init__": __init__, "__repr__": __repr__, "__eq__": __eq__,
+                          "__setattr__": __setattr__, "__struct_fields__": names,
+                          "_types": types, "_defaults": defaults, "_array_like": array_like})
+    _field_types[cls] = dict(zip(names, types))
+    return cls
+
+def _convert(model: Type, raw: Any) -> Any:
+    # percorso senza msgspec: conversione esplicita campo per campo
+    names, types, defaults = model.__struct_fields__, model._types, model._defaults
+    try:
+        if model._array_like:
+            if len(raw) < len(names) - len(defaults):
+                raise ValueError(f"{model.__name__}: attesi {len(names)} elementi, trovati {len(raw)}")
+            vals = [t(v) for t, v in zip(types, raw)]
+        else:
+            vals = [t(raw[n]) if n in raw else defaults[n] for n, t in zip(names, types)]
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"{model.__name__}: payload non valido ({type(e).__name__}: {e})") from None
+    return model(*vals)
+
+# ----------------------------
+# Modelli (nome -> (campi, array_like)), classi create al primo accesso: codecs.Kline, ...
+# ----------------------------
+_SPECS: Dict[str, Tuple[List[Field], bool]] = {
+    # --- Binance Futures ---
+    # /fapi/v1/klines: [openTime, open, high, low, close, volume, closeTime, quoteVolume, trades,
+    #                   takerBuyBase, takerBuyQuote, ignore]
+    "Kline": ([
+        ("open_time", int), ("open", float), ("high", float), ("low", float), ("close", float),
+        ("volume", float), ("close_time", int), ("quote_volume", float), ("trades", int),
+        ("taker_buy_base", float), ("taker_buy_quote", float, 0.0),
+    ], True),
+    # /fapi/v1/fundingRate (markPrice non incluso: "" nei record piu' vecchi, non usato)
+    "FundingRate": ([("symbol", str), ("fundingTime", int), ("fundingRate", float)], False),
+    # /futures/data/openInterestHist
+    "OpenInterestHist": ([
+        ("symbol", str), ("sumOpenInterest", float), ("timestamp", int), ("sumOpenInterestValue", float, 0.0),
+    ], False),
+    # /fapi/v1/allForceOrders
+    "ForceOrder": ([
+        ("symbol", str), ("side", str, ""), ("price", float, 0.0), ("avgPrice", float, 0.0),
+        ("origQty", float, 0.0), ("executedQty", float, 0.0), ("time", int, 0),
+    ], False),
+    # /futures/data/topLongShort{Account,Position}Ratio
+    "LongShortRatio": ([
+        ("longShortRatio", float), ("timestamp", int), ("symbol", str, ""),
+        ("longAccount", float, 0.0), ("shortAccount", float, 0.0),
+    ], False),
+    # stream <symbol>@aggTrade
+    "AggTrade": ([
+        ("e", str), ("E", int), ("s", str), ("a", int), ("p", float), ("q", float),
+        ("f", int), ("l", int), ("T", int), ("m", bool),
+    ], False),
+
+    # --- Bybit V5 (dentro result.list) ---
+    # /v5/market/kline: [start, open, high, low, close, volume, turnover] (stringhe)
+    "BybitKline": ([
+        ("start", int), ("open", float), ("high", float), ("low", float), ("close", float),
+        ("volume", float), ("turnover", float),
+    ], True),
+    "BybitOpenInterest": ([("openInterest", float), ("timestamp", int)], False),
+    "BybitFunding": ([("symbol", str), ("fundingRate", float), ("fundingRateTimestamp", int)], False),
+    "BybitTrade": ([
+        ("price", float), ("size", float), ("side", str), ("time", int), ("execId", str, ""), ("symbol", str, ""),
+    ], False),
+}
+
+def __getattr__(name: str) -> Any:
+    # modelli e BACKEND al primo accesso (PEP 562): l'import di codecs non carica msgspec/orjson
+    if name in _SPECS:
+        spec, array_like = _SPECS[name]
+        cls = globals()[name] = _model(name, spec, array_like)
+        return cls
+    if name == "BACKEND":
+        _resolve()
+        return BACKEND
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# ----------------------------
+# Decoder
+# ----------------------------
+_decoders: Dict[Tuple[Type, bool], Callable[[bytes], List[Any]]] = {}
+
+def _bybit_check(code: int, msg: str) -> None:
+    if code != 0:
+        raise RuntimeError(f"bybit retCode={code}: {msg}")
+
+def decoder(model: Type, bybit: bool = False) -> Callable[[bytes], List[Any]]:
+    """
+    Decoder bytes -> lista di `model` da passare a request_json(decoder=...).
+    bybit=True legge l'envelope V5 ({retCode, retMsg, result: {list: [...]}}) e solleva
+    RuntimeError se retCode != 0. I decoder sono creati una volta per modello.
+    """
+    key = (model, bybit)
+    dec = _decoders.get(key)
+    if dec is not None:
+        return dec
+    _resolve()
+    if msgspec is not None:
+        if bybit:
+            result_t = msgspec.defstruct(f"{model.__name__}Result", [("list", List[model], [])], gc=False)
+            env_t = msgspec.defstruct(f"{model.__name__}Envelope", [
+                ("retCode", int, 0), ("retMsg", str, ""), ("result", result_t, msgspec.field(default_factory=result_t)),
+            ], gc=False)
+            env_dec = msgspec.json.Decoder(env_t, strict=False)
+
+            def dec(content: bytes) -> List[Any]:
+                env = env_dec.decode(content)
+                _bybit_check(env.retCode, env.retMsg)
+                return env.result.list
+        else:
+            dec = msgspec.json.Decoder(List[model], strict=False).decode
+    else:
+        def dec(content: bytes) -> List[Any]:
+            data = loads(content)
+            if bybit:
+                _bybit_check(int(data.get("retCode", 0)), data.get("retMsg", ""))
+                data = (data.get("result") or {}).get("list") or []
+            if not isinstance(data, list):
+                raise ValueError(f"{model.__name__}: attesa una lista, trovato {type(data).__name__}")
+            return [_convert(model, x) for x in data]
+    _decoders[key] = dec
+    return dec
+
+def decode(content: bytes, model: Type) -> Any:
+    """Decodifica un singolo oggetto (es. messaggio WebSocket) in `model`."""
+    _resolve()
+    if msgspec is not None:
+        key = (model, None)
+        dec = _decoders.get(key)
+        if dec is None:
+            dec = _decoders[key] = msgspec.json.Decoder(model, strict=False).decode
+        return dec(content)
+    return _convert(model, loads(content))
+
+def columns(rows: Sequence[Any], *names: str) -> Tuple[np.ndarray, ...]:
+    """Colonne numeriche (float64, int64 per i campi int) da una lista di righe tipizzate."""
+    import numpy as np
+    types = _field_types.get(type(rows[0]), {}) if rows else {}
+    out = []
+    for n in names:
+        dtype = np.int64 if types.get(n) is int else np.float64
+        out.append(np.fromiter((getattr(r, n) for r in rows), dtype=dtype, count=len(rows)))
+    return tuple(out)
@@ -0,0 +1,233 @@
+from __future__ import annotations
+import asyncio, json, os, time
+from collections import deque
+from typing import Any, Dict, Optional, Tuple
+
+from .. import metrics, timing
+from ..indicators.orderbook import OrderBook
+from . import codecs
+
+BINANCE_WS_BASE = os.getenv("BINANCE_WS_BASE", "wss://fstream.binance.com")
+BYBIT_WS_BASE = os.getenv("BYBIT_WS_BASE", "wss://stream.bybit.com")
+
+# ----------------------------
+# Order book da WebSocket (book locale + imbalance / microprice)
+# ----------------------------
+# Uno stream per (venue, simbolo), in background sul loop asyncio: il daemon lo apre al primo
+# tick e lo tiene vivo, ogni valutazione legge le metriche correnti (O(1), niente rete).
+#   Binance: diff stream <symbol>@depth@100ms + snapshot REST /fapi/v1/depth. Procedura
+#            documentata: eventi in buffer, snapshot (lastUpdateId L), scarto degli eventi con
+#            u < L, il primo applicato deve avere U <= L <= u, poi ogni evento pu == u precedente.
+#            Buco di sequenza -> nuovo snapshot (gli eventi intanto vanno in buffer).
+#   Bybit  : orderbook.<levels>.<SYMBOL> (snapshot + delta, u consecutivi). Buco -> unsubscribe +
+#            subscribe (nuovo snapshot); u == 1 e' sempre uno snapshot (restart lato exchange).
+# Connessione persa: riconnessione con backoff esponenziale e nuovo sync. Book senza messaggi da
+# piu' di STALE_S secondi o non sincronizzato: metriche None (le regole non scattano).
+# Manutenzione del book: O(livelli cambiati) per messaggio (indicators.orderbook).
+
+SYNC_TIMEOUT_S = 5.0     # attesa massima del sync alla prima valutazione (one-shot, primo tick del daemon)
+STALE_S = 10.0
+BUFFER_MAX = 10_000      # eventi Binance in attesa dello snapshot
+BYBIT_PING_S = 20.0
+RECONNECT_MAX_S = 30.0
+
+class DepthStream:
+    """Book locale sincronizzato di un simbolo; `top_n` = livelli per lato dell'imbalance."""
+    def __init__(self, venue: str = "binance", symbol: str = "ETHUSDT", top_n: int = 10,
+                 levels: Optional[int] = None, category: str = "linear"):
+        if venue not in ("binance", "bybit"):
+            raise ValueError(f"depth: venue non supportato: {venue}")
+        self.venue = venue
+        self.symbol = symbol.upper()
+        self.category = category
+        # Binance: livelli dello snapshot REST; Bybit: profondita' del topic (1, 50, 200, 500)
+        self.levels = int(levels or (1000 if venue == "binance" else 50))
+        self.book = OrderBook(top_n)
+        self.synced = False
+        self.messages = 0
+        self.resyncs = 0
+        self.reconnects = 0
+        self.last_msg = 0.0       # monotonic dell'ultimo messaggio
+        self.error: Optional[str] = None
+        self._first = False       # Binance: prossimo evento = primo dopo lo snapshot
+        self._delay = 0.5
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def name(self) -> str:
+        return f"{self.venue}.depth.{self.symbol}"
+
+    @property
+    def url(self) -> str:
+        if self.venue == "binance":
+            return f"{BINANCE_WS_BASE}/ws/{self.symbol.lower()}@depth@100ms"
+        return f"{BYBIT_WS_BASE}/v5/public/{self.category}"
+
+    def start(self) -> "DepthStream":
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        self._set_synced(False)
+
+    async def wait_synced(self, timeout: float = SYNC_TIMEOUT_S) -> bool:
+        if not self.synced:
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.synced
+
+    def metrics(self) -> Dict[str, Any]:
+        """Metriche del book (indicators.orderbook) + stato dello stream."""
+        age = time.monotonic() - self.last_msg if self.last_msg else None
+        out = self.book.metrics()
+        if not self.synced or age is None or age > STALE_S:
+            out.update(book_imbalance=None, microprice=None, microprice_skew=None)
+        out.update(venue=self.venue, synced=self.synced, age_s=None if age is None else round(age, 3),
+                   updates=self.book.updates, resyncs=self.resyncs, reconnects=self.reconnects, error=self.error)
+        return out
+
+    # --- stato ---
+    def _set_synced(self, ok: bool) -> None:
+        self.synced = ok
+        (self._ready.set if ok else self._ready.clear)()
+        if ok:
+            self._delay = 0.5
+
+    def _gap(self) -> None:
+        self._set_synced(False)
+        self.resyncs += 1
+        metrics.BOOK_RESYNCS.inc(stream=self.name)
+
+    async def _run(self) -> None:
+        # il task nasce dentro una valutazione: senza questo erediterebbe il suo collector di
+        # timing e ci registrerebbe gli snapshot REST dei resync per tutta la vita dello stream
+        with timing.collect(None):
+            await self._loop()
+
+    async def _loop(self) -> None:
+        import websockets
+        while True:
+            try:
+                async with websockets.connect(self.url, ping_interval=20, max_size=None) as ws:
+                    await (self._binance(ws) if self.venue == "binance" else self._bybit(ws))
+                self.error = "connessione chiusa"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+            self._set_synced(False)
+            self.reconnects += 1
+            metrics.WS_RECONNECTS.inc(stream=self.name)
+            await asyncio.sleep(self._delay)
+            self._delay = min(self._delay * 2.0, RECONNECT_MAX_S)
+
+    # --- Binance: diff stream + snapshot REST ---
+    def _binance_apply(self, ev: Dict[str, Any]) -> bool:
+        """Applica un depthUpdate; False = buco di sequenza (serve un nuovo snapshot)."""
+        b = self.book
+        if self._first:
+            if ev["u"] < b.update_id:   # gia' contenuto nello snapshot
+                return True
+            if ev["U"] > b.update_id:   # snapshot piu' vecchio del primo evento utile
+                return False
+            self._first = False
+        elif ev["pu"] != b.update_id:
+            return False
+        b.apply(ev["b"], ev["a"], ev["u"], ev.get("E", 0))
+        return True
+
+    async def _binance(self, ws) -> None:
+        from . import binance as bapi
+        buf: deque = deque(maxlen=BUFFER_MAX)
+        snap: Optional[asyncio.Future] = None
+        try:
+            async for raw in ws:
+                ev = codecs.loads(raw)
+                ev = ev.get("data", ev)   # stream combinati: {"stream", "data"}
+                if ev.get("e") != "depthUpdate":
+                    continue
+                self.messages += 1
+                self.last_msg = time.monotonic()
+                if self.synced:
+                    if self._binance_apply(ev):
+                        continue
+                    self._gap()
+                buf.append(ev)
+                if snap is None:
+                    snap = asyncio.ensure_future(bapi.get_depth(self.symbol, self.levels))
+                if not snap.done():
+                    continue
+                s, snap = snap.result(), None   # errore REST -> riconnessione
+                self.book.reset(s["bids"], s["asks"], int(s["lastUpdateId"]), int(s.get("E") or 0))
+                self._first = True
+                if all(self._binance_apply(e) for e in buf):
+                    buf.clear()
+                    self._set_synced(True)
+                # altrimenti: snapshot vecchio o buco nel buffer, al prossimo evento se ne chiede un altro
+        finally:
+            if snap is not None:
+                snap.cancel()
+
+    # --- Bybit: snapshot + delta ---
+    async def _bybit(self, ws) -> None:
+        topic = f"orderbook.{self.levels}.{self.symbol}"
+        sub = json.dumps({"op": "subscribe", "args": [topic]})
+        await ws.send(sub)
+        pinger = asyncio.ensure_future(self._bybit_ping(ws))
+        try:
+            async for raw in ws:
+                msg = codecs.loads(raw)
+                if msg.get("topic") != topic:   # ack di subscribe, pong
+                    continue
+                self.messages += 1
+                self.last_msg = time.monotonic()
+                d = msg["data"]
+                u, ts = int(d["u"]), int(msg.get("ts") or 0)
+                if msg.get("type") == "snapshot" or u == 1:
+                    self.book.reset(d["b"], d["a"], u, ts)
+                    self._set_synced(True)
+                elif not self.synced:
+                    continue   # delta prima del nuovo snapshot
+                elif u != self.book.update_id + 1:
+                    self._gap()
+                    await ws.send(json.dumps({"op": "unsubscribe", "args": [topic]}))
+                    await ws.send(sub)
+                else:
+                    self.book.apply(d["b"], d["a"], u, ts)
+        finally:
+            pinger.cancel()
+
+    async def _bybit_ping(self, ws) -> None:
+        while True:
+            await asyncio.sleep(BYBIT_PING_S)
+            await ws.send(json.dumps({"op": "ping"}))
+
+# ----------------------------
+# Stream condivisi (daemon)
+# ----------------------------
+_streams: Dict[Tuple[str, str], DepthStream] = {}
+
+def stream(venue: str, symbol: str, top_n: int = 10) -> DepthStream:
+    """Stream di (venue, simbolo), avviato alla prima richiesta; `top_n` aggiornato se cambia il config."""
+    key = (venue, symbol.upper())
+    s = _streams.get(key)
+    if s is None:
+        s = _streams[key] = DepthStream(venue, symbol, top_n)
+    s.book.set_top_n(top_n)
+    return s.start()
+
+async def close_all() -> None:
+    for s in list(_streams.values()):
+        await s.close()
+    _streams.clear()
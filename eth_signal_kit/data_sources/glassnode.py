@@ -1 +1,141 @@
-# Placeholder for Glassnode Basic API integration.
+from __future__ import annotations
+import asyncio, os, time
+from typing import Dict, Any, Iterable, List, Optional
+
+from ..metrics import CACHE_REQUESTS
+from .transport import request_json
+from .store import SeriesStore, Point
+
+GLASSNODE_API = os.getenv("GLASSNODE_API", "https://api.glassnode.com")
+
+# ----------------------------
+# Glassnode: serie on-chain in blocco, store locale, refresh incrementale
+# ----------------------------
+# Le metriche (giornaliere) finiscono nel SeriesStore (CSV ts,value): il primo refresh scarica
+# `history_days` in una richiesta, i successivi solo dall'ultimo punto salvato e solo quando il
+# prossimo punto puo' esistere (ultimo ts + 2 * risoluzione: un punto e' completo a fine
+# intervallo), al massimo una volta ogni `min_check_s`. In valutazione (pipeline, --with-onchain)
+# quasi sempre nessuna chiamata: si legge il CSV. Lo stesso store alimenta il backtest
+# (python -m eth_signal_kit.data_sources.glassnode --out data -> features.load_onchain).
+# Un punto e' usabile solo a intervallo chiuso (ts + risoluzione <= adesso), in live e in storico.
+
+# nome nel kit -> path API (/v1/metrics/<path>)
+METRICS = {
+    "exchange_netflow": "transactions/transfers_volume_exchanges_net",   # afflussi - deflussi exchange (coin)
+    "whale_addresses": "addresses/min_1k_count",                         # indirizzi con >= 1k coin
+}
+RESOLUTIONS = {"1h": 3600, "24h": 86400, "1w": 604800}
+
+def asset_for(symbol: str) -> str:
+    """ETHUSDT -> ETH (asset Glassnode)."""
+    s = symbol.upper()
+    for quote in ("USDT", "USDC", "BUSD", "USD"):
+        if s.endswith(quote):
+            return s[:-len(quote)]
+    return s
+
+async def get_metric(metric: str, asset: str, since_s: Optional[int] = None, until_s: Optional[int] = None,
+                     resolution: str = "24h", api_key: Optional[str] = None) -> List[Point]:
+    """Una metrica (nome di METRICS o path API) su [since_s, until_s] -> [(ts_ms, valore)] crescente."""
+    key = api_key or os.getenv("GLASSNODE_API_KEY", "")
+    params: Dict[str, Any] = {"a": asset, "i": resolution, "f": "json"}
+    if since_s is not None:
+        params["s"] = int(since_s)
+    if until_s is not None:
+        params["u"] = int(until_s)
+    url = f"{GLASSNODE_API}/v1/metrics/{METRICS.get(metric, metric)}"
+    data = await request_json("GET", url, params=params, headers={"X-Api-Key": key}, timeout=30,
+                              label="glassnode.metrics") or []
+    return sorted((int(r["t"]) * 1000, float(r["v"])) for r in data if r.get("v") is not None)
+
+async def refresh(asset: str, metrics: Iterable[str] = tuple(METRICS), resolution: str = "24h",
+                  store: Optional[SeriesStore] = None, history_days: int = 365, min_check_s: float = 3600.0,
+                  clock=time.time) -> Dict[str, List[Point]]:
+    """
+    Aggiorna le serie nello store (richieste in parallelo, solo per quelle scadute) e le
+    ritorna intere. Senza GLASSNODE_API_KEY ritorna quanto gia' salvato.
+    """
+    store = store or SeriesStore()
+    step = RESOLUTIONS[resolution]
+    now = clock()
+    has_key = bool(os.getenv("GLASSNODE_API_KEY"))
+
+    async def one(name: str) -> List[Point]:
+        path = store.path("glassnode", name, asset, resolution)
+        pts = store.read(path)
+        last = pts[-1][0] // 1000 if pts else None
+        checked = store.checked_at(path)
+        due = last is None or (now >= last + 2 * step and (checked is None or now - checked >= min_check_s))
+        CACHE_REQUESTS.inc(cache="glassnode", result="miss" if due else "hit")   # miss: store da aggiornare
+        if not (due and has_key):
+            return pts
+        since = last if last is not None else int(now) - history_days * 86400
+        new = [p for p in await get_metric(name, asset, since, int(now), resolution) if p[0] // 1000 + step <= now]
+        if not new:
+            store.touch(path, now)
+            return pts
+        return store.merge(path, new, now)
+
+    names = list(metrics)
+    res = await asyncio.gather(*(one(n) for n in names))
+    return dict(zip(names, res))
+
+def summarize(series: Dict[str, List[Point]], resolution: str = "24h", now: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Valori per lo scoring/output dall'ultimo punto chiuso (stesse definizioni di
+    backtest.features.add_onchain): netflow 1d/7d (somma degli ultimi 7 punti) e variazione %
+    a 7 punti degli indirizzi whale. None se i punti non bastano.
+    """
+    step_ms = RESOLUTIONS[resolution] * 1000
+    now_ms = (time.time() if now is None else now) * 1000
+    out: Dict[str, Any] = {"exchange_netflow_1d": None, "exchange_netflow_7d": None,
+                           "whale_addresses": None, "whale_addresses_chg_7d_pct": None, "last_ts": None}
+    nf = [v for t, v in series.get("exchange_netflow", []) if t + step_ms <= now_ms]
+    if nf:
+        out["exchange_netflow_1d"] = nf[-1]
+        if len(nf) >= 7:
+            out["exchange_netflow_7d"] = sum(nf[-7:])
+    wa = [(t, v) for t, v in series.get("whale_addresses", []) if t + step_ms <= now_ms]
+    if wa:
+        out["whale_addresses"] = wa[-1][1]
+        if len(wa) >= 8 and wa[-8][1] > 0:
+            out["whale_addresses_chg_7d_pct"] = (wa[-1][1] - wa[-8][1]) / wa[-8][1] * 100.0
+    last = [s[-1][0] for s in series.values() if s]
+    out["last_ts"] = max(last) if last else None
+    return out
+
+async def snapshot(symbol: str, store: Optional[SeriesStore] = None, clock=time.time) -> Dict[str, Any]:
+    """refresh() + summarize() per il simbolo futures (asset derivato da asset_for)."""
+    series = await refresh(asset_for(symbol), store=store, clock=clock)
+    return summarize(series, now=clock())
+
+# ----------------------------
+# CLI: storico nello store del backtest
+# ----------------------------
+def main():
+    import argparse
+    from datetime import datetime, timezone
+    ap = argparse.ArgumentParser(description="Scarica/aggiorna le serie Glassnode nello store (CSV ts,value)")
+    ap.add_argument("--symbol", default="ETHUSDT")
+    ap.add_argument("--start", default=None, help="YYYY-MM-DD (solo primo download; poi incrementale)")
+    ap.add_argument("--out", default=None, help="cartella store (default ETHERPULSE_SERIES_DIR o cache del kit)")
+    ap.add_argument("--metrics", nargs="+", default=list(METRICS))
+    ap.add_argument("--resolution", default="24h", choices=list(RESOLUTIONS))
+    args = ap.parse_args()
+
+    from dotenv import load_dotenv
+    load_dotenv()
+    if not os.getenv("GLASSNODE_API_KEY"):
+        raise SystemExit("GLASSNODE_API_KEY mancante")
+    days = 365
+    if args.start:
+        start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc)
+        days = max(1, int((time.time() - start.timestamp()) // 86400) + 1)
+    store = SeriesStore(args.out)
+    series = asyncio.run(refresh(asset_for(args.symbol), args.metrics, args.resolution, store,
+                                 history_days=days, min_check_s=0.0))
+    for name, pts in series.items():
+        print(store.path("glassnode", name, asset_for(args.symbol), args.resolution), len(pts))
+
+if __name__ == "__main__":
+    main()
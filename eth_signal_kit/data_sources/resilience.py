@@ -0,0 +1,212 @@
+from __future__ import annotations
+import asyncio, json, random, time
+from collections import deque
+from dataclasses import dataclass, fields, replace
+from typing import Dict, Any, Optional, Deque, Tuple
+
+import httpx
+
+from .. import metrics
+
+# ----------------------------
+# Policy per endpoint: retry con backoff, hedging, circuit breaker, last-known value
+# ----------------------------
+# Le chiavi sono le label di request_json ("binance.force_orders", "bybit.klines", ...).
+# Default nel codice, sovrascrivibili da config.yaml (sezione `resilience`, vedi configure()).
+
+@dataclass(frozen=True)
+class Policy:
+    timeout_s: float = 4.0          # budget di un singolo tentativo (connessione + risposta)
+    deadline_s: float = 8.0         # budget totale della chiamata (tentativi + backoff)
+    retries: int = 2                # tentativi extra su errori transitori
+    backoff_base_s: float = 0.2     # backoff esponenziale con full jitter: U(0, min(cap, base * 2^n))
+    backoff_cap_s: float = 2.0
+    hedge: bool = False             # duplica la richiesta se la prima supera il p95 osservato
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20     # sotto questa soglia si usa hedge_after_s
+    hedge_after_s: float = 1.0
+    breaker_failures: int = 5       # fallimenti consecutivi che aprono il circuito
+    breaker_cooldown_s: float = 30.0
+    stale_ttl_s: float = 900.0      # eta' massima del last-known value servito in degrado (0 = mai)
+
+DEFAULT = Policy()
+
+# endpoint lenti/instabili: allForceOrders e openInterestHist hanno le code di latenza peggiori
+ENDPOINT_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "binance.force_orders": {"hedge": True},
+    "binance.open_interest_hist": {"hedge": True},
+    "santiment.graphql": {"timeout_s": 20.0, "deadline_s": 25.0, "retries": 1},
+    # snapshot del book: si sincronizza per id di sequenza, un valore vecchio non serve
+    "binance.depth": {"stale_ttl_s": 0.0},
+}
+
+_policies: Dict[str, Policy] = {}
+_base = DEFAULT
+_rng = random.Random()
+
+def configure(cfg: Optional[Dict[str, Any]]) -> None:
+    """
+    Applica la sezione `resilience` del config:
+      resilience: {timeout_s: 4, retries: 2, ..., endpoints: {binance.force_orders: {hedge: true}}}
+    Le chiavi sconosciute sollevano ValueError (typo nel config = errore esplicito).
+    """
+    global _base
+    cfg = dict(cfg or {})
+    per_endpoint = cfg.pop("endpoints", None) or {}
+    known = {f.name for f in fields(Policy)}
+    for k in list(cfg) + [k for v in per_endpoint.values() for k in (v or {})]:
+        if k not in known:
+            raise ValueError(f"resilience: chiave sconosciuta '{k}'")
+    _base = replace(DEFAULT, **cfg)
+    _policies.clear()
+    for ep, over in {**ENDPOINT_DEFAULTS, **per_endpoint}.items():
+        _policies[ep] = replace(_base, **{**ENDPOINT_DEFAULTS.get(ep, {}), **(over or {})})
+
+def policy(endpoint: str) -> Policy:
+    p = _policies.get(endpoint)
+    if p is None:
+        p = _policies[endpoint] = replace(_base, **ENDPOINT_DEFAULTS.get(endpoint, {}))
+    return p
+
+def backoff(p: Policy, attempt: int) -> float:
+    return _rng.uniform(0.0, min(p.backoff_cap_s, p.backoff_base_s * (2 ** attempt)))
+
+# ----------------------------
+# Classificazione errori
+# ----------------------------
+RETRY, FAIL, CLIENT = "retry", "fail", "client"
+
+def classify(e: BaseException) -> str:
+    """
+    RETRY : transitorio (timeout, rete, 408/429/5xx) -> nuovo tentativo, conta per il breaker
+    FAIL  : endpoint non sano ma inutile ritentare (418 = IP bannato) -> conta per il breaker
+    CLIENT: errore della richiesta (400, 404, ...) -> sollevato subito, il breaker non cambia
+    """
+    if isinstance(e, httpx.HTTPStatusError):
+        s = e.response.status_code
+        if s in (408, 429) or s >= 500:
+            return RETRY
+        return FAIL if s == 418 else CLIENT
+    if isinstance(e, (httpx.TransportError, asyncio.TimeoutError)):
+        return RETRY
+    return CLIENT
+
+def retry_after(e: BaseException) -> float:
+    """Secondi indicati dall'header Retry-After (429/503), 0 se assente."""
+    if isinstance(e, httpx.HTTPStatusError):
+        try:
+            return float(e.response.headers.get("Retry-After", 0))
+        except ValueError:
+            return 0.0
+    return 0.0
+
+# ----------------------------
+# Circuit breaker
+# ----------------------------
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitOpenError(Exception):
+    """Circuito aperto e nessun last-known value utilizzabile."""
+
+class CircuitBreaker:
+    """
+    closed -> open dopo `breaker_failures` fallimenti consecutivi; dopo il cooldown
+    half_open lascia passare una sola richiesta di prova: successo -> closed, errore -> open.
+    """
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+
+    def _set(self, state: str):
+        self.state = state
+        metrics.CIRCUIT_STATE.set(_STATE_VALUE[state], endpoint=self.endpoint)
+
+    def allow(self, p: Policy) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < p.breaker_cooldown_s:
+                return False
+            self._set(HALF_OPEN)
+        if self.probing:
+            return False
+        self.probing = True
+        return True
+
+    def success(self):
+        self.failures = 0
+        self.probing = False
+        if self.state != CLOSED:
+            self._set(CLOSED)
+
+    def failure(self, p: Policy):
+        self.failures += 1
+        self.probing = False
+        if self.state == HALF_OPEN or self.failures >= p.breaker_failures:
+            self.opened_at = time.monotonic()
+            if self.state != OPEN:
+                self._set(OPEN)
+
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def breaker(endpoint: str) -> CircuitBreaker:
+    b = _breakers.get(endpoint)
+    if b is None:
+        b = _breakers[endpoint] = CircuitBreaker(endpoint)
+    return b
+
+def health() -> Dict[str, Dict[str, Any]]:
+    """Stato dei breaker per endpoint (per log/diagnostica)."""
+    return {ep: {"state": b.state, "failures": b.failures} for ep, b in _breakers.items()}
+
+# ----------------------------
+# Latenze osservate (soglia di hedging)
+# ----------------------------
+_latency: Dict[str, Deque[float]] = {}
+
+def observe(endpoint: str, seconds: float) -> None:
+    d = _latency.get(endpoint)
+    if d is None:
+        d = _latency[endpoint] = deque(maxlen=256)
+    d.append(seconds)
+
+def hedge_delay(endpoint: str, p: Policy) -> float:
+    d = _latency.get(endpoint)
+    if not d or len(d) < p.hedge_min_samples:
+        return p.hedge_after_s
+    xs = sorted(d)
+    return max(0.01, xs[min(len(xs) - 1, int(p.hedge_quantile * len(xs)))])
+
+# ----------------------------
+# Last-known values
+# ----------------------------
+# chiave = endpoint + parametri senza finestre temporali (startTime/endTime cambiano a ogni run)
+_TIME_PARAMS = {"startTime", "endTime", "from", "to"}
+# `variant` separa le forme diverse della stessa risposta (JSON grezzo vs righe di un decoder)
+_last: Dict[Tuple[str, str, Any], Tuple[float, Any]] = {}
+
+def cache_key(endpoint: str, params: Optional[Dict[str, Any]], body: Optional[Dict[str, Any]],
+              variant: Any = None) -> Tuple[str, str, Any]:
+    p = {k: v for k, v in (params or {}).items() if k not in _TIME_PARAMS}
+    return endpoint, json.dumps([p, body], sort_keys=True, default=str), variant
+
+def remember(key: Tuple[str, str, Any], data: Any) -> None:
+    _last[key] = (time.monotonic(), data)
+
+def last_known(key: Tuple[str, str, Any], p: Policy) -> Optional[Tuple[float, Any]]:
+    """(eta' in secondi, dati) se esiste un valore non piu' vecchio di stale_ttl_s."""
+    hit = _last.get(key)
+    if hit is None or p.stale_ttl_s <= 0:
+        return None
+    age = time.monotonic() - hit[0]
+    return (age, hit[1]) if age <= p.stale_ttl_s else None
+
+def reset() -> None:
+    """Azzera breaker, latenze e last-known (test/benchmark)."""
+    _breakers.clear()
+    _latency.clear()
+    _last.clear()
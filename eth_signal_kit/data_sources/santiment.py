@@ -1,34 +1,246 @@
-
 from __future__ import annotations
-import os
-import httpx
-from typing import Dict, Any, Optional
+import json, os, sys, time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from .. import metrics
+from .transport import request_json
 
 SANTIMENT_API = "https://api.santiment.net/graphql"
 SANTIMENT_KEY = os.getenv("SANTIMENT_API_KEY", "")
 
-QUERY = """
-{
-  getMetric(metric: "amount_in_addresses") {
-    timeseriesData(
-      selector: { slug: "ethereum", label: "whale", threshold: "1000" }
-      from: "utc_now-7d"
-      to: "utc_now"
-      interval: "1d"
-    ){
-      datetime
-      value
-    }
-  }
-}
-"""
+# ----------------------------
+# Client GraphQL: batch + cache fino al prossimo punto + conteggio crediti
+# ----------------------------
+# Le metriche on-chain sono giornaliere: rifarle a ogni valutazione consuma chiamate API
+# (il piano free ne ha poche al mese) senza dati nuovi. Qui:
+#   - batch  : N metriche/slug/finestre in UNA richiesta, con alias GraphQL (q0, q1, ...)
+#   - cache  : ogni serie resta valida fino al prossimo punto dell'intervallo (1d -> mezzanotte
+#              UTC), in memoria e su disco (ETHERPULSE_CACHE_DIR/santiment.json): anche i run
+#              one-shot da cron fanno una sola richiesta al giorno
+#   - crediti: chiamate, query e punti per giorno/mese UTC (usage()); con SANTIMENT_MONTHLY_CALLS
+#              le richieste oltre il budget non partono (si serve la cache scaduta, se c'e')
+# Errori GraphQL per singolo alias non fanno fallire le altre query del batch: metrica/slug
+# inesistenti -> serie vuota in cache (non si ripete la richiesta); errori transitori (timeout
+# della query, rate limit, complessita') -> niente cache, si riprova alla valutazione successiva.
+
+_STEP_S = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+# messaggi Santiment per metrica/slug non validi: errore permanente, si mette in cache
+_PERMANENT = ("not supported", "mistyped", "not found", "does not exist", "unknown")
+
+def _log(msg: str) -> None:
+    print(f"[eth-signal-kit] {msg}", file=sys.stderr, flush=True)
+
+@dataclass(frozen=True)
+class Query:
+    """Una serie: metrica + selettore (slug, label/threshold opzionali) + finestra in giorni."""
+    metric: str
+    slug: str
+    days: int = 7
+    interval: str = "1d"
+    label: Optional[str] = None
+    threshold: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return "|".join(str(v) for v in (self.metric, self.slug, self.days, self.interval, self.label, self.threshold))
+
+    @property
+    def step_s(self) -> int:
+        return int(self.interval[:-1]) * _STEP_S[self.interval[-1]]
+
+    def graphql(self, alias: str) -> str:
+        sel = {"slug": self.slug, "label": self.label, "threshold": self.threshold}
+        sel_s = ", ".join(f"{k}: {json.dumps(v)}" for k, v in sel.items() if v is not None)
+        return (f'{alias}: getMetric(metric: {json.dumps(self.metric)}) {{ timeseriesData('
+                f'selector: {{ {sel_s} }}, from: "utc_now-{int(self.days)}d", to: "utc_now", '
+                f'interval: {json.dumps(self.interval)}) {{ datetime value }} }}')
+
+# punti di una serie: (ts_ms, valore)
+Series = List[Tuple[int, float]]
+
+def build_query(queries: List[Query]) -> str:
+    """Documento GraphQL unico con un alias per query (q0, q1, ... nell'ordine di `queries`)."""
+    return "{\n" + "\n".join(f"  {q.graphql(f'q{i}')}" for i, q in enumerate(queries)) + "\n}"
+
+def _ts_ms(s: str) -> int:
+    return int(datetime.fromisoformat(s.replace("Z", "+00:00")).timestamp() * 1000)
+
+def parse_series(rows: Optional[List[Dict[str, Any]]]) -> Series:
+    return sorted((_ts_ms(r["datetime"]), float(r.get("value") or 0.0)) for r in rows or [] if r.get("datetime"))
+
+class Client:
+    """
+    fetch(queries) -> {Query: Series}. Le query valide in cache non vanno in rete; le altre
+    partono insieme (a blocchi di `batch_size` alias per richiesta). `path` None = solo memoria.
+    """
+    def __init__(self, api_key: Optional[str] = None, path: Optional[str] = None, batch_size: int = 25,
+                 monthly_calls: Optional[int] = None, clock=time.time):
+        self.api_key = api_key
+        self.path = path
+        self.batch_size = max(1, int(batch_size))
+        self.monthly_calls = monthly_calls
+        self.clock = clock
+        self._entries: Dict[str, Dict[str, Any]] = {}   # key -> {"expires": s, "points": [[ts, v], ...]}
+        self._usage: Dict[str, Any] = {}
+        self._load()
+
+    # --- persistenza ---
+    def _load(self) -> None:
+        if not self.path:
+            return
+        try:
+            with open(self.path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        if state.get("v") == 1:
+            self._entries = state.get("entries", {})
+            self._usage = state.get("usage", {})
+
+    def _save(self) -> None:
+        if not self.path:
+            return
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(tmp, "w") as f:
+                json.dump({"v": 1, "entries": self._entries, "usage": self._usage}, f)
+            os.replace(tmp, self.path)
+        except OSError:  # cache non scrivibile: resta quella in memoria
+            pass
+
+    # --- crediti ---
+    def usage(self) -> Dict[str, Any]:
+        """Chiamate/query/punti del giorno e del mese UTC correnti (azzerati al cambio periodo)."""
+        day, month = time.strftime("%Y-%m-%d", time.gmtime(self.clock())), time.strftime("%Y-%m", time.gmtime(self.clock()))
+        u = self._usage
+        if u.get("month") != month:
+            u.update(month=month, month_calls=0, month_queries=0, month_points=0)
+        if u.get("day") != day:
+            u.update(day=day, day_calls=0, day_queries=0, day_points=0)
+        if self.monthly_calls:
+            u["month_budget"] = int(self.monthly_calls)
+        return dict(u)
+
+    def _charge(self, queries: int, points: int) -> None:
+        self.usage()
+        u = self._usage
+        for p in ("day", "month"):
+            u[f"{p}_calls"] += 1
+            u[f"{p}_queries"] += queries
+            u[f"{p}_points"] += points
+
+    def _over_budget(self) -> bool:
+        return bool(self.monthly_calls) and self.usage()["month_calls"] >= int(self.monthly_calls)
+
+    # --- fetch ---
+    def cached(self, q: Query, allow_expired: bool = False) -> Optional[Series]:
+        """Serie in cache se valida (`allow_expired`: anche scaduta, result="stale")."""
+        e = self._entries.get(q.key)
+        expired = e is not None and self.clock() >= e["expires"]
+        if e is None or (expired and not allow_expired):
+            metrics.CACHE_REQUESTS.inc(cache="santiment", result="miss")
+            return None
+        metrics.CACHE_REQUESTS.inc(cache="santiment", result="stale" if expired else "hit")
+        return [(int(t), float(v)) for t, v in e["points"]]
+
+    async def fetch(self, queries: Iterable[Query]) -> Dict[Query, Series]:
+        queries = list(dict.fromkeys(queries))
+        out = {q: s for q in queries if (s := self.cached(q)) is not None}
+        todo = [q for q in queries if q not in out]
+        if not todo:
+            return out
+        key = self.api_key if self.api_key is not None else (os.getenv("SANTIMENT_API_KEY") or SANTIMENT_KEY)
+        if not key:
+            return out
+        headers = {"Authorization": f"Apikey {key}"}
+        for i in range(0, len(todo), self.batch_size):
+            chunk = todo[i:i + self.batch_size]
+            if self._over_budget():  # niente chiamata: ultimo valore noto, se c'e'
+                out.update({q: s for q in chunk if (s := self.cached(q, allow_expired=True)) is not None})
+                continue
+            data = await request_json("POST", SANTIMENT_API, json={"query": build_query(chunk)}, headers=headers,
+                                      timeout=20, label="santiment.graphql") or {}
+            res = data.get("data") or {}
+            errors = data.get("errors") or []
+            if errors and not res:  # richiesta rifiutata per intero (chiave, sintassi): niente cache
+                self._charge(len(chunk), 0)
+                self._save()
+                raise RuntimeError(f"santiment: {errors[0].get('message', errors[0])}")
+            now = self.clock()
+            points = 0
+            by_alias = {str((e.get("path") or [None])[0]): str(e.get("message", e)) for e in errors}
+            for j, q in enumerate(chunk):
+                node = res.get(f"q{j}")
+                if node is None:   # alias in errore
+                    msg = by_alias.get(f"q{j}", "nessun dato")
+                    permanent = any(p in msg.lower() for p in _PERMANENT)
+                    _log(f"santiment {q.metric}/{q.slug}: {msg}" + ("" if permanent else " (riprovo)"))
+                    if not permanent:   # transitorio: niente cache, ultimo valore noto se c'e'
+                        out[q] = self.cached(q, allow_expired=True) or []
+                        continue
+                s = parse_series((node or {}).get("timeseriesData"))
+                points += len(s)
+                # valida fino al prossimo punto: inizio del prossimo intervallo dopo adesso
+                expires = (int(now) // q.step_s + 1) * q.step_s
+                self._entries[q.key] = {"expires": expires, "points": [list(p) for p in s]}
+                out[q] = s
+            self._charge(len(chunk), points)
+        self._save()
+        return out
+
+_client: Optional[Client] = None
+
+def client() -> Client:
+    """Client condiviso (daemon: cache in memoria tra i tick), persistito nella cache del kit."""
+    global _client
+    if _client is None:
+        from ..config import cache_dir
+        budget = os.getenv("SANTIMENT_MONTHLY_CALLS")
+        _client = Client(path=os.path.join(cache_dir(), "santiment.json"),
+                         monthly_calls=int(budget) if budget else None)
+    return _client
+
+# ----------------------------
+# Whales
+# ----------------------------
+# slug Santiment per asset base dei simboli futures (ETHUSDT -> ethereum)
+SLUGS = {"ETH": "ethereum", "BTC": "bitcoin", "SOL": "solana", "BNB": "binance-coin", "XRP": "xrp",
+         "ADA": "cardano", "DOGE": "dogecoin", "LINK": "chainlink", "AVAX": "avalanche", "DOT": "polkadot"}
+
+def slug_for(symbol: str) -> Optional[str]:
+    for quote in ("USDT", "USDC", "USD", "BUSD"):
+        if symbol.upper().endswith(quote):
+            return SLUGS.get(symbol.upper()[:-len(quote)])
+    return SLUGS.get(symbol.upper())
+
+def whales_query(slug: str, days: int = 7, label: str = "whale", threshold: str = "1000") -> Query:
+    return Query("amount_in_addresses", slug, days, "1d", label, threshold)
+
+async def whales_net_selling(slugs: Iterable[str], days: int = 7, label: str = "whale",
+                             threshold: str = "1000") -> Dict[str, Optional[bool]]:
+    """
+    Per slug: True se l'importo negli indirizzi whale e' sceso nella finestra (ultimo < primo),
+    False se e' salito o invariato, None senza dati. Tutti gli slug in una richiesta (o dalla cache).
+    """
+    qs = {slug: whales_query(slug, days, label, threshold) for slug in slugs}
+    res = await client().fetch(qs.values())
+    out: Dict[str, Optional[bool]] = {}
+    for slug, q in qs.items():
+        s = res.get(q) or []
+        out[slug] = (s[-1][1] < s[0][1]) if len(s) >= 2 else None
+    return out
 
 async def whales_amount_last7d() -> Optional[Dict[str, Any]]:
     """Example: number of whale addresses >= 1000 ETH label. Requires API key (free tier available)."""
-    if not SANTIMENT_KEY:
+    if not (os.getenv("SANTIMENT_API_KEY") or SANTIMENT_KEY):
         return None
-    headers = {"Authorization": f"Apikey {SANTIMENT_KEY}"}
-    async with httpx.AsyncClient(timeout=20, headers=headers) as client:
-        r = await client.post(SANTIMENT_API, json={"query": QUERY})
-        r.raise_for_status()
-        return r.json()
+    q = whales_query("ethereum")
+    s = (await client().fetch([q])).get(q, [])
+    # stessa forma della risposta GraphQL originale
+    rows = [{"datetime": datetime.fromtimestamp(t / 1000, timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"), "value": v}
+            for t, v in s]
+    return {"data": {"getMetric": {"timeseriesData": rows}}}
@@ -0,0 +1,62 @@
+from __future__ import annotations
+import csv, os
+from typing import Dict, List, Optional, Tuple
+
+# ----------------------------
+# Series store locale (CSV ts,value)
+# ----------------------------
+# Una serie per file: <root>/<source>_<metric>_<asset>_<resolution>.csv, colonne ts (ms UTC,
+# apertura dell'intervallo) e value; stesso formato dei CSV di backtest/ingest.py, quindi la
+# stessa cartella serve al live (refresh incrementale) e al backtest (features.load_onchain).
+# merge() riscrive il file in modo atomico con i punti vecchi + nuovi (i nuovi vincono sui ts
+# uguali: l'ultimo punto puo' essere rivisto dalla fonte). L'mtime del file e' l'ora dell'ultimo
+# controllo (anche senza punti nuovi, sull'orologio del chiamante), usata per non richiedere la
+# fonte troppo spesso.
+
+Point = Tuple[int, float]
+
+def series_dir() -> str:
+    """Cartella del live: ETHERPULSE_SERIES_DIR o <cache del kit>/series."""
+    from ..config import cache_dir
+    return os.getenv("ETHERPULSE_SERIES_DIR") or os.path.join(cache_dir(), "series")
+
+class SeriesStore:
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or series_dir()
+
+    def path(self, source: str, metric: str, asset: str, resolution: str) -> str:
+        return os.path.join(self.root, f"{source}_{metric}_{asset}_{resolution}.csv")
+
+    def read(self, path: str) -> List[Point]:
+        try:
+            with open(path, "r", newline="", encoding="utf-8") as f:
+                return [(int(r["ts"]), float(r["value"])) for r in csv.DictReader(f) if r.get("value") not in (None, "")]
+        except FileNotFoundError:
+            return []
+
+    def checked_at(self, path: str) -> Optional[float]:
+        """Ora (epoch s) dell'ultimo merge/touch, None se la serie non esiste."""
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            return None
+
+    def touch(self, path: str, at: Optional[float] = None) -> None:
+        """Segna un controllo senza punti nuovi (`at`: ora del chiamante, default adesso)."""
+        if os.path.exists(path):
+            os.utime(path, None if at is None else (at, at))
+
+    def merge(self, path: str, points: List[Point], at: Optional[float] = None) -> List[Point]:
+        """Unisce `points` alla serie su disco e ritorna la serie completa ordinata."""
+        merged: Dict[int, float] = dict(self.read(path))
+        merged.update((int(t), float(v)) for t, v in points)
+        rows = sorted(merged.items())
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", newline="", encoding="utf-8") as f:
+            w = csv.writer(f)
+            w.writerow(["ts", "value"])
+            w.writerows(rows)
+        os.replace(tmp, path)
+        self.touch(path, at)
+        return rows
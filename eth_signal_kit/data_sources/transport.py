@@ -0,0 +1,166 @@
+from __future__ import annotations
+import asyncio, ssl, time
+from functools import lru_cache
+from typing import Callable, Dict, Any, Optional
+import certifi
+import httpx
+
+from .. import timing, metrics
+from . import resilience, codecs
+
+# -----------------------------
+# Richieste HTTP condivise dai data source
+# -----------------------------
+@lru_cache(maxsize=1)
+def _ssl_context() -> ssl.SSLContext:
+    # stesso bundle CA del default httpx, creato una volta: caricarlo costa ~40ms per client
+    # ed e' CPU-bound, quindi serializzerebbe anche le richieste concorrenti (modalita' aggregate)
+    return ssl.create_default_context(cafile=certifi.where())
+
+async def _attempt(
+    method: str,
+    url: str,
+    params: Optional[Dict[str, Any]],
+    json: Optional[Dict[str, Any]],
+    headers: Optional[Dict[str, str]],
+    timeout: float,
+    endpoint: str,
+    attempt: int,
+    source: str,
+    decoder: Optional[Callable[[bytes], Any]] = None,
+) -> Any:
+    """Un singolo tentativo: solleva HTTPStatusError su 4xx/5xx e ritorna il JSON decodificato."""
+    t = timing.current()
+    rec = t.http_call(endpoint) if t is not None else None
+    if rec is not None:
+        rec.attempt, rec.source = attempt, source
+    t0 = time.perf_counter()
+    try:
+        client = httpx.AsyncClient(timeout=timeout, headers=headers, verify=_ssl_context())
+        if rec is not None:
+            rec.ms["setup"] = (time.perf_counter() - t0) * 1000.0  # client + contesto SSL
+        async with client:
+            r = await client.request(method, url, params=params, json=json,
+                                     extensions={"trace": rec.trace} if rec is not None else None)
+            metrics.HTTP_REQUESTS.inc(endpoint=endpoint, status=r.status_code)
+            if rec is not None:
+                rec.status = r.status_code
+            r.raise_for_status()
+            tp = time.perf_counter()
+            data = (decoder or codecs.loads)(r.content)
+            if rec is not None:
+                rec.ms["parse"] = (time.perf_counter() - tp) * 1000.0
+            resilience.observe(endpoint, time.perf_counter() - t0)
+            return data
+    except Exception as e:
+        metrics.HTTP_ERRORS.inc(endpoint=endpoint, error=type(e).__name__)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        metrics.HTTP_LATENCY.observe(dt, endpoint=endpoint)
+        if rec is not None:
+            rec.ms["total"] = dt * 1000.0
+
+async def _hedged(method, url, params, json, headers, timeout, endpoint, attempt, p: resilience.Policy,
+                  decoder=None) -> Any:
+    """
+    Tentativo con hedging opzionale: se la prima richiesta non risponde entro il p95
+    osservato per l'endpoint, ne parte una seconda identica; vince la prima riuscita.
+    """
+    def start(source: str) -> asyncio.Future:
+        return asyncio.ensure_future(asyncio.wait_for(
+            _attempt(method, url, params, json, headers, timeout, endpoint, attempt, source, decoder), timeout))
+
+    tasks = [start("net")]
+    try:
+        if not p.hedge:
+            return await tasks[0]
+        done, _ = await asyncio.wait(tasks, timeout=resilience.hedge_delay(endpoint, p))
+        if not done:
+            metrics.HTTP_HEDGES.inc(endpoint=endpoint, result="fired")
+            tasks.append(start("hedge"))
+        pending, err = set(tasks), None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if len(tasks) > 1 and f is tasks[1]:
+                        metrics.HTTP_HEDGES.inc(endpoint=endpoint, result="won")
+                    return f.result()
+                err = f.exception()
+        raise err
+    finally:
+        for f in tasks:
+            if not f.done():
+                f.cancel()
+
+def _stale(endpoint: str, key, p: resilience.Policy, err: BaseException) -> Any:
+    """Serve il last-known value dell'endpoint o rilancia `err`."""
+    hit = resilience.last_known(key, p)
+    if hit is None:
+        metrics.CACHE_REQUESTS.inc(cache="last_known", result="miss")
+        raise err
+    metrics.CACHE_REQUESTS.inc(cache="last_known", result="hit")
+    t = timing.current()
+    if t is not None:
+        rec = t.http_call(endpoint)
+        rec.source, rec.age_s = "stale", round(hit[0], 3)
+    return hit[1]
+
+async def request_json(
+    method: str,
+    url: str,
+    params: Optional[Dict[str, Any]] = None,
+    json: Optional[Dict[str, Any]] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: float = 15,
+    label: Optional[str] = None,
+    decoder: Optional[Callable[[bytes], Any]] = None,
+) -> Any:
+    """
+    Esegue la richiesta con la policy dell'endpoint (resilience.policy(label)) e ritorna il JSON.
+    `decoder` (bytes -> oggetto, es. codecs.decoder(codecs.Kline)) sostituisce il loads generico:
+    le risposte arrivano gia' come righe tipizzate; un payload fuori schema e' un errore CLIENT.
+    - errori transitori (timeout, rete, 408/429/5xx): retry con backoff jitterato entro deadline_s
+      (Retry-After rispettato se sta nel budget); hedging opzionale sul p95 osservato
+    - circuito aperto o tentativi esauriti: ultimo valore noto dell'endpoint (se piu' giovane di
+      stale_ttl_s), altrimenti solleva l'errore (CircuitOpenError se il circuito e' aperto)
+    - errori della richiesta (400, 404, ...): sollevati subito, come prima
+    `timeout` del chiamante e' un tetto al timeout per tentativo della policy.
+    Aggiorna sempre i contatori/istogrammi di `metrics`; se e' attivo un collector
+    (timing.collect) registra anche setup/connect/tls/send/wait/transfer/parse per tentativo.
+    """
+    endpoint = label or httpx.URL(url).path
+    p = resilience.policy(endpoint)
+    br = resilience.breaker(endpoint)
+    key = resilience.cache_key(endpoint, params, json, decoder)
+    if not br.allow(p):
+        return _stale(endpoint, key, p, resilience.CircuitOpenError(f"circuit open: {endpoint}"))
+
+    deadline = time.monotonic() + p.deadline_s
+    attempt = 0
+    while True:
+        remaining = deadline - time.monotonic()
+        try:
+            data = await _hedged(method, url, params, json, headers, max(0.001, min(timeout, p.timeout_s, remaining)),
+                                 endpoint, attempt, p, decoder)
+        except asyncio.CancelledError:
+            br.probing = False  # la prova half-open non e' conclusa: non bloccare il breaker
+            raise
+        except Exception as e:
+            kind = resilience.classify(e)
+            if kind == resilience.CLIENT:
+                br.success()  # l'endpoint risponde: e' la richiesta a essere sbagliata
+                raise
+            br.failure(p)
+            delay = max(resilience.backoff(p, attempt), resilience.retry_after(e))
+            if (kind != resilience.RETRY or attempt >= p.retries
+                    or delay >= deadline - time.monotonic() or not br.allow(p)):
+                return _stale(endpoint, key, p, e)
+            metrics.HTTP_RETRIES.inc(endpoint=endpoint)
+            await asyncio.sleep(delay)
+            attempt += 1
+            continue
+        br.success()
+        resilience.remember(key, data)
+        return data
@@ -1,6 +1,11 @@
 from __future__ import annotations
-from dataclasses import dataclass
-from typing import Optional, Dict, Any, List
+import re
+from dataclasses import dataclass, field, is_dataclass
+from types import SimpleNamespace
+from typing import Optional, Dict, Any, List, Callable, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:  # numpy solo per il valutatore vettoriale (import lazy: avvio CLI)
+    import numpy as np
 
 # ----------------------------
 # Pesi (simmetrici)
@@ -15,6 +20,9 @@ class BearWeights:
     whales_net_selling: int = 10
     vwap_below: int = 12               # NEW
     break_vwap_down: int = 18          # NEW
+    exchange_inflow: int = 10
+    book_ask_heavy: int = 8
+    microprice_down: int = 5
 
 @dataclass
 class BullWeights:
@@ -25,6 +33,9 @@ class BullWeights:
     whales_net_buying: int = 10
     vwap_above: int = 12               # NEW
     break_vwap_up: int = 18            # NEW
+    exchange_outflow: int = 10
+    book_bid_heavy: int = 8
+    microprice_up: int = 5
 
 # (Facoltativo: non usato direttamente, le soglie arrivano nel dict thresholds)
 @dataclass
@@ -52,110 +63,360 @@ class SignalInputs:
     vwap_distance_pct: float       # NEW (|close - vwap| / vwap * 100)
     # on-chain / proxy
     whales_net_selling_7d: Optional[bool] = None  # True=bear, False=bull, None=nessun segnale
+    exchange_netflow_7d: Optional[float] = None   # Glassnode: afflussi netti exchange 7d (coin), None=nessun dato
+    # order book (WebSocket, --with-depth); None = book non disponibile
+    book_imbalance: Optional[float] = None        # top N: (bid - ask) / (bid + ask), in [-1, 1]
+    microprice_skew: Optional[float] = None       # (microprice - mid) / (spread / 2), in [-1, 1]
+
+# ----------------------------
+# Registro regole
+# ----------------------------
+# Ogni regola dichiara lato, chiave del peso (bear_weights/bull_weights), soglie con default,
+# condizione e testo del motivo. Da qui l'engine genera:
+#   - il valutatore scalare (ScoringModel.score): codice Python compilato una volta, pesi e
+#     soglie come costanti, nessun dict/lista per chiamata -> una regola in piu' = un `if` in piu'
+#   - il valutatore vettoriale (ScoringModel.score_arrays) usato da backtest.run.decide_frame
+# Nelle espressioni `x.<campo>` e' un input (campo di SignalInputs o colonna delle feature) e
+# `th.<chiave>` una soglia (sezione thresholds del config).
+# Un nuovo segnale: campo in SignalInputs (con default), valore calcolato in pipeline.evaluate e
+# colonna in enrich_features, register(Rule(...)). Pesi, scoring, motivi e backtest seguono.
+BEAR, BULL = "bear", "bull"
+
+@dataclass(frozen=True)
+class Rule:
+    key: str                                # chiave del peso, es. "oi_drop"
+    side: str                               # BEAR | BULL
+    weight: int                             # peso di default (sovrascrivibile da config)
+    expr: str                               # condizione scalare, es. "x.oi_drop_pct >= th.oi_drop_pct"
+    reason: str                             # motivo (str.format con x), es. "oi_drop>={x.oi_drop_pct:.1f}%"
+    thresholds: Dict[str, float] = field(default_factory=dict)  # soglie usate -> default
+    vexpr: Optional[str] = ""               # condizione numpy ("" = expr; None = non disponibile in storico)
+
+    @property
+    def inputs(self) -> Tuple[str, ...]:
+        exprs = self.expr + " " + (self.vexpr or "")
+        return tuple(dict.fromkeys(_INPUT_RE.findall(exprs)))
+
+_INPUT_RE = re.compile(r"\bx\.(\w+)")
+_THRESH_RE = re.compile(r"\bth\.(\w+)")
+
+_rules: List[Rule] = []
+_version = 0   # cambia a ogni register(): invalida i modelli compilati
+
+def register(rule: Rule, replace: bool = False) -> Rule:
+    """Aggiunge una regola (in coda al suo lato: l'ordine e' quello dei motivi)."""
+    global _version
+    if rule.side not in (BEAR, BULL):
+        raise ValueError(f"rule {rule.key}: side deve essere '{BEAR}' o '{BULL}'")
+    for th in _THRESH_RE.findall(rule.expr + " " + (rule.vexpr or "")):
+        if th not in rule.thresholds:
+            raise ValueError(f"rule {rule.key}: soglia '{th}' senza default in thresholds")
+    for i, r in enumerate(_rules):
+        if r.key == rule.key and r.side == rule.side:
+            if not replace:
+                raise ValueError(f"rule {rule.side}.{rule.key} gia' registrata")
+            _rules[i] = rule
+            break
+    else:
+        _rules.append(rule)
+    _version += 1
+    return rule
+
+def rules(side: Optional[str] = None) -> List[Rule]:
+    return [r for r in _rules if side is None or r.side == side]
+
+# fallback whales (x.whales_net_selling_7d senza Santiment): top-trader long/short ratio Binance,
+# variazione % tra primo e ultimo degli ultimi WHALES_RATIO_POINTS punti a WHALES_RATIO_PERIOD.
+# Stessa definizione nel live (pipeline) e in storico (backtest.features.whales_ratio_change).
+WHALES_RATIO_PERIOD = "4h"
+WHALES_RATIO_POINTS = 60
+
+# regole di base (stesso ordine e stessi default storici di BearWeights/BullWeights)
+for _r in (
+    Rule("funding_neutral_or_neg", BEAR, BearWeights.funding_neutral_or_neg,
+         "x.funding_rate <= th.funding_neutral_max", "funding<=neutral ({x.funding_rate:.5f})",
+         {"funding_neutral_max": 0.0001}),
+    Rule("oi_drop", BEAR, BearWeights.oi_drop,
+         "x.oi_drop_pct >= th.oi_drop_pct", "oi_drop>={x.oi_drop_pct:.1f}%", {"oi_drop_pct": 3.0}),
+    Rule("liq_spike_mean_revert", BEAR, BearWeights.liq_spike_mean_revert,
+         "x.liq_usd_15m >= th.liquidations_usd_15m", "liqs_spike_15m>={x.liq_usd_15m:,.0f}$",
+         {"liquidations_usd_15m": 150_000_000}),
+    Rule("cvd_negative", BEAR, BearWeights.cvd_negative, "x.cvd_slope < 0", "cvd<0 ({x.cvd_slope:.3f})"),
+    Rule("break_pivot_down", BEAR, BearWeights.break_pivot_down, "x.broke_pivot_down", "break_pivot_down"),
+    # VWAP bear: sotto VWAP con distanza minima
+    Rule("vwap_below", BEAR, BearWeights.vwap_below,
+         "(not x.above_vwap) and x.vwap_distance_pct >= th.vwap_min_distance_pct",
+         "below_vwap({x.vwap_distance_pct:.2f}%)", {"vwap_min_distance_pct": 0.2},
+         vexpr="~x.above_vwap & (x.vwap_distance_pct >= th.vwap_min_distance_pct)"),
+    Rule("break_vwap_down", BEAR, BearWeights.break_vwap_down, "x.broke_vwap_down", "break_vwap_down"),
+    Rule("whales_net_selling", BEAR, BearWeights.whales_net_selling,
+         "x.whales_net_selling_7d is True", "whales_selling",
+         vexpr="x.whales_net_selling_7d == 1"),  # storico: 1.0/0.0/NaN (backtest.features.whales_signal)
+    # on-chain: coin verso gli exchange (pressione in vendita) / in uscita (accumulo); NaN in storico = no
+    Rule("exchange_inflow", BEAR, BearWeights.exchange_inflow,
+         "x.exchange_netflow_7d is not None and x.exchange_netflow_7d > th.exchange_netflow_min",
+         "exchange_inflow_7d={x.exchange_netflow_7d:,.0f}", {"exchange_netflow_min": 0.0},
+         vexpr="x.exchange_netflow_7d > th.exchange_netflow_min"),
+    # order book: offerta dominante nei primi N livelli / microprice spinto verso il bid
+    Rule("book_ask_heavy", BEAR, BearWeights.book_ask_heavy,
+         "x.book_imbalance is not None and x.book_imbalance <= -th.book_imbalance_min",
+         "book_ask_heavy({x.book_imbalance:+.2f})", {"book_imbalance_min": 0.3},
+         vexpr="x.book_imbalance <= -th.book_imbalance_min"),
+    Rule("microprice_down", BEAR, BearWeights.microprice_down,
+         "x.microprice_skew is not None and x.microprice_skew <= -th.microprice_skew_min",
+         "microprice_down({x.microprice_skew:+.2f})", {"microprice_skew_min": 0.5},
+         vexpr="x.microprice_skew <= -th.microprice_skew_min"),
+
+    Rule("funding_positive", BULL, BullWeights.funding_positive,
+         "x.funding_rate >= th.funding_bull_min", "funding>=bull ({x.funding_rate:.5f})",
+         {"funding_bull_min": 0.0002}),
+    Rule("oi_rise", BULL, BullWeights.oi_rise,
+         "x.oi_rise_pct >= th.oi_rise_pct", "oi_rise>={x.oi_rise_pct:.1f}%", {"oi_rise_pct": 3.0}),
+    Rule("cvd_positive", BULL, BullWeights.cvd_positive, "x.cvd_slope > 0", "cvd>0 ({x.cvd_slope:.3f})"),
+    Rule("break_pivot_up", BULL, BullWeights.break_pivot_up, "x.broke_pivot_up", "break_pivot_up"),
+    # VWAP bull: sopra VWAP con distanza minima
+    Rule("vwap_above", BULL, BullWeights.vwap_above,
+         "x.above_vwap and x.vwap_distance_pct >= th.vwap_min_distance_pct",
+         "above_vwap({x.vwap_distance_pct:.2f}%)", {"vwap_min_distance_pct": 0.2},
+         vexpr="x.above_vwap & (x.vwap_distance_pct >= th.vwap_min_distance_pct)"),
+    Rule("break_vwap_up", BULL, BullWeights.break_vwap_up, "x.broke_vwap_up", "break_vwap_up"),
+    Rule("whales_net_buying", BULL, BullWeights.whales_net_buying,
+         "x.whales_net_selling_7d is False", "whales_buying",
+         vexpr="x.whales_net_selling_7d == 0"),  # implicito: net-buying
+    Rule("exchange_outflow", BULL, BullWeights.exchange_outflow,
+         "x.exchange_netflow_7d is not None and x.exchange_netflow_7d < -th.exchange_netflow_min",
+         "exchange_outflow_7d={x.exchange_netflow_7d:,.0f}", {"exchange_netflow_min": 0.0},
+         vexpr="x.exchange_netflow_7d < -th.exchange_netflow_min"),
+    Rule("book_bid_heavy", BULL, BullWeights.book_bid_heavy,
+         "x.book_imbalance is not None and x.book_imbalance >= th.book_imbalance_min",
+         "book_bid_heavy({x.book_imbalance:+.2f})", {"book_imbalance_min": 0.3},
+         vexpr="x.book_imbalance >= th.book_imbalance_min"),
+    Rule("microprice_up", BULL, BullWeights.microprice_up,
+         "x.microprice_skew is not None and x.microprice_skew >= th.microprice_skew_min",
+         "microprice_up({x.microprice_skew:+.2f})", {"microprice_skew_min": 0.5},
+         vexpr="x.microprice_skew >= th.microprice_skew_min"),
+):
+    register(_r)
 
 # ----------------------------
 # Core scoring
 # ----------------------------
+_compiled: Dict[Any, "ScoringModel"] = {}
+_last_call: Optional[Tuple[Any, ...]] = None
+
 def compute_score(
     x: SignalInputs,
     bear_w: BearWeights,
     bull_w: BullWeights,
     thresholds: Dict[str, float]
 ) -> Dict[str, Any]:
-    bear_score, bull_score = 0, 0
-    bear_reasons: List[str] = []
-    bull_reasons: List[str] = []
-
-    # ===== BEAR side =====
-    if x.funding_rate <= thresholds.get("funding_neutral_max", 0.0001):
-        bear_score += bear_w.funding_neutral_or_neg
-        bear_reasons.append(f"funding<=neutral ({x.funding_rate:.5f})")
-
-    if x.oi_drop_pct >= thresholds.get("oi_drop_pct", 3.0):
-        bear_score += bear_w.oi_drop
-        bear_reasons.append(f"oi_drop>={x.oi_drop_pct:.1f}%")
-
-    if x.liq_usd_15m >= thresholds.get("liquidations_usd_15m", 150_000_000):
-        bear_score += bear_w.liq_spike_mean_revert
-        bear_reasons.append(f"liqs_spike_15m>={x.liq_usd_15m:,.0f}$")
-
-    if x.cvd_slope < 0:
-        bear_score += bear_w.cvd_negative
-        bear_reasons.append(f"cvd<0 ({x.cvd_slope:.3f})")
-
-    if x.broke_pivot_down:
-        bear_score += bear_w.break_pivot_down
-        bear_reasons.append("break_pivot_down")
-
-    # VWAP bear: sotto VWAP con distanza minima e/o rottura al ribasso
-    vwap_min = float(thresholds.get("vwap_min_distance_pct", 0.2))  # default 0.2%
-    if (not x.above_vwap) and x.vwap_distance_pct >= vwap_min:
-        bear_score += bear_w.vwap_below
-        bear_reasons.append(f"below_vwap({x.vwap_distance_pct:.2f}%)")
-    if x.broke_vwap_down:
-        bear_score += bear_w.break_vwap_down
-        bear_reasons.append("break_vwap_down")
-
-    if x.whales_net_selling_7d is True:
-        bear_score += bear_w.whales_net_selling
-        bear_reasons.append("whales_selling")
-
-    # ===== BULL side (simmetrico) =====
-    if x.funding_rate >= thresholds.get("funding_bull_min", 0.0002):
-        bull_score += bull_w.funding_positive
-        bull_reasons.append(f"funding>=bull ({x.funding_rate:.5f})")
-
-    if x.oi_rise_pct >= thresholds.get("oi_rise_pct", 3.0):
-        bull_score += bull_w.oi_rise
-        bull_reasons.append(f"oi_rise>={x.oi_rise_pct:.1f}%")
-
-    if x.cvd_slope > 0:
-        bull_score += bull_w.cvd_positive
-        bull_reasons.append(f"cvd>0 ({x.cvd_slope:.3f})")
-
-    if x.broke_pivot_up:
-        bull_score += bull_w.break_pivot_up
-        bull_reasons.append("break_pivot_up")
-
-    # VWAP bull: sopra VWAP con distanza minima e/o rottura al rialzo
-    if x.above_vwap and x.vwap_distance_pct >= vwap_min:
-        bull_score += bull_w.vwap_above
-        bull_reasons.append(f"above_vwap({x.vwap_distance_pct:.2f}%)")
-    if x.broke_vwap_up:
-        bull_score += bull_w.break_vwap_up
-        bull_reasons.append("break_vwap_up")
-
-    if x.whales_net_selling_7d is False:  # implicito: net-buying
-        bull_score += bull_w.whales_net_buying
-        bull_reasons.append("whales_buying")
-
-    # ===== Decisione con soglie + affidabilità =====
-    sell_score = int(thresholds.get("decision.sell_score", 65))
-    buy_score  = int(thresholds.get("decision.buy_score", 65))
-
-    # Regole di affidabilità (opzionali)
-    min_bull_reasons = int(thresholds.get("min_bull_reasons", 0))
-    min_bear_reasons = int(thresholds.get("min_bear_reasons", 0))
-    margin_buy_min   = float(thresholds.get("margin_buy_min", 0.0))
-    margin_sell_min  = float(thresholds.get("margin_sell_min", 0.0))
-
-    eligible_bull = (len(bull_reasons) >= min_bull_reasons)
-    eligible_bear = (len(bear_reasons) >= min_bear_reasons)
-
-    decision = "NEUTRAL"
-    reasons: List[str] = []
-    score = {"bear": bear_score, "bull": bull_score}
-
-    bear_margin_ok = (bear_score - bull_score) >= margin_sell_min
-    bull_margin_ok = (bull_score - bear_score) >= margin_buy_min
-
-    if eligible_bear and bear_margin_ok and bear_score >= sell_score and bear_score >= bull_score:
-        decision = "SELL"
-        reasons = bear_reasons
-    elif eligible_bull and bull_margin_ok and bull_score >= buy_score and bull_score > bear_score:
-        decision = "BUY"
-        reasons = bull_reasons
-    else:
-        reasons = (["BEAR:"] + bear_reasons) + (["BULL:"] + bull_reasons)
+    """
+    Score + decisione con le regole registrate. Il modello compilato e' riusato se pesi e
+    soglie sono gli stessi oggetti della chiamata precedente (controllo per identita', come
+    model_for: soglie o pesi modificati in place vanno passati come nuovi oggetti), altrimenti
+    cercato per valore tra quelli gia' compilati. In loop conviene comunque un ScoringModel.
+    """
+    global _last_call
+    lc = _last_call
+    if lc is not None and lc[0] is thresholds and lc[1] is bear_w and lc[2] is bull_w and lc[3] == _version:
+        return lc[4].evaluate(x)
+    try:
+        key = (_version, tuple(vars(bear_w).items()), tuple(vars(bull_w).items()), tuple(thresholds.items()))
+        m = _compiled.get(key)
+    except TypeError:  # soglie non hashabili: nessuna cache
+        key, m = None, None
+    if m is None:
+        m = ScoringModel(bear_w, bull_w, thresholds)
+        if key is not None:
+            if len(_compiled) >= 64:
+                _compiled.clear()
+            _compiled[key] = m
+    _last_call = (thresholds, bear_w, bull_w, _version, m)
+    return m.evaluate(x)
+
+# ----------------------------
+# Modello compilato (hot path: daemon, backtest riga per riga, parity)
+# ----------------------------
+# I motivi vengono formattati solo se qualcuno legge Score.reasons (bitmask delle regole scattate).
+
+class Score:
+    """Esito di ScoringModel.score(): punteggi e decisione subito, motivi su richiesta."""
+    __slots__ = ("bear", "bull", "decision", "x", "bear_mask", "bull_mask", "model")
+
+    def __init__(self, bear: int, bull: int, decision: str, x: SignalInputs, bear_mask: int, bull_mask: int,
+                 model: "ScoringModel"):
+        self.bear, self.bull, self.decision = bear, bull, decision
+        self.x, self.bear_mask, self.bull_mask, self.model = x, bear_mask, bull_mask, model
+
+    @property
+    def reasons(self) -> List[str]:
+        bear, bull = self.model.render(self.x, self.bear_mask, self.bull_mask)
+        if self.decision == "SELL":
+            return bear
+        if self.decision == "BUY":
+            return bull
+        return ["BEAR:"] + bear + ["BULL:"] + bull
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Stesso formato di compute_score."""
+        return {"score": {"bear": self.bear, "bull": self.bull}, "decision": self.decision, "reasons": self.reasons}
+
+def _weights(w: Any, side: str, side_rules: List[Rule]) -> Dict[str, int]:
+    given = dict(vars(w) if is_dataclass(w) else (w or {}))
+    known = {r.key for r in side_rules}
+    for k in given:
+        if k not in known:
+            raise ValueError(f"{side}_weights: chiave sconosciuta '{k}' (nessuna regola registrata)")
+    return {r.key: given.get(r.key, r.weight) for r in side_rules}
+
+class ScoringModel:
+    """
+    Regole registrate + pesi e soglie compilati una volta.
+      model = ScoringModel.from_config(cfg)
+      s = model.score(x)          # Score: bear, bull, decision, reasons (lazy)
+      model.evaluate(x)           # dict di compute_score
+      model.score_arrays(cols)    # versione vettoriale (numpy) per il backtest
+    bear_w/bull_w: BearWeights/BullWeights o dict {chiave regola: peso}; le chiavi non
+    registrate sollevano ValueError. Il modello e' immutabile e fotografa il registro.
+    """
+    def __init__(self, bear_w: Any, bull_w: Any, thresholds: Dict[str, Any]):
+        self.bear_rules, self.bull_rules = rules(BEAR), rules(BULL)
+        self.bear_w = _weights(bear_w, BEAR, self.bear_rules)
+        self.bull_w = _weights(bull_w, BULL, self.bull_rules)
+        self.thresholds = dict(thresholds)
+        self.version = _version
+        th = {}
+        for r in self.bear_rules + self.bull_rules:
+            for k, default in r.thresholds.items():
+                th[k] = float(self.thresholds.get(k, default))
+        self.th = th
+        self.sell_score = int(self.thresholds.get("decision.sell_score", 65))
+        self.buy_score = int(self.thresholds.get("decision.buy_score", 65))
+        self.min_bull = int(self.thresholds.get("min_bull_reasons", 0))
+        self.min_bear = int(self.thresholds.get("min_bear_reasons", 0))
+        self.margin_buy = float(self.thresholds.get("margin_buy_min", 0.0))
+        self.margin_sell = float(self.thresholds.get("margin_sell_min", 0.0))
+        self.score, self.render, self.evaluate = self._compile()
+        self._vrules = [(r, compile(r.vexpr or r.expr, f"<rule {r.side}.{r.key}>", "eval"))
+                        for r in self.bear_rules + self.bull_rules if r.vexpr is not None]
+
+    @classmethod
+    def from_config(cls, cfg: Dict[str, Any]) -> "ScoringModel":
+        dec = cfg.get("decision", {}) or {}
+        return cls(cfg.get("bear_weights", {}) or {}, cfg.get("bull_weights", {}) or {},
+                   {**(cfg.get("thresholds", {}) or {}),
+                    "decision.sell_score": dec.get("sell_score", 65),
+                    "decision.buy_score": dec.get("buy_score", 65)})
+
+    def _compile(self) -> Tuple[Callable[[SignalInputs], Score], Callable[..., Tuple[List[str], List[str]]],
+                                Callable[[SignalInputs], Dict[str, Any]]]:
+        # sorgente generato: input in locali, soglie e pesi come costanti; i motivi in una
+        # funzione a parte (template -> f-string), chiamata solo da Score.reasons.
+        # evaluate (dict di compute_score, motivi sempre formattati): un solo passaggio,
+        # senza Score ne' bitmask
+        def sub(expr: str) -> str:
+            expr = _THRESH_RE.sub(lambda m: repr(self.th[m.group(1)]), expr)
+            return _INPUT_RE.sub(r"x_\1", expr)
+
+        used = dict.fromkeys(i for r in self.bear_rules + self.bull_rules for i in _INPUT_RE.findall(r.expr))
+        src = ["def score(x):", "    bear = bull = nb = nu = mb = mu = 0"]
+        src += [f"    x_{i} = x.{i}" for i in used]
+        for side, side_rules, w, acc, n, mask in ((BEAR, self.bear_rules, self.bear_w, "bear", "nb", "mb"),
+                                                  (BULL, self.bull_rules, self.bull_w, "bull", "nu", "mu")):
+            for i, r in enumerate(side_rules):
+                src += [f"    if {sub(r.expr)}:  # {side}.{r.key}",
+                        f"        {acc} += {w[r.key]!r}; {n} += 1; {mask} |= {1 << i}"]
+        # decisione (SELL ha precedenza)
+        src += [
+            f"    if nb >= {self.min_bear} and (bear - bull) >= {self.margin_sell!r} and bear >= {self.sell_score}"
+            " and bear >= bull:",
+            "        decision = 'SELL'",
+            f"    elif nu >= {self.min_bull} and (bull - bear) >= {self.margin_buy!r} and bull >= {self.buy_score}"
+            " and bull > bear:",
+            "        decision = 'BUY'",
+            "    else:",
+            "        decision = 'NEUTRAL'",
+            "    return Score(bear, bull, decision, x, mb, mu, model)",
+            "",
+            "def render(x, mb, mu):",
+            "    bear, bull = [], []",
+        ]
+        for side_rules, lst, mask in ((self.bear_rules, "bear", "mb"), (self.bull_rules, "bull", "mu")):
+            for i, r in enumerate(side_rules):
+                src += [f"    if {mask} & {1 << i}:", f"        {lst}.append(f{r.reason!r})"]
+        src.append("    return bear, bull")
+        # evaluate: punteggi e motivi insieme
+        src += ["", "def evaluate(x):", "    bear = bull = 0", "    rb, ru = [], []"]
+        src += [f"    x_{i} = x.{i}" for i in used]
+        for side_rules, w, acc, lst in ((self.bear_rules, self.bear_w, "bear", "rb"),
+                                        (self.bull_rules, self.bull_w, "bull", "ru")):
+            for r in side_rules:
+                src += [f"    if {sub(r.expr)}:", f"        {acc} += {w[r.key]!r}; {lst}.append(f{r.reason!r})"]
+        src += [
+            f"    if len(rb) >= {self.min_bear} and (bear - bull) >= {self.margin_sell!r} and bear >= {self.sell_score}"
+            " and bear >= bull:",
+            "        decision, reasons = 'SELL', rb",
+            f"    elif len(ru) >= {self.min_bull} and (bull - bear) >= {self.margin_buy!r} and bull >= {self.buy_score}"
+            " and bull > bear:",
+            "        decision, reasons = 'BUY', ru",
+            "    else:",
+            "        decision, reasons = 'NEUTRAL', ['BEAR:'] + rb + ['BULL:'] + ru",
+            "    return {'score': {'bear': bear, 'bull': bull}, 'decision': decision, 'reasons': reasons}",
+        ]
+        self.source = "\n".join(src)
+        ns: Dict[str, Any] = {"Score": Score, "model": self, "inf": float("inf"), "nan": float("nan")}
+        exec(compile(self.source, f"<ScoringModel v{self.version}>", "exec"), ns)
+        return ns["score"], ns["render"], ns["evaluate"]
+
+    def score_arrays(self, cols: Dict[str, Any]) -> Dict[str, np.ndarray]:
+        """
+        Valutatore vettoriale: `cols` mappa input -> array (stessa lunghezza); le regole con
+        vexpr=None (input non disponibili in storico) sono escluse.
+        Ritorna {bear, bull, bear_n, bull_n, decision}.
+        """
+        import numpy as np
+        x = SimpleNamespace(**cols)
+        th = SimpleNamespace(**self.th)
+        n = len(next(iter(cols.values()))) if cols else 0
+        out = {}
+        for side in (BEAR, BULL):
+            out[side], out[side + "_n"] = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+        env = {"x": x, "th": th, "np": np}
+        for r, code in self._vrules:
+            m = np.asarray(eval(code, env), dtype=bool)
+            w = (self.bear_w if r.side == BEAR else self.bull_w)[r.key]
+            if isinstance(w, int):
+                out[r.side] += m * w
+            else:  # peso non intero da config: il punteggio diventa float
+                out[r.side] = out[r.side] + m * w
+            out[r.side + "_n"] += m
+        bear, bull = out[BEAR], out[BULL]
+        sell = ((out["bear_n"] >= self.min_bear) & ((bear - bull) >= self.margin_sell)
+                & (bear >= self.sell_score) & (bear >= bull))
+        buy = (~sell & (out["bull_n"] >= self.min_bull) & ((bull - bear) >= self.margin_buy)
+               & (bull >= self.buy_score) & (bull > bear))
+        out["decision"] = np.where(sell, "SELL", np.where(buy, "BUY", "NEUTRAL"))
+        return out
+
+    def vector_inputs(self) -> List[str]:
+        """Input letti dal valutatore vettoriale (colonne richieste a decide_frame)."""
+        return list(dict.fromkeys(i for r, _ in self._vrules for i in _INPUT_RE.findall(r.vexpr or r.expr)))
+
+_models: Dict[Any, Tuple[Dict[str, Any], ScoringModel]] = {}
 
-    return {"score": score, "decision": decision, "reasons": reasons}
+def model_for(cfg: Dict[str, Any]) -> ScoringModel:
+    """
+    ScoringModel memoizzato per config e versione del registro: chi chiama in loop con lo
+    stesso config (daemon, decide_row) compila una volta sola. I Config validati
+    (eth_signal_kit.config) sono identificati dal digest del file, i dict semplici per
+    oggetto (id): un dict modificato in place va passato come nuovo dict.
+    """
+    key = getattr(cfg, "digest", None) or id(cfg)
+    hit = _models.get(key)
+    if hit is not None and (hit[0] is cfg or isinstance(key, str)) and hit[1].version == _version:
+        return hit[1]
+    if len(_models) >= 16:
+        _models.clear()
+    m = ScoringModel.from_config(cfg)
+    _models[key] = (cfg, m)
+    return m
@@ -0,0 +1,172 @@
+from __future__ import annotations
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:  # pandas importato solo all'uso
+    import pandas as pd
+
+# ----------------------------
+# Barre a informazione costante (volume, dollar, imbalance) dai trade
+# ----------------------------
+# Una barra si chiude sul trade che fa superare la soglia, non dopo un tempo fisso: barre rade
+# nelle ore calme, fitte nelle cascate di liquidazioni.
+#   volume   : volume base cumulato; la barra si chiude quando il cumulato supera il prossimo
+#              multiplo della soglia (l'eccesso resta nel conteggio: soglie a cadenza fissa)
+#   dollar   : come volume, su prezzo * quantita'
+#   imbalance: sbilanciamento taker (buy - sell, volume base) dall'apertura della barra;
+#              chiusura quando |sbilanciamento| >= soglia, poi riparte da zero
+# Stesso BarBuilder per il live (update/update_trade: un trade alla volta, payload aggTrade) e
+# per lo storico (update_chunk: array di data_sources.aggtrades, vettoriale): cumulati sommati
+# nello stesso ordine, quindi le stesse barre in entrambi i modi. Lo stato (cumulato, barra
+# aperta) passa da un chunk al successivo.
+# build_bars() -> DataFrame con le colonne delle klines (open, high, low, close, volume,
+# taker_buy_base) + open_ts, dollar, trades: indice = ts del trade di chiusura (la barra e' nota
+# da quel momento), reso strettamente crescente; attrs["bars"] = spec ("volume:500").
+
+BAR_KINDS = ("volume", "dollar", "imbalance")
+
+BAR = np.dtype([("open_ts", "<i8"), ("close_ts", "<i8"), ("open", "<f8"), ("high", "<f8"), ("low", "<f8"),
+                ("close", "<f8"), ("volume", "<f8"), ("taker_buy_base", "<f8"), ("dollar", "<f8"),
+                ("trades", "<i8")])
+
+def parse_spec(spec: str) -> Optional[Tuple[str, float]]:
+    """"volume:500" / "dollar:5e6" / "imbalance:200" -> (tipo, soglia); None per un timeframe a tempo (5T)."""
+    kind, sep, value = str(spec).partition(":")
+    if not sep or kind not in BAR_KINDS:
+        return None
+    threshold = float(value)
+    if not threshold > 0:
+        raise ValueError(f"bars: soglia non valida: {spec}")
+    return kind, threshold
+
+class BarBuilder:
+    def __init__(self, kind: str, threshold: float):
+        if kind not in BAR_KINDS:
+            raise ValueError(f"bars: tipo non supportato: {kind}")
+        if not threshold > 0:
+            raise ValueError(f"bars: soglia non valida: {threshold}")
+        self.kind, self.threshold = kind, float(threshold)
+        self._cum = 0.0   # volume/dollar: cumulato dall'inizio; imbalance: sbilanciamento della barra aperta
+        self._open: Optional[List[Any]] = None   # barra in costruzione, campi nell'ordine di BAR
+
+    @property
+    def spec(self) -> str:
+        return f"{self.kind}:{self.threshold:g}"
+
+    def partial(self) -> Optional[Dict[str, Any]]:
+        """Barra in costruzione (non ancora chiusa), None se non ci sono trade dopo l'ultima chiusura."""
+        return dict(zip(BAR.names, self._open)) if self._open is not None else None
+
+    # --- live: un trade alla volta ---
+    def update(self, price: float, qty: float, ts: int, buyer_maker: bool) -> Optional[Dict[str, Any]]:
+        """Aggiunge un trade; ritorna la barra chiusa da questo trade (dict con i campi di BAR) o None."""
+        b = self._open
+        if b is None:
+            b = self._open = [ts, ts, price, price, price, price, 0.0, 0.0, 0.0, 0]
+        b[1] = ts
+        if price > b[3]:
+            b[3] = price
+        if price < b[4]:
+            b[4] = price
+        b[5] = price
+        b[6] += qty
+        if not buyer_maker:
+            b[7] += qty
+        b[8] += price * qty
+        b[9] += 1
+        if self.kind == "imbalance":
+            self._cum += -qty if buyer_maker else qty
+            closed = abs(self._cum) >= self.threshold
+            if closed:
+                self._cum = 0.0
+        else:
+            c0 = self._cum
+            self._cum = c0 + (qty if self.kind == "volume" else price * qty)
+            closed = math.floor(self._cum / self.threshold) > math.floor(c0 / self.threshold)
+        if not closed:
+            return None
+        self._open = None
+        return dict(zip(BAR.names, b))
+
+    def update_trade(self, t: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Payload aggTrade Binance (p, q, T, m; anche stringhe) o dict di Archive.iter_trades."""
+        return self.update(float(t["p"]), float(t["q"]), int(t["T"]), bool(t["m"]))
+
+    # --- storico: array di trade (campi ts, price, qty, m) ---
+    def _closes(self, c: np.ndarray) -> np.ndarray:
+        """Indici dei trade che chiudono una barra nel chunk (aggiorna il cumulato)."""
+        price, qty, m = c["price"], c["qty"], c["m"]
+        T = self.threshold
+        if self.kind != "imbalance":
+            cs = np.cumsum(np.concatenate(([self._cum], qty if self.kind == "volume" else price * qty)))
+            self._cum = float(cs[-1])
+            k = np.floor(cs / T)
+            return np.flatnonzero(k[1:] > k[:-1])
+        # imbalance: la soglia dipende dall'apertura della barra -> ricerca sequenziale a finestre
+        signed = np.where(m, -qty, qty)
+        out, i, n, w, theta = [], 0, len(signed), 1024, self._cum
+        while i < n:
+            cs = np.cumsum(np.concatenate(([theta], signed[i:i + w])))[1:]
+            hit = np.flatnonzero(np.abs(cs) >= T)
+            if hit.size:
+                j = int(hit[0])
+                out.append(i + j)
+                i, theta, w = i + j + 1, 0.0, max(64, 2 * (j + 1))
+            else:
+                i, theta, w = i + len(cs), float(cs[-1]), min(w * 2, 1 << 16)
+        self._cum = theta
+        return np.asarray(out, dtype=np.int64)
+
+    def update_chunk(self, c: np.ndarray) -> np.ndarray:
+        """Aggiunge un chunk di trade in ordine di tempo; ritorna le barre chiuse (array BAR)."""
+        n = len(c)
+        if not n:
+            return np.empty(0, BAR)
+        ends = self._closes(c)
+        starts = np.concatenate(([0], ends + 1))
+        starts = starts[starts < n]
+        ts, price, qty = c["ts"], c["price"], c["qty"]
+        last = np.concatenate((starts[1:], [n])) - 1
+        seg = np.empty(len(starts), BAR)
+        seg["open_ts"], seg["close_ts"] = ts[starts], ts[last]
+        seg["open"], seg["close"] = price[starts], price[last]
+        seg["high"] = np.maximum.reduceat(price, starts)
+        seg["low"] = np.minimum.reduceat(price, starts)
+        seg["volume"] = np.add.reduceat(qty, starts)
+        seg["taker_buy_base"] = np.add.reduceat(np.where(c["m"], 0.0, qty), starts)
+        seg["dollar"] = np.add.reduceat(price * qty, starts)
+        seg["trades"] = last - starts + 1
+        p = self._open
+        if p is not None:   # il primo segmento continua la barra aperta dal chunk precedente
+            s = seg[0]
+            s["open_ts"], s["open"] = p[0], p[2]
+            s["high"], s["low"] = max(p[3], s["high"]), min(p[4], s["low"])
+            s["volume"] += p[6]
+            s["taker_buy_base"] += p[7]
+            s["dollar"] += p[8]
+            s["trades"] += p[9]
+        closed = len(ends)
+        self._open = seg[closed].tolist() if len(seg) > closed else None
+        return seg[:closed]
+
+def build_bars(chunks: Iterable[np.ndarray], kind: str, threshold: float, partial: bool = False) -> "pd.DataFrame":
+    """
+    Barre di tutto lo storico dai chunk di trade (Archive.iter_chunks): un chunk alla volta,
+    in memoria solo le barre. `partial` = includi l'ultima barra non ancora chiusa.
+    """
+    import pandas as pd
+    bb = BarBuilder(kind, threshold)
+    parts = [bb.update_chunk(c) for c in chunks]
+    if partial and bb.partial() is not None:
+        parts.append(np.array([tuple(bb._open)], BAR))
+    arr = np.concatenate(parts) if parts else np.empty(0, BAR)
+    # indice strettamente crescente (barre chiuse nello stesso ms: +1 ms), richiesto da join/reindex
+    t = arr["close_ts"].copy()
+    if len(t) > 1:
+        t = np.maximum.accumulate(t - np.arange(len(t))) + np.arange(len(t))
+    df = pd.DataFrame({name: arr[name] for name in BAR.names if name != "close_ts"},
+                      index=pd.to_datetime(t, unit="ms", utc=True).rename("ts"))
+    df.attrs["bars"] = bb.spec
+    return df
@@ -0,0 +1,137 @@
+from __future__ import annotations
+import math
+from bisect import bisect_left
+from itertools import accumulate
+from typing import Dict, Any, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:  # numpy solo per la versione vettoriale (import lazy: avvio CLI)
+    import numpy as np
+
+# ----------------------------
+# Break confermati (thresholds.breakout_confirm_candles)
+# ----------------------------
+# Un break up e' confermato alla barra t se la rottura e' avvenuta alla barra s = t - N + 1
+# (close[s-1] <= L[s] e close[s] > L[s]) e tutte le chiusure da s a t restano sopra il livello
+# (close[j] > L[j]); simmetrico per il break down. L'evento scatta una sola volta, alla N-esima
+# barra. Con N = 1 coincide con il cross singola-barra (prev_close / last_close) storico.
+# Stessa macchina a stati in due forme, con risultati identici:
+#   BreakConfirm / BreakTracker : O(1) per barra (live, daemon)
+#   confirm_breaks              : vettoriale numpy (backtest.features)
+# Livelli NaN non rompono e interrompono la serie (confronti falsi in entrambe le forme).
+
+_UNIT_MS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+def interval_ms(interval: str) -> int:
+    """
+    Intervallo Binance (1m, 15m, 1h, 1d, 1w) -> millisecondi (passo delle barre per BreakTracker).
+    ValueError per unita' senza passo fisso (1M: mesi di lunghezza diversa) o formati non validi.
+    """
+    unit, n = interval[-1:], interval[:-1]
+    if unit not in _UNIT_MS or not n.isdigit() or int(n) < 1:
+        raise ValueError(f"intervallo non supportato: {interval!r} (atteso <n>m|h|d|w, es. 1m, 15m, 4h, 1d)")
+    return int(n) * _UNIT_MS[unit]
+
+class BreakConfirm:
+    """Macchina a stati: streak di chiusure oltre il livello a partire da una rottura."""
+    __slots__ = ("n", "up", "down", "last_close")
+
+    def __init__(self, n: int = 1):
+        self.n = max(1, int(n))
+        self.reset()
+
+    def reset(self) -> None:
+        self.up = 0
+        self.down = 0
+        self.last_close: Optional[float] = None
+
+    def step(self, close: float, level: float, commit: bool = True) -> Tuple[bool, bool]:
+        """Nuova barra (close, livello) -> (break_up confermato, break_down confermato)."""
+        prev = self.last_close
+        above, below = close > level, close < level
+        if prev is not None and prev <= level and above:
+            up = 1
+        elif self.up > 0 and above:
+            up = self.up + 1
+        else:
+            up = 0
+        if prev is not None and prev >= level and below:
+            down = 1
+        elif self.down > 0 and below:
+            down = self.down + 1
+        else:
+            down = 0
+        if commit:
+            self.up, self.down, self.last_close = up, down, close
+        return up == self.n, down == self.n
+
+class BreakTracker:
+    """
+    BreakConfirm alimentato da finestre di barre (open_time crescente) come arrivano dal
+    live: le barre chiuse gia' viste non vengono rielaborate, l'ultima (in formazione) e'
+    valutata senza commit. Un buco di barre o un salto indietro nel tempo azzera lo stato
+    e lo ricostruisce dalla finestra ricevuta.
+    """
+    def __init__(self, n: int, step_ms: int):
+        self.sm = BreakConfirm(n)
+        self.step_ms = int(step_ms)
+        self.last_t: Optional[int] = None
+
+    def update(self, times: Sequence[int], closes: Sequence[float], levels: Sequence[float]) -> Tuple[bool, bool]:
+        if not len(times):
+            return False, False
+        closed = len(times) - 1
+        if self.last_t is not None:
+            nxt = next((i for i in range(closed) if times[i] > self.last_t), None)
+            if times[-1] < self.last_t or (nxt is not None and times[nxt] != self.last_t + self.step_ms):
+                self.sm.reset()
+                self.last_t = None
+        for i in range(closed):
+            if self.last_t is None or times[i] > self.last_t:
+                self.sm.step(closes[i], levels[i])
+                self.last_t = times[i]
+        return self.sm.step(closes[-1], levels[-1], commit=False)
+
+_trackers: Dict[Tuple[Any, ...], BreakTracker] = {}
+
+def tracker(key: Tuple[Any, ...], n: int, step_ms: int) -> BreakTracker:
+    """Tracker per (chiave, N, passo): lo stato sopravvive tra le valutazioni del daemon."""
+    k = (*key, max(1, int(n)), int(step_ms))
+    t = _trackers.get(k)
+    if t is None:
+        t = _trackers[k] = BreakTracker(n, step_ms)
+    return t
+
+def confirm_breaks(close: np.ndarray, level: np.ndarray, n: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """Versione vettoriale di BreakConfirm su tutta la serie: (break_up, break_down) bool."""
+    import numpy as np
+    close = np.asarray(close, dtype=float)
+    level = np.asarray(level, dtype=float)
+    n = max(1, int(n))
+    prev = np.concatenate(([np.nan], close[:-1]))
+    idx = np.arange(len(close))
+    out = []
+    for beyond, raw in ((close > level, (prev <= level) & (close > level)),
+                        (close < level, (prev >= level) & (close < level))):
+        # ultimo evento (rottura o chiusura non oltre il livello): la streak conta da li'
+        last = np.maximum.accumulate(np.where(raw | ~beyond, idx, -1))
+        started = (last >= 0) & raw[np.maximum(last, 0)]
+        streak = np.where(started, idx - last + 1, 0)
+        out.append(streak == n)
+    return out[0], out[1]
+
+def running_vwap(times: Sequence[int], step_ms: int, bars_1m: Sequence[Tuple[int, float, float]]) -> List[float]:
+    """
+    VWAP cumulato alla chiusura di ogni barra `times` (open_time) da barre 1m (t, tp, volume)
+    del giorno; NaN dove non c'e' volume (barre precedenti al giorno UTC).
+    """
+    if not bars_1m:
+        return [math.nan] * len(times)
+    b = sorted(bars_1m, key=lambda r: r[0])
+    t1 = [r[0] for r in b]
+    num = list(accumulate(r[1] * r[2] for r in b))
+    den = list(accumulate(r[2] for r in b))
+    out = []
+    for t in times:
+        p = bisect_left(t1, int(t) + int(step_ms)) - 1
+        out.append(num[p] / den[p] if p >= 0 and den[p] > 0 else math.nan)
+    return out
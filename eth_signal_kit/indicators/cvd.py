@@ -1,7 +1,10 @@
 
 from __future__ import annotations
-import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, TYPE_CHECKING
+
+if TYPE_CHECKING:  # pandas/numpy importati solo all'uso: il pacchetto resta leggero all'avvio
+    import numpy as np
+    import pandas as pd
 
 def cvd_from_aggtrades(agg_trades: List[Dict[str, Any]]) -> pd.DataFrame:
     """
@@ -10,6 +13,7 @@ def cvd_from_aggtrades(agg_trades: List[Dict[str, Any]]) -> pd.DataFrame:
     We'll treat taker-buy volume as positive, taker-sell as negative.
     Expected keys per trade: {'T': time, 'q': qty, 'm': isBuyerMaker}
     """
+    import pandas as pd
     rows = []
     for t in agg_trades:
         qty = float(t.get("q"))
@@ -19,3 +23,36 @@ def cvd_from_aggtrades(agg_trades: List[Dict[str, Any]]) -> pd.DataFrame:
     df = pd.DataFrame(rows).sort_values("time")
     df["cvd"] = df["vol"].cumsum()
     return df
+
+def trade_flow(chunks: Iterable[np.ndarray], step_ms: int) -> pd.DataFrame:
+    """
+    Volume taker buy/sell per barra di `step_ms` da chunk di trade in ordine di tempo (array con
+    campi ts, qty, m: data_sources.aggtrades.Archive.iter_chunks). Un chunk alla volta: la memoria
+    dipende dal numero di barre, non dei trade. Indice = apertura della barra (UTC); colonne
+    taker_buy_base, taker_sell_base, trades, delta (buy - sell).
+    """
+    import numpy as np
+    import pandas as pd
+    keys, buys, sells, counts = [], [], [], []
+    for c in chunks:
+        if not len(c):
+            continue
+        b = c["ts"] // step_ms
+        starts = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+        q, sell = c["qty"], c["m"]
+        keys.append(b[starts])
+        buys.append(np.add.reduceat(np.where(sell, 0.0, q), starts))
+        sells.append(np.add.reduceat(np.where(sell, q, 0.0), starts))
+        counts.append(np.diff(np.r_[starts, len(b)]))
+    if not keys:
+        return pd.DataFrame(columns=["taker_buy_base", "taker_sell_base", "trades", "delta"],
+                            index=pd.DatetimeIndex([], tz="UTC", name="ts"))
+    k = np.concatenate(keys)
+    # la stessa barra puo' essere a cavallo di due chunk: riduzione finale sulle chiavi uguali
+    starts = np.flatnonzero(np.r_[True, k[1:] != k[:-1]])
+    buy = np.add.reduceat(np.concatenate(buys), starts)
+    sell = np.add.reduceat(np.concatenate(sells), starts)
+    out = pd.DataFrame({"taker_buy_base": buy, "taker_sell_base": sell,
+                        "trades": np.add.reduceat(np.concatenate(counts), starts), "delta": buy - sell},
+                       index=pd.to_datetime(k[starts] * step_ms, unit="ms", utc=True).rename("ts"))
+    return out
@@ -0,0 +1,159 @@
+from __future__ import annotations
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# ----------------------------
+# Book locale incrementale (depth WebSocket)
+# ----------------------------
+# Un lato = dict chiave -> quantita' + lista ordinata delle chiavi, con chiave = prezzo (ask) o
+# -prezzo (bid): l'indice 0 e' sempre il best. Ogni livello aggiornato costa una bisect e un
+# aggiornamento O(1) della somma dei primi N livelli (con un insert/remove entra o esce dal top N
+# al piu' un livello), quindi un messaggio costa O(livelli cambiati), senza scansioni del book;
+# insert/remove nella lista sono memmove in C (book di qualche migliaio di livelli al massimo).
+# Le somme incrementali vengono ricalcolate da zero a ogni snapshot e ogni RESUM_EVERY livelli
+# aggiornati (deriva dei float).
+#   book_imbalance  = (bid_N - ask_N) / (bid_N + ask_N)                in [-1, 1], >0 pressione in acquisto
+#   microprice      = (bid * ask_qty + ask * bid_qty) / (bid_qty + ask_qty)   (top of book)
+#   microprice_skew = (microprice - mid) / (spread / 2)                in [-1, 1], >0 spinta verso l'ask
+
+RESUM_EVERY = 4096
+
+class BookSide:
+    """Un lato del book: `sign` = 1 per gli ask (prezzi crescenti), -1 per i bid (decrescenti)."""
+    __slots__ = ("sign", "n", "keys", "qty", "top")
+
+    def __init__(self, sign: int, n: int = 10):
+        self.sign = sign
+        self.n = max(1, int(n))
+        self.keys: List[float] = []
+        self.qty: Dict[float, float] = {}
+        self.top = 0.0   # somma delle quantita' dei primi n livelli
+
+    def clear(self) -> None:
+        self.keys.clear()
+        self.qty.clear()
+        self.top = 0.0
+
+    def resum(self) -> None:
+        q = self.qty
+        self.top = sum(q[k] for k in self.keys[:self.n])
+
+    def set_n(self, n: int) -> None:
+        self.n = max(1, int(n))
+        self.resum()
+
+    def set(self, price: float, qty: float) -> None:
+        """Quantita' assoluta del livello `price` (0 = livello rimosso)."""
+        k = price * self.sign
+        keys, book, n = self.keys, self.qty, self.n
+        old = book.get(k)
+        if qty <= 0.0:
+            if old is None:
+                return
+            i = bisect_left(keys, k)
+            if i < n:
+                self.top -= old
+                if len(keys) > n:   # il livello n+1 entra nel top N
+                    self.top += book[keys[n]]
+            del keys[i]
+            del book[k]
+        elif old is not None:
+            book[k] = qty
+            if len(keys) <= n or k <= keys[n - 1]:
+                self.top += qty - old
+        else:
+            i = bisect_left(keys, k)
+            if i < n:
+                self.top += qty
+                if len(keys) >= n:  # l'ultimo del top N ne esce
+                    self.top -= book[keys[n - 1]]
+            keys.insert(i, k)
+            book[k] = qty
+
+    def best(self) -> Optional[tuple]:
+        """(prezzo, quantita') del miglior livello, None se il lato e' vuoto."""
+        if not self.keys:
+            return None
+        k = self.keys[0]
+        return k * self.sign, self.qty[k]
+
+    def levels(self, n: Optional[int] = None) -> List[tuple]:
+        return [(k * self.sign, self.qty[k]) for k in self.keys[:n]]
+
+class OrderBook:
+    """
+    Book completo: reset() da snapshot, apply() per i diff (quantita' assolute, come inviate da
+    Binance/Bybit); update_id e ts_ms dell'ultimo messaggio applicato. `top_n` = livelli per lato
+    dell'imbalance.
+    """
+    def __init__(self, top_n: int = 10):
+        self.bids = BookSide(-1, top_n)
+        self.asks = BookSide(1, top_n)
+        self.update_id: Optional[int] = None
+        self.ts_ms = 0
+        self.updates = 0      # messaggi applicati dall'ultimo snapshot
+        self._since_resum = 0
+
+    @property
+    def top_n(self) -> int:
+        return self.bids.n
+
+    def set_top_n(self, n: int) -> None:
+        if int(n) != self.bids.n:
+            self.bids.set_n(n)
+            self.asks.set_n(n)
+
+    def reset(self, bids: Iterable[Sequence[Any]], asks: Iterable[Sequence[Any]],
+              update_id: Optional[int] = None, ts_ms: int = 0) -> None:
+        for side, rows in ((self.bids, bids), (self.asks, asks)):
+            side.clear()
+            q = side.qty
+            for p, v in rows:
+                v = float(v)
+                if v > 0.0:
+                    q[float(p) * side.sign] = v
+            side.keys.extend(sorted(q))
+            side.resum()
+        self.update_id, self.ts_ms = update_id, ts_ms
+        self.updates = self._since_resum = 0
+
+    def apply(self, bids: Iterable[Sequence[Any]], asks: Iterable[Sequence[Any]],
+              update_id: Optional[int] = None, ts_ms: int = 0) -> None:
+        n = 0
+        for side, rows in ((self.bids, bids), (self.asks, asks)):
+            put = side.set
+            for p, v in rows:
+                put(float(p), float(v))
+                n += 1
+        self.update_id, self.ts_ms = update_id, ts_ms
+        self.updates += 1
+        self._since_resum += n
+        if self._since_resum >= RESUM_EVERY:
+            self.bids.resum()
+            self.asks.resum()
+            self._since_resum = 0
+
+    # --- metriche (O(1)) ---
+    def imbalance(self) -> Optional[float]:
+        b, a = self.bids.top, self.asks.top
+        return (b - a) / (b + a) if b + a > 0 else None
+
+    def microprice(self) -> Optional[float]:
+        bb, ba = self.bids.best(), self.asks.best()
+        if bb is None or ba is None or bb[1] + ba[1] <= 0:
+            return None
+        return (bb[0] * ba[1] + ba[0] * bb[1]) / (bb[1] + ba[1])
+
+    def metrics(self) -> Dict[str, Any]:
+        """Mid, spread, microprice e imbalance correnti (None se il book e' vuoto o incrociato)."""
+        bb, ba = self.bids.best(), self.asks.best()
+        out: Dict[str, Any] = {"book_imbalance": None, "microprice": None, "microprice_skew": None,
+                               "mid": None, "spread": None, "top_n": self.top_n, "update_id": self.update_id,
+                               "ts_ms": self.ts_ms}
+        if bb is None or ba is None or ba[0] <= bb[0]:
+            return out
+        mid, spread = (bb[0] + ba[0]) / 2.0, ba[0] - bb[0]
+        micro = self.microprice()
+        out.update(book_imbalance=self.imbalance(), microprice=micro, mid=mid, spread=spread,
+                   microprice_skew=(micro - mid) / (spread / 2.0) if micro is not None else None)
+        return out
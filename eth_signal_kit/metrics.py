@@ -0,0 +1,190 @@
+from __future__ import annotations
+import asyncio
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional, Tuple
+
+# ----------------------------
+# Registry minimale in formato Prometheus (text exposition 0.0.4)
+# ----------------------------
+# Nessuna dipendenza esterna: contatori e istogrammi sono dict in-process,
+# l'aggiornamento costa un lookup + una somma, quindi puo' restare sempre attivo.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0)
+
+def _fmt(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{str(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, doc, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        k = self._key(labels)
+        self.values[k] = self.values.get(k, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}"
+                                for k, v in sorted(self.values.items())]
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        self.values[self._key(labels)] = float(value)
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, doc: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        super().__init__(name, doc, labelnames)
+        self.buckets = tuple(buckets)
+        # per label: [conteggi per bucket (+Inf in coda), somma, count]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        k = self._key(labels)
+        st = self.values.get(k)
+        if st is None:
+            st = self.values[k] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        st[0][bisect_left(self.buckets, value)] += 1
+        st[1] += value
+        st[2] += 1
+
+    def render(self) -> List[str]:
+        out = self.header()
+        for k, (counts, total, n) in sorted(self.values.items()):
+            acc = 0
+            for le, c in zip(self.buckets + (float("inf"),), counts):
+                acc += c
+                le_label = 'le="%s"' % _fmt(le)
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, k, le_label)} {acc}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_fmt(total)}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, k)} {n}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, m: _Metric) -> _Metric:
+        self.metrics.append(m)
+        return m
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for m in self.metrics:
+            lines.extend(m.render())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+# ----------------------------
+# Metriche del kit
+# ----------------------------
+# data_sources
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "etherpulse_http_requests_total", "Richieste HTTP ai data source per endpoint e status.", ("endpoint", "status")))
+HTTP_ERRORS = REGISTRY.register(Counter(
+    "etherpulse_http_errors_total", "Errori HTTP/rete per endpoint e tipo di eccezione.", ("endpoint", "error")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "etherpulse_http_request_seconds", "Latenza richieste HTTP (client setup + rete + parse).", ("endpoint",)))
+HTTP_RETRIES = REGISTRY.register(Counter(
+    "etherpulse_http_retries_total", "Nuovi tentativi dopo errori transitori.", ("endpoint",)))
+HTTP_HEDGES = REGISTRY.register(Counter(
+    "etherpulse_http_hedges_total", "Richieste duplicate (result=fired|won).", ("endpoint", "result")))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    "etherpulse_circuit_state", "Stato del circuit breaker (0=closed, 1=half_open, 2=open).", ("endpoint",)))
+CACHE_REQUESTS = REGISTRY.register(Counter(
+    "etherpulse_cache_requests_total", "Lookup nelle cache (cache=config|santiment|glassnode|last_known, result=hit|miss|stale).",
+    ("cache", "result")))
+WS_RECONNECTS = REGISTRY.register(Counter(
+    "etherpulse_ws_reconnects_total", "Riconnessioni degli stream WebSocket.", ("stream",)))
+BOOK_RESYNCS = REGISTRY.register(Counter(
+    "etherpulse_book_resyncs_total", "Buchi di sequenza nei book da WebSocket (nuovo snapshot).", ("stream",)))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "etherpulse_queue_depth", "Elementi in coda (stream/publisher).", ("queue",)))
+
+# scoring path
+EVALUATIONS = REGISTRY.register(Counter(
+    "etherpulse_evaluations_total", "Valutazioni completate per decisione.", ("decision",)))
+EVALUATION_LATENCY = REGISTRY.register(Histogram(
+    "etherpulse_evaluation_seconds", "Durata di una valutazione completa (fetch + score)."))
+STAGE_LATENCY = REGISTRY.register(Histogram(
+    "etherpulse_stage_seconds", "Durata dei blocchi di valutazione (funding, oi, klines, ...).", ("stage",)))
+SCORE = REGISTRY.register(Gauge(
+    "etherpulse_score", "Ultimo score per lato.", ("side",)))
+SHADOW_EVALUATIONS = REGISTRY.register(Counter(
+    "etherpulse_shadow_evaluations_total", "Valutazioni delle strategie shadow per decisione.", ("strategy", "decision")))
+SHADOW_SCORE = REGISTRY.register(Gauge(
+    "etherpulse_shadow_score", "Ultimo score per strategia shadow e lato.", ("strategy", "side")))
+
+def record_evaluation(out: Dict[str, Any], timings: Optional[Dict[str, Any]]) -> None:
+    """Aggiorna le metriche di scoring da output di pipeline.evaluate + Timings.as_dict()."""
+    EVALUATIONS.inc(decision=out.get("decision", ""))
+    score = out.get("score") or {}
+    for side in ("bear", "bull"):
+        if side in score:
+            SCORE.set(score[side], side=side)
+    for name, sh in (out.get("shadows") or {}).items():
+        SHADOW_EVALUATIONS.inc(strategy=name, decision=sh.get("decision", ""))
+        for side, v in (sh.get("score") or {}).items():
+            SHADOW_SCORE.set(v, strategy=name, side=side)
+    if timings:
+        EVALUATION_LATENCY.observe(timings["total_ms"] / 1000.0)
+        for name, st in timings["stages"].items():
+            STAGE_LATENCY.observe(st["total_ms"] / 1000.0, stage=name)
+
+# ----------------------------
+# Endpoint HTTP /metrics (sul loop asyncio esistente)
+# ----------------------------
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, registry: Registry):
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+        parts = head.split(b" ", 2)
+        path = parts[1].split(b"?", 1)[0] if len(parts) > 1 else b""
+        if parts[0] == b"GET" and path == b"/metrics":
+            body, status = registry.render().encode(), b"200 OK"
+            ctype = b"text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body, status, ctype = b"not found\n", b"404 Not Found", b"text/plain"
+        writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: " + ctype +
+                     b"\r\nContent-Length: " + str(len(body)).encode() +
+                     b"\r\nConnection: close\r\n\r\n" + body)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host: str = "127.0.0.1", port: int = 9108, registry: Registry = REGISTRY) -> asyncio.AbstractServer:
+    """Avvia l'endpoint /metrics come task del loop corrente e ritorna il server."""
+    return await asyncio.start_server(lambda r, w: _handle(r, w, registry), host, port)
@@ -0,0 +1,607 @@
+from __future__ import annotations
+import argparse, asyncio, json, math, random, re, time
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+# ----------------------------
+# Mock locale di Binance Futures (fapi) e Bybit V5 per test offline, CI e load test
+# ----------------------------
+# REST: stesso formato dell'API reale, payload sintetici deterministici (seed) oppure
+# registrati (--replay). Un'unica porta serve entrambi gli exchange:
+#   BINANCE_FAPI_BASE=http://127.0.0.1:<porta>  BYBIT_BASE=http://127.0.0.1:<porta>
+# WS (porta separata, richiede `websockets`): /ws/<stream>, /stream?streams=a/b (Binance),
+# /v5/public/linear con {"op":"subscribe"} (Bybit).
+# Book sintetico a tick di 100ms: snapshot REST (/fapi/v1/depth) e diff WS (<sym>@depth, Bybit
+# orderbook.N) coerenti tra loro (quantita' assolute, 0 per i livelli usciti), id di sequenza
+# (U/u/pu Binance, u Bybit) continui per connessione.
+# Fault injection: latenza + jitter, errori 5xx, timeout, connessioni droppate, messaggi WS
+# saltati (buchi di sequenza), rate limit con gli header reali (X-MBX-USED-WEIGHT-1M, X-Bapi-Limit-*).
+# Statistiche in JSON su GET /__mock/stats.
+
+_INTERVAL_MS = {"1m": 60_000, "3m": 180_000, "5m": 300_000, "15m": 900_000, "30m": 1_800_000,
+                "1h": 3_600_000, "2h": 7_200_000, "4h": 14_400_000, "6h": 21_600_000,
+                "12h": 43_200_000, "1d": 86_400_000, "1w": 604_800_000}
+
+# intervalli Bybit (kline e open-interest) -> intervallo Binance equivalente
+_BYBIT_KLINE = {"1": "1m", "3": "3m", "5": "5m", "15": "15m", "30": "30m", "60": "1h", "120": "2h",
+                "240": "4h", "360": "6h", "720": "12h", "D": "1d", "W": "1w"}
+BOOK_TICK_MS = 100     # il book sintetico cambia ogni 100ms (id di sequenza = now_ms // 100)
+BOOK_DIFF_DEPTH = 50   # livelli per lato del diff stream e massimo dello snapshot REST
+
+_BYBIT_OI = {"5min": 300_000, "15min": 900_000, "30min": 1_800_000, "1h": 3_600_000,
+             "4h": 14_400_000, "1d": 86_400_000}
+
+class SyntheticMarket:
+    """Random walk deterministico: stessa (interval, open_time) -> stessa barra."""
+    def __init__(self, seed: int = 7, price: float = 3000.0):
+        self.seed = seed
+        self.price = price
+
+    def _rng(self, *key) -> random.Random:
+        # seed stringa: deterministico anche tra processi (hash() di str e' randomizzato)
+        return random.Random(":".join(map(str, (self.seed,) + key)))
+
+    def kline(self, interval: str, t: int) -> List[Any]:
+        step = _INTERVAL_MS.get(interval, 60_000)
+        r = self._rng("k", interval, t)
+        scale = math.sqrt(step / 60_000)
+        o = self.price * (1 + 0.02 * math.sin(t / 8.64e7))
+        c = o * (1 + r.gauss(0, 0.001 * scale))
+        h = max(o, c) * (1 + abs(r.gauss(0, 0.0005 * scale)))
+        l = min(o, c) * (1 - abs(r.gauss(0, 0.0005 * scale)))
+        v = r.uniform(50, 150) * step / 60_000
+        tb = v * r.uniform(0.3, 0.7)
+        return [t, f"{o:.2f}", f"{h:.2f}", f"{l:.2f}", f"{c:.2f}", f"{v:.3f}", t + step - 1,
+                f"{v * c:.2f}", int(v), f"{tb:.3f}", f"{tb * c:.2f}", "0"]
+
+    def klines(self, interval: str, limit: int, now_ms: int) -> List[List[Any]]:
+        step = _INTERVAL_MS.get(interval, 60_000)
+        last = now_ms - now_ms % step
+        return [self.kline(interval, last - (limit - 1 - i) * step) for i in range(limit)]
+
+    def mid(self, now_ms: int) -> float:
+        """Prezzo continuo: open della barra 1m corrente + rumore deterministico per 100ms."""
+        o = float(self.kline("1m", now_ms - now_ms % 60_000)[1])
+        return o * (1 + self._rng("m", now_ms // 100).gauss(0, 0.0002))
+
+    def book(self, now_ms: int, depth: int, tick: float = 0.01) -> Tuple[List[List[str]], List[List[str]]]:
+        mid = self.mid(now_ms)
+        r = self._rng("b", now_ms // 100)
+        best_bid = math.floor(mid / tick) * tick
+        bids = [[f"{best_bid - i * tick:.2f}", f"{r.expovariate(0.5):.3f}"] for i in range(depth)]
+        asks = [[f"{best_bid + (i + 1) * tick:.2f}", f"{r.expovariate(0.5):.3f}"] for i in range(depth)]
+        return bids, asks
+
+    def book_diff(self, t0: int, t1: int, depth: int) -> Tuple[List[List[str]], List[List[str]]]:
+        """
+        Aggiornamento dal tick t0 al tick t1 (id = ms // BOOK_TICK_MS): livelli del book a t1 con
+        quantita' assoluta + quantita' "0" per ogni livello presente in un tick intermedio e uscito
+        (anche uno snapshot preso a meta' resta coerente dopo il primo diff).
+        """
+        bids, asks = self.book(t1 * BOOK_TICK_MS, depth)
+        seen_b, seen_a = {p for p, _ in bids}, {p for p, _ in asks}
+        gone_b, gone_a = set(), set()
+        for t in range(max(t0, t1 - 100), t1):
+            b, a = self.book(t * BOOK_TICK_MS, depth)
+            gone_b.update(p for p, _ in b if p not in seen_b)
+            gone_a.update(p for p, _ in a if p not in seen_a)
+        return (bids + [[p, "0"] for p in sorted(gone_b, key=float, reverse=True)],
+                asks + [[p, "0"] for p in sorted(gone_a, key=float)])
+
+    def trade(self, now_ms: int, i: int) -> Tuple[float, float, bool]:
+        """(prezzo, quantita', buyer_is_maker) dell'i-esimo trade sintetico."""
+        r = self._rng("t", i)
+        return self.mid(now_ms), r.expovariate(2.0), r.random() < 0.5
+
+# ----------------------------
+# Route REST
+# ----------------------------
+def _binance_weight(path: str, q: Dict[str, str]) -> int:
+    """Peso IP degli endpoint (documentazione Binance; 1 dove non specificato)."""
+    if path == "/fapi/v1/klines":
+        limit = int(q.get("limit", 500))
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    if path == "/fapi/v1/allForceOrders":
+        return 20 if "symbol" in q else 50
+    if path == "/fapi/v1/depth":
+        limit = int(q.get("limit", 500))
+        return 2 if limit <= 50 else 5 if limit <= 100 else 10 if limit <= 500 else 20
+    return 1
+
+def binance_route(market: SyntheticMarket, path: str, q: Dict[str, str], now_ms: int) -> Optional[Any]:
+    """Payload per un endpoint fapi (None = 404)."""
+    symbol = q.get("symbol", "ETHUSDT")
+    limit = int(q.get("limit", 100))
+    if path == "/fapi/v1/klines":
+        return market.klines(q.get("interval", "1m"), min(limit, 1500), now_ms)
+    if path == "/fapi/v1/fundingRate":
+        return [{"symbol": symbol, "fundingTime": now_ms - now_ms % 28_800_000 - i * 28_800_000,
+                 "fundingRate": f"{0.0001 * math.sin(i):.8f}"} for i in reversed(range(min(limit, 1000)))]
+    if path == "/fapi/v1/fundingInfo":
+        return [{"symbol": symbol, "adjustedFundingRateCap": "0.02000000", "adjustedFundingRateFloor": "-0.02000000",
+                 "fundingIntervalHours": 8, "disclaimer": False}]
+    if path == "/fapi/v1/depth":
+        tick = now_ms // BOOK_TICK_MS
+        bids, asks = market.book(tick * BOOK_TICK_MS, min(int(q.get("limit", 500)), BOOK_DIFF_DEPTH))
+        return {"lastUpdateId": tick, "E": now_ms, "T": now_ms, "bids": bids, "asks": asks}
+    if path == "/fapi/v1/openInterest":
+        return {"symbol": symbol, "openInterest": "1000000.000", "time": now_ms}
+    if path == "/futures/data/openInterestHist":
+        base = now_ms - now_ms % 3_600_000
+        return [{"symbol": symbol, "sumOpenInterest": f"{1e6 * (1 + 0.05 * math.sin(i / 20)):.3f}",
+                 "sumOpenInterestValue": "0", "timestamp": base - (limit - 1 - i) * 3_600_000}
+                for i in range(min(limit, 500))]
+    if path == "/fapi/v1/allForceOrders":
+        return [{"symbol": symbol, "price": "3000", "avgPrice": "3000", "origQty": "1.5", "executedQty": "1.5",
+                 "side": "SELL" if i % 2 else "BUY", "time": now_ms - i * 1000} for i in reversed(range(min(limit, 50)))]
+    if path.startswith("/futures/data/topLongShort"):
+        base = now_ms - now_ms % 14_400_000
+        return [{"symbol": symbol, "longShortRatio": f"{1 + 0.2 * math.sin(i / 10):.4f}",
+                 "timestamp": base - (limit - 1 - i) * 14_400_000} for i in range(min(limit, 500))]
+    return None
+
+def bybit_route(market: SyntheticMarket, path: str, q: Dict[str, str], now_ms: int) -> Optional[Any]:
+    """Payload per un endpoint /v5/market (None = 404). Le liste V5 sono in ordine decrescente."""
+    symbol = q.get("symbol", "ETHUSDT")
+    category = q.get("category", "linear")
+
+    def envelope(lst: List[Any], **extra) -> Dict[str, Any]:
+        return {"retCode": 0, "retMsg": "OK", "result": {"category": category, "symbol": symbol, "list": lst, **extra},
+                "retExtInfo": {}, "time": now_ms}
+
+    if path == "/v5/market/kline":
+        bars = market.klines(_BYBIT_KLINE.get(q.get("interval", "1"), "1m"), min(int(q.get("limit", 200)), 1000), now_ms)
+        return envelope([[str(b[0]), b[1], b[2], b[3], b[4], b[5], b[7]] for b in reversed(bars)])
+    if path == "/v5/market/open-interest":
+        step = _BYBIT_OI.get(q.get("intervalTime", "1h"), 3_600_000)
+        base = now_ms - now_ms % step
+        n = min(int(q.get("limit", 50)), 200)
+        return envelope([{"openInterest": f"{1e6 * (1 + 0.05 * math.sin((base - i * step) / 7.2e7)):.3f}",
+                          "timestamp": str(base - i * step)} for i in range(n)], nextPageCursor="")
+    if path == "/v5/market/recent-trade":
+        n = min(int(q.get("limit", 500)), 1000)
+        out = []
+        for i in range(n):
+            t = now_ms - i * 250
+            p, qty, m = market.trade(t, t // 250)
+            out.append({"execId": str(t // 250), "symbol": symbol, "price": f"{p:.2f}", "size": f"{qty:.3f}",
+                        "side": "Sell" if m else "Buy", "time": str(t), "isBlockTrade": False})
+        return envelope(out)
+    if path == "/v5/market/history-fund-rate":
+        base = now_ms - now_ms % 28_800_000
+        n = min(int(q.get("limit", 200)), 200)
+        return envelope([{"symbol": symbol, "fundingRate": f"{0.0001 * math.sin(i):.8f}",
+                          "fundingRateTimestamp": str(base - i * 28_800_000)} for i in range(n)])
+    return None
+
+def venue_of(path: str) -> Optional[str]:
+    if path.startswith(("/fapi/", "/futures/data/")):
+        return "binance"
+    if path.startswith("/v5/"):
+        return "bybit"
+    return None
+
+UPSTREAMS = {"binance": "https://fapi.binance.com", "bybit": "https://api.bybit.com"}
+
+# ----------------------------
+# Payload registrati
+# ----------------------------
+class Recording:
+    """
+    File NDJSON di payload reali, una riga per risposta o messaggio:
+      {"venue": "binance", "path": "/fapi/v1/klines", "query": {...}, "status": 200, "body": ...}
+      {"venue": "binance", "stream": "ethusdt@aggTrade", "data": {...}}
+    Per ogni path si preferiscono le registrazioni con query compatibile (symbol, interval, ...);
+    piu' registrazioni per la stessa chiave vengono servite a rotazione (replay di sequenze).
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.rest: Dict[str, List[Dict[str, Any]]] = {}
+        self.ws: Dict[str, List[Any]] = {}
+        self._cursor: Dict[Any, int] = {}
+        if path:
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        self.add(json.loads(line))
+
+    def add(self, rec: Dict[str, Any]):
+        if "stream" in rec:
+            self.ws.setdefault(rec["stream"], []).append(rec["data"])
+        else:
+            self.rest.setdefault(rec["path"], []).append(rec)
+
+    def _next(self, key, items: List[Any]) -> Any:
+        i = self._cursor.get(key, 0)
+        self._cursor[key] = i + 1
+        return items[i % len(items)]
+
+    def lookup(self, path: str, q: Dict[str, str]) -> Optional[Tuple[int, Any]]:
+        recs = self.rest.get(path)
+        if not recs:
+            return None
+        keys = ("symbol", "interval", "period", "intervalTime", "category")
+        match = [r for r in recs if all(r.get("query", {}).get(k, q.get(k)) == q.get(k) for k in keys)]
+        rec = self._next((path, tuple(q.get(k) for k in keys)), match or recs)
+        return rec.get("status", 200), rec["body"]
+
+    def stream(self, name: str) -> Optional[Any]:
+        items = self.ws.get(name)
+        return self._next(("ws", name), items) if items else None
+
+# ----------------------------
+# Fault injection / rate limit
+# ----------------------------
+@dataclass
+class MockConfig:
+    latency_ms: float = 0.0          # latenza media aggiunta a ogni risposta REST
+    jitter_ms: float = 0.0           # deviazione standard (gaussiana, troncata a 0)
+    error_rate: float = 0.0          # probabilita' di una risposta 5xx
+    error_statuses: Tuple[int, ...] = (500, 502, 503, 504)
+    timeout_rate: float = 0.0        # probabilita' di non rispondere per hang_s secondi
+    hang_s: float = 30.0
+    drop_rate: float = 0.0           # probabilita' di chiudere la connessione senza risposta
+    fault_paths: str = ""            # regex: fault solo sui path che matchano (vuoto = tutti)
+    binance_weight_limit: int = 2400 # peso IP per minuto (0 = illimitato), poi 429 + Retry-After
+    bybit_limit: int = 600           # richieste IP per finestra di 5s (0 = illimitato), poi 403
+    ws_rate: float = 10.0            # messaggi/s per stream WS
+    ws_drop_after_s: float = 0.0     # chiude ogni connessione WS dopo N secondi (test riconnessioni)
+    ws_gap_rate: float = 0.0         # probabilita' di saltare un messaggio WS (test recovery dei book)
+    synthetic_fallback: bool = True  # in replay: path non registrati -> payload sintetico
+
+class _Window:
+    """Contatore a finestra fissa (come i limiti IP degli exchange)."""
+    def __init__(self, size_ms: int):
+        self.size_ms = size_ms
+        self.start = 0
+        self.used = 0
+
+    def add(self, n: int, now_ms: int) -> int:
+        start = now_ms - now_ms % self.size_ms
+        if start != self.start:
+            self.start, self.used = start, 0
+        self.used += n
+        return self.used
+
+    def reset_ms(self) -> int:
+        return self.start + self.size_ms
+
+# ----------------------------
+# Server HTTP (asyncio)
+# ----------------------------
+_REASONS = {200: "OK", 403: "Forbidden", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error",
+            502: "Bad Gateway", 503: "Service Unavailable", 504: "Gateway Timeout"}
+
+class MockExchange:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, seed: int = 7,
+                 config: Optional[MockConfig] = None, recording: Optional[Recording] = None,
+                 ws_port: Optional[int] = None, record_to: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.ws_port = ws_port        # None = WS disattivato, 0 = porta libera
+        self.market = SyntheticMarket(seed)
+        self.config = config or MockConfig()
+        self.recording = recording or Recording()
+        self.record_to = record_to    # modalita' proxy: inoltra agli exchange reali e registra
+        self.rng = random.Random(f"faults:{seed}")
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.ws_server = None
+        self.requests = 0
+        self.stats: Dict[str, Dict[str, int]] = {}
+        self.ws_stats = {"connections": 0, "active": 0, "messages": 0, "dropped": 0, "gaps": 0}
+        self._binance_weight = _Window(60_000)
+        self._bybit_window = _Window(5_000)
+        self._fault_re = re.compile(self.config.fault_paths) if self.config.fault_paths else None
+        self._upstream = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.ws_port}"
+
+    async def start(self) -> "MockExchange":
+        self.server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        if self.ws_port is not None:
+            try:
+                import websockets
+            except ImportError as e:
+                raise RuntimeError("il mock WS richiede il pacchetto 'websockets'") from e
+            self.ws_server = await websockets.serve(self._ws_handle, self.host, self.ws_port)
+            self.ws_port = next(iter(self.ws_server.sockets)).getsockname()[1]
+        if self.record_to:
+            import httpx
+            self._upstream = httpx.AsyncClient(timeout=15)
+        return self
+
+    async def close(self):
+        for srv in (self.server, self.ws_server):
+            if srv is not None:
+                srv.close()
+                await srv.wait_closed()
+        if self._upstream is not None:
+            await self._upstream.aclose()
+
+    def _count(self, path: str, status: Any):
+        st = self.stats.setdefault(path, {})
+        st[str(status)] = st.get(str(status), 0) + 1
+
+    def _rate_limit(self, venue: str, path: str, q: Dict[str, str], now_ms: int
+                    ) -> Tuple[Optional[Tuple[int, Any]], Dict[str, str]]:
+        """Ritorna (risposta di rifiuto o None, header di rate limit)."""
+        cfg = self.config
+        if venue == "binance":
+            used = self._binance_weight.add(_binance_weight(path, q), now_ms)
+            headers = {"X-MBX-USED-WEIGHT-1M": str(used)}
+            if cfg.binance_weight_limit and used > cfg.binance_weight_limit:
+                headers["Retry-After"] = str(max(1, math.ceil((self._binance_weight.reset_ms() - now_ms) / 1000)))
+                return (429, {"code": -1003, "msg": "Too many requests; current limit of IP is "
+                                                    f"{cfg.binance_weight_limit} requests per minute."}), headers
+            return None, headers
+        used = self._bybit_window.add(1, now_ms)
+        limit = cfg.bybit_limit or 10**9
+        headers = {"X-Bapi-Limit": str(limit), "X-Bapi-Limit-Status": str(max(0, limit - used)),
+                   "X-Bapi-Limit-Reset-Timestamp": str(self._bybit_window.reset_ms())}
+        if cfg.bybit_limit and used > cfg.bybit_limit:
+            return (403, {"retCode": 10006, "retMsg": "Too many visits!"}), headers
+        return None, headers
+
+    async def _proxy(self, venue: str, method: str, path: str, q: Dict[str, str]) -> Tuple[int, Any]:
+        r = await self._upstream.request(method, UPSTREAMS[venue] + path, params=q)
+        try:
+            body = r.json()
+        except ValueError:
+            body = r.text
+        with open(self.record_to, "a") as f:
+            f.write(json.dumps({"venue": venue, "path": path, "query": q, "status": r.status_code, "body": body}) + "\n")
+        return r.status_code, body
+
+    async def route(self, method: str, target: str) -> Tuple[int, Any, Dict[str, str]]:
+        """(status, body, header extra) per una richiesta; None come status = drop della connessione."""
+        u = urlsplit(target)
+        path, q = u.path, dict(parse_qsl(u.query))
+        now_ms = int(time.time() * 1000)
+        if path == "/__mock/stats":
+            return 200, {"requests": self.requests, "paths": self.stats, "ws": self.ws_stats}, {}
+        venue = venue_of(path)
+        if venue is None:
+            return 404, {"code": -1, "msg": "not found"}, {}
+
+        cfg = self.config
+        if cfg.latency_ms or cfg.jitter_ms:
+            await asyncio.sleep(max(0.0, self.rng.gauss(cfg.latency_ms, cfg.jitter_ms)) / 1000.0)
+        if self._fault_re is None or self._fault_re.search(path):
+            x = self.rng.random()
+            if x < cfg.drop_rate:
+                return None, None, {}
+            x -= cfg.drop_rate
+            if x < cfg.timeout_rate:
+                await asyncio.sleep(cfg.hang_s)
+            elif x - cfg.timeout_rate < cfg.error_rate:
+                status = self.rng.choice(cfg.error_statuses)
+                body = ({"code": -1001, "msg": "Internal error; unable to process your request. Please try again."}
+                        if venue == "binance" else {"retCode": 10016, "retMsg": "Internal system error."})
+                return status, body, {}
+
+        reject, headers = self._rate_limit(venue, path, q, now_ms)
+        if reject is not None:
+            return reject[0], reject[1], headers
+        if self._upstream is not None:
+            status, body = await self._proxy(venue, method, path, q)
+            return status, body, headers
+        hit = self.recording.lookup(path, q)
+        if hit is None and cfg.synthetic_fallback:
+            data = (binance_route if venue == "binance" else bybit_route)(self.market, path, q, now_ms)
+            hit = None if data is None else (200, data)
+        if hit is None:
+            return 404, {"code": -1, "msg": "not found"}, headers
+        return hit[0], hit[1], headers
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:  # keep-alive
+                head = await reader.readuntil(b"\r\n\r\n")
+                method, target, _ = head.split(b"\r\n", 1)[0].decode().split(" ", 2)
+                self.requests += 1
+                status, data, headers = await self.route(method, target)
+                self._count(urlsplit(target).path, status if status is not None else "drop")
+                if status is None:
+                    break
+                body = json.dumps(data).encode()
+                extra = "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+                writer.write(f"HTTP/1.1 {status} {_REASONS.get(status, 'ERR')}\r\n"
+                             f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n{extra}\r\n".encode()
+                             + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # ----------------------------
+    # WebSocket
+    # ----------------------------
+    def _binance_event(self, stream: str, now_ms: int, n: int, state: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        rec = self.recording.stream(stream)
+        if rec is not None:
+            return rec
+        sym, _, kind = stream.partition("@")
+        s = sym.upper()
+        if kind == "aggTrade":
+            p, qty, m = self.market.trade(now_ms, n)
+            return {"e": "aggTrade", "E": now_ms, "s": s, "a": n, "p": f"{p:.2f}", "q": f"{qty:.3f}",
+                    "f": n, "l": n, "T": now_ms, "m": m}
+        if kind.startswith("depth"):
+            # <sym>@depth<N>: top N (partial); <sym>@depth: diff del book dall'ultimo tick inviato
+            tick = now_ms // BOOK_TICK_MS
+            last = state.get(stream, tick - 1)
+            if tick <= last:
+                return None
+            state[stream] = tick
+            levels = re.match(r"depth(\d*)", kind).group(1)
+            if levels:
+                bids, asks = self.market.book(tick * BOOK_TICK_MS, int(levels))
+            else:
+                bids, asks = self.market.book_diff(last, tick, BOOK_DIFF_DEPTH)
+            return {"e": "depthUpdate", "E": now_ms, "T": now_ms, "s": s, "U": last + 1, "u": tick,
+                    "pu": last, "b": bids, "a": asks}
+        if kind.startswith("kline_"):
+            iv = kind[len("kline_"):]
+            k = self.market.kline(iv, now_ms - now_ms % _INTERVAL_MS.get(iv, 60_000))
+            return {"e": "kline", "E": now_ms, "s": s,
+                    "k": {"t": k[0], "T": k[6], "s": s, "i": iv, "o": k[1], "c": f"{self.market.mid(now_ms):.2f}",
+                          "h": k[2], "l": k[3], "v": k[5], "n": k[8], "x": False, "q": k[7], "V": k[9], "Q": k[10]}}
+        if kind.startswith("markPrice"):
+            return {"e": "markPriceUpdate", "E": now_ms, "s": s, "p": f"{self.market.mid(now_ms):.2f}",
+                    "r": "0.00010000", "T": now_ms - now_ms % 28_800_000 + 28_800_000}
+        return None
+
+    def _bybit_event(self, topic: str, now_ms: int, n: int, state: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        rec = self.recording.stream(topic)
+        if rec is not None:
+            return rec
+        parts = topic.split(".")
+        s = parts[-1]
+        if parts[0] == "publicTrade":
+            p, qty, m = self.market.trade(now_ms, n)
+            return {"topic": topic, "type": "snapshot", "ts": now_ms,
+                    "data": [{"T": now_ms, "s": s, "S": "Sell" if m else "Buy", "v": f"{qty:.3f}",
+                              "p": f"{p:.2f}", "L": "ZeroPlusTick", "i": str(n), "BT": False}]}
+        if parts[0] == "orderbook":
+            # snapshot al primo messaggio dopo la subscribe, poi delta; u = numero del messaggio
+            tick = now_ms // BOOK_TICK_MS
+            last = state.get(topic)
+            if last is not None and tick <= last:
+                return None
+            state[topic] = tick
+            depth = int(parts[1])
+            if last is None:
+                bids, asks = self.market.book(tick * BOOK_TICK_MS, depth)
+            else:
+                bids, asks = self.market.book_diff(last, tick, depth)
+            state[topic + "#u"] = u = state.get(topic + "#u", 0) + 1
+            return {"topic": topic, "type": "snapshot" if last is None else "delta", "ts": now_ms,
+                    "data": {"s": s, "b": bids, "a": asks, "u": u, "seq": tick}, "cts": now_ms}
+        if parts[0] == "kline":
+            iv = _BYBIT_KLINE.get(parts[1], "1m")
+            k = self.market.kline(iv, now_ms - now_ms % _INTERVAL_MS.get(iv, 60_000))
+            return {"topic": topic, "type": "snapshot", "ts": now_ms,
+                    "data": [{"start": k[0], "end": k[6], "interval": parts[1], "open": k[1],
+                              "close": f"{self.market.mid(now_ms):.2f}", "high": k[2], "low": k[3],
+                              "volume": k[5], "turnover": k[7], "confirm": False, "timestamp": now_ms}]}
+        return None
+
+    async def _ws_handle(self, ws):
+        # websockets >= 13: ws.request.path; API legacy: ws.path
+        req = getattr(ws, "request", None)
+        u = urlsplit(req.path if req is not None else ws.path)
+        if u.path.startswith("/ws/"):
+            venue, streams, combined = "binance", set(u.path[len("/ws/"):].split("/")) - {""}, False
+        elif u.path == "/stream":
+            venue, streams, combined = "binance", set(dict(parse_qsl(u.query)).get("streams", "").split("/")) - {""}, True
+        elif u.path.startswith("/v5/public/"):
+            venue, streams, combined = "bybit", set(), False
+        else:
+            await ws.close(1008, "unknown path")
+            return
+        self.ws_stats["connections"] += 1
+        self.ws_stats["active"] += 1
+        conn_id = f"mock-{self.ws_stats['connections']}"
+        counters: Dict[str, int] = {}
+        state: Dict[str, int] = {}   # stato dei book per stream (ultimo tick, id di sequenza)
+
+        async def reader():
+            async for raw in ws:
+                try:
+                    msg = json.loads(raw)
+                except ValueError:
+                    continue
+                if venue == "binance" and msg.get("method") in ("SUBSCRIBE", "UNSUBSCRIBE"):
+                    (streams.update if msg["method"] == "SUBSCRIBE" else streams.difference_update)(msg.get("params", []))
+                    await ws.send(json.dumps({"result": None, "id": msg.get("id")}))
+                elif venue == "bybit" and msg.get("op") in ("subscribe", "unsubscribe"):
+                    for topic in msg.get("args", []):  # nuova subscribe -> nuovo snapshot
+                        for k in (topic, topic + "#u"):
+                            state.pop(k, None)
+                    (streams.update if msg["op"] == "subscribe" else streams.difference_update)(msg.get("args", []))
+                    await ws.send(json.dumps({"success": True, "ret_msg": "", "conn_id": conn_id,
+                                              "req_id": msg.get("req_id", ""), "op": msg["op"]}))
+                elif venue == "bybit" and msg.get("op") == "ping":
+                    await ws.send(json.dumps({"success": True, "ret_msg": "pong", "conn_id": conn_id,
+                                              "req_id": msg.get("req_id", ""), "op": "ping"}))
+
+        async def writer():
+            t_end = time.monotonic() + self.config.ws_drop_after_s if self.config.ws_drop_after_s else None
+            period = 1.0 / self.config.ws_rate if self.config.ws_rate > 0 else 1.0
+            while t_end is None or time.monotonic() < t_end:
+                await asyncio.sleep(period)
+                now_ms = int(time.time() * 1000)
+                for name in list(streams):
+                    n = counters.get(name, 0)
+                    counters[name] = n + 1
+                    ev = (self._binance_event if venue == "binance" else self._bybit_event)(name, now_ms, n, state)
+                    if ev is None:
+                        continue
+                    if self.config.ws_gap_rate and self.rng.random() < self.config.ws_gap_rate:
+                        self.ws_stats["gaps"] += 1
+                        continue
+                    await ws.send(json.dumps({"stream": name, "data": ev} if combined else ev))
+                    self.ws_stats["messages"] += 1
+            self.ws_stats["dropped"] += 1
+            await ws.close(1001, "mock drop")
+
+        tasks = [asyncio.ensure_future(reader()), asyncio.ensure_future(writer())]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        except Exception:
+            pass
+        finally:
+            for t in tasks:
+                t.cancel()
+            self.ws_stats["active"] -= 1
+
+async def _serve(args):
+    cfg = MockConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                     timeout_rate=args.timeout_rate, hang_s=args.hang_s, drop_rate=args.drop_rate,
+                     fault_paths=args.fault_paths, binance_weight_limit=args.binance_weight_limit,
+                     bybit_limit=args.bybit_limit, ws_rate=args.ws_rate, ws_drop_after_s=args.ws_drop_after_s,
+                     ws_gap_rate=args.ws_gap_rate,
+                     synthetic_fallback=args.synthetic_fallback)
+    mx = await MockExchange(args.host, args.port, args.seed, cfg, Recording(args.replay),
+                            ws_port=args.ws_port if args.ws_port >= 0 else None, record_to=args.record).start()
+    print(f"mock exchange on {mx.base_url}  (BINANCE_FAPI_BASE={mx.base_url} BYBIT_BASE={mx.base_url})", flush=True)
+    if mx.ws_server is not None:
+        print(f"mock WS on {mx.ws_url}  (Binance: /ws/<stream>, /stream?streams=..; Bybit: /v5/public/linear)", flush=True)
+    if args.record:
+        print(f"proxy mode: forwarding to {UPSTREAMS} and recording to {args.record}", flush=True)
+    await asyncio.Event().wait()
+
+def main():
+    d = MockConfig()
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=18080)
+    ap.add_argument("--ws-port", type=int, default=18081, help="-1 = WS disattivato")
+    ap.add_argument("--seed", type=int, default=7)
+    ap.add_argument("--replay", default=None, help="NDJSON di payload registrati (vedi Recording)")
+    ap.add_argument("--record", default=None, help="modalita' proxy: inoltra agli exchange reali e registra qui")
+    ap.add_argument("--synthetic-fallback", type=lambda x: x.lower()=="true", default=d.synthetic_fallback)
+    ap.add_argument("--latency-ms", type=float, default=d.latency_ms)
+    ap.add_argument("--jitter-ms", type=float, default=d.jitter_ms)
+    ap.add_argument("--error-rate", type=float, default=d.error_rate)
+    ap.add_argument("--timeout-rate", type=float, default=d.timeout_rate)
+    ap.add_argument("--hang-s", type=float, default=d.hang_s)
+    ap.add_argument("--drop-rate", type=float, default=d.drop_rate)
+    ap.add_argument("--fault-paths", default=d.fault_paths, help="regex dei path soggetti a fault injection")
+    ap.add_argument("--binance-weight-limit", type=int, default=d.binance_weight_limit)
+    ap.add_argument("--bybit-limit", type=int, default=d.bybit_limit)
+    ap.add_argument("--ws-rate", type=float, default=d.ws_rate)
+    ap.add_argument("--ws-drop-after-s", type=float, default=d.ws_drop_after_s)
+    ap.add_argument("--ws-gap-rate", type=float, default=d.ws_gap_rate)
+    asyncio.run(_serve(ap.parse_args()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+from __future__ import annotations
+import asyncio, os, sys, time
+from typing import Dict, Any, Optional, TYPE_CHECKING
+import httpx  # per gestire eventuali HTTPStatusError
+
+if TYPE_CHECKING:  # solo annotazioni (args da cli.main)
+    import argparse
+
+from .data_sources import binance as bapi
+from .engine import SignalInputs, model_for, WHALES_RATIO_PERIOD, WHALES_RATIO_POINTS
+from . import timing
+from .indicators import breakout
+
+# ----------------------------
+# Pipeline di valutazione (fetch input -> scoring)
+# ----------------------------
+# Caricata da cli.main solo quando serve valutare (non per --help). Binance e' sempre
+# importato (fallback whales); Bybit, Santiment, Glassnode, order book e la modalita' aggregate
+# solo se richiesti da --exchange / --with-whales / --with-onchain / --with-depth. Niente
+# numpy/pandas sul percorso live.
+
+def log(msg: str):
+    print(f"[eth-signal-kit] {msg}", file=sys.stderr, flush=True)
+
+# ----------------------------
+# Pivot helpers (dynamic)
+# ----------------------------
+async def compute_floor_pivots_binance(symbol: str, api=bapi):
+    """Floor Trader Pivots usando la daily precedente su Binance."""
+    kl = await api.get_klines(symbol, interval="1d", limit=2)
+    if not kl or len(kl) < 2:
+        return None
+    prev = kl[-2]  # [ts, open, high, low, close, vol, ...]
+    H = float(prev[2]); L = float(prev[3]); C = float(prev[4])
+    P  = (H + L + C) / 3.0
+    R1 = 2*P - L
+    S1 = 2*P - H
+    R2 = P + (H - L)
+    S2 = P - (H - L)
+    return {"P": P, "R1": R1, "S1": S1, "R2": R2, "S2": S2}
+
+async def compute_floor_pivots_bybit(symbol: str):
+    """Floor Trader Pivots usando la daily precedente su Bybit."""
+    from .data_sources import bybit as byapi
+    kl = await byapi.get_klines(symbol, interval="1d", category="linear", limit=2)
+    if not kl or len(kl) < 2:
+        return None
+    prev = kl[-2]  # [start, open, high, low, close, volume, turnover]
+    H = float(prev[2]); L = float(prev[3]); C = float(prev[4])
+    P  = (H + L + C) / 3.0
+    R1 = 2*P - L
+    S1 = 2*P - H
+    R2 = P + (H - L)
+    S2 = P - (H - L)
+    return {"P": P, "R1": R1, "S1": S1, "R2": R2, "S2": S2}
+
+async def compute_donchian_pivots_binance(symbol: str, window: int = 55, interval: str = "1h", api=bapi):
+    """Donchian (max/min rolling) su Binance."""
+    kl = await api.get_klines(symbol, interval=interval, limit=max(window, 60))
+    if not kl:
+        return None
+    highs = [float(k[2]) for k in kl[-window:]]
+    lows  = [float(k[3]) for k in kl[-window:]]
+    hi, lo = max(highs), min(lows)
+    mid = (hi + lo) / 2.0
+    return {"P": mid, "Hn": hi, "Ln": lo}
+
+async def compute_donchian_pivots_bybit(symbol: str, window: int = 55, interval: str = "1h"):
+    """Donchian (max/min rolling) su Bybit."""
+    from .data_sources import bybit as byapi
+    kl = await byapi.get_klines(symbol, interval=interval, category="linear", limit=max(window, 60))
+    if not kl:
+        return None
+    highs = [float(k[2]) for k in kl[-window:]]
+    lows  = [float(k[3]) for k in kl[-window:]]
+    hi, lo = max(highs), min(lows)
+    mid = (hi + lo) / 2.0
+    return {"P": mid, "Hn": hi, "Ln": lo}
+
+async def evaluate(args: argparse.Namespace, cfg: Dict[str, Any], api=bapi, clock=time.time,
+                   shadows: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Una valutazione completa: fetch input, scoring (ScoringModel compilato dal config), dict di output.
+    `api`/`clock` sostituiscono il modulo Binance e l'orologio (replay storico, vedi backtest/parity.py).
+    `shadows` (etichetta -> config): strategie A/B valutate sugli stessi SignalInputs, solo scoring in
+    piu' (nessuna chiamata extra). Fetch e input (symbol, interval, pivot, finestre, conferme)
+    vengono da `cfg`; dei config shadow contano pesi, soglie di scoring e `decision`.
+    """
+    symbol   = args.symbol or cfg.get("symbol", "ETHUSDT")
+    interval = args.interval or cfg.get("interval", "1m")
+    lookback = args.lookback_min or cfg.get("lookback_min", 60)
+    thresholds = cfg.get("thresholds", {}) or {}
+    model = model_for(cfg)  # pesi/soglie compilati una volta per config (daemon: riusato a ogni tick)
+    # break pivot/VWAP confermati dopo N chiusure oltre il livello (stato per barra tra i tick del daemon)
+    n_confirm = int(thresholds.get("breakout_confirm_candles", 1))
+    step_ms = breakout.interval_ms(interval)
+    book = None
+    if args.with_depth:
+        # aperto subito: connessione e sync del book procedono mentre partono le chiamate REST
+        # (aggregate: book del venue di riferimento, Binance)
+        from .data_sources import depth
+        book = depth.stream("bybit" if args.exchange == "bybit" else "binance", symbol,
+                            int(thresholds.get("book_depth_levels", 10)))
+
+    # --- Dynamic pivots selection ---
+    pivot_mode = (cfg.get("pivot_mode") or "static").lower()  # static | floor | donchian
+    donch_win  = int(thresholds.get("donchian_window", 55))
+
+    # fallback static (se dinamico fallisce)
+    piv_primary = cfg.get("levels", {}).get("pivot_primary", 3980.0)
+    piv_secondary_low  = cfg.get("levels", {}).get("pivot_secondary_low", None)
+    piv_secondary_low2 = cfg.get("levels", {}).get("pivot_secondary_low2", None)
+
+    async def dynamic_pivots(exchange: str):
+        """(primary, secondary_low, secondary_low2) dinamici, None se non disponibili (restano gli static)."""
+        try:
+            if pivot_mode == "floor":
+                pv = await (compute_floor_pivots_binance(symbol, api=api) if exchange == "binance"
+                            else compute_floor_pivots_bybit(symbol))
+                if pv:
+                    if args.debug:
+                        log(f"floor pivots: P={pv['P']:.2f} S1={pv['S1']:.2f} S2={pv['S2']:.2f}")
+                    return pv["P"], pv["S1"], pv["S2"]
+            elif pivot_mode == "donchian":
+                pv = await (compute_donchian_pivots_binance(symbol, window=donch_win, interval="1h", api=api)
+                            if exchange == "binance"
+                            else compute_donchian_pivots_bybit(symbol, window=donch_win, interval="1h"))
+                if pv:
+                    if args.debug:
+                        log(f"donchian pivots: Mid={pv['P']:.2f} Ln={pv['Ln']:.2f} Hn={pv['Hn']:.2f}")
+                    return pv["P"], pv["Ln"], None  # opzionale: pv["Hn"]
+        except Exception as e:
+            if args.debug:
+                log(f"dynamic pivot error ({exchange}): {type(e).__name__}: {e}")
+        return None
+
+    venues = None
+    if args.exchange == "aggregate":
+        from . import aggregate
+        # tutte le chiamate dei due venue + i pivot in un solo round di richieste concorrenti
+        with timing.stage("fetch"):
+            utc_now = int(clock())
+            limit_1m = min(1440, max(1, int((utc_now % 86400) / 60)) + 1)
+            venues, pv = await asyncio.gather(aggregate.fetch(symbol, interval, lookback, limit_1m),
+                                              dynamic_pivots("binance"))
+            if pv is None and pivot_mode in ("floor", "donchian"):
+                pv = await dynamic_pivots("bybit")
+    else:
+        with timing.stage("pivots"):
+            pv = await dynamic_pivots(args.exchange)
+    if pv:
+        piv_primary, piv_secondary_low, piv_secondary_low2 = pv
+
+    if args.debug:
+        log(f"symbol={symbol} interval={interval} lookback={lookback} exchange={args.exchange}")
+        log(f"pivot_mode={pivot_mode} -> primary={piv_primary:.2f}")
+        log(f"SANTIMENT_API_KEY set? {'yes' if os.getenv('SANTIMENT_API_KEY') else 'no'}")
+
+    # --- default sicuri ---
+    funding_rate = 0.0
+    oi_drop_pct  = 0.0
+    oi_rise_pct  = 0.0
+    liq_usd      = 0.0
+    cvd_slope    = 0.0
+    broke_pivot_down = False
+    broke_pivot_up   = False
+
+    # VWAP defaults
+    above_vwap = False
+    broke_vwap_up = False
+    broke_vwap_down = False
+    vwap_distance_pct = 0.0
+
+    # ===== Exchange: BINANCE =====
+    if args.exchange == "binance":
+        with timing.stage("funding"):
+            # --- Funding ---
+            try:
+                fr = await api.get_funding_rates(symbol, limit=1)
+                funding_rate = float(fr[0]["fundingRate"]) if fr else 0.0
+            except Exception as e:
+                if args.debug: log(f"funding_rates error: {type(e).__name__}: {e}")
+
+        with timing.stage("open_interest"):
+            # --- Open Interest (7d hourly) ---
+            try:
+                oi_hist = await api.get_open_interest_hist(symbol, period="1h", limit=168)
+                oi_vals = [float(x["sumOpenInterest"]) for x in oi_hist] if oi_hist else []
+                if oi_vals:
+                    cur    = oi_vals[-1]
+                    peak   = max(oi_vals)
+                    trough = min(oi_vals)
+                    if peak > 0:
+                        oi_drop_pct = (peak - cur) / peak * 100.0
+                    if trough > 0 and cur >= trough:
+                        oi_rise_pct = (cur - trough) / trough * 100.0
+            except Exception as e:
+                if args.debug: log(f"open_interest_hist error: {type(e).__name__}: {e}")
+
+        with timing.stage("liquidations"):
+            # --- Liquidazioni (robust fallback: senza start/end) ---
+            try:
+                liqs = await api.get_all_liquidations(symbol=symbol, limit=200)
+                for L in liqs:
+                    price = float(L.get("avgPrice") or L.get("price", 0.0) or 0.0)
+                    qty   = float(L.get("executedQty") or L.get("origQty", 0.0) or 0.0)
+                    liq_usd += price * qty
+            except httpx.HTTPStatusError:
+                liq_usd = 0.0  # degrada senza crash
+            except Exception as e:
+                if args.debug: log(f"allForceOrders error: {type(e).__name__}: {e}")
+
+        with timing.stage("klines"):
+            # --- CVD proxy + breakout pivot ---
+            try:
+                kl = await api.get_klines(symbol, interval=interval, limit=max(lookback, 30))
+                taker_buy = [float(k[9]) for k in kl] if kl else []
+                total     = [float(k[5]) for k in kl] if kl else []
+                cvd_series, acc = [], 0.0
+                for tb, tot in zip(taker_buy, total):
+                    delta = (tb - (tot - tb))
+                    acc  += delta
+                    cvd_series.append(acc)
+                # usa finestra da config per ridurre rumore
+                cfg_win = int(thresholds.get("cvd_window_min", 60))
+                window = min(cfg_win, len(cvd_series))
+                cvd_slope = (cvd_series[-1] - cvd_series[-window]) / window if window >= 2 else 0.0
+
+                # usa pivot dinamico
+                piv = piv_primary
+                times  = [int(k[0]) for k in kl]
+                closes = [float(k[4]) for k in kl]
+                broke_pivot_up, broke_pivot_down = breakout.tracker(
+                    ("binance", symbol, interval, "pivot"), n_confirm, step_ms).update(times, closes, [piv] * len(kl))
+            except Exception as e:
+                if args.debug: log(f"klines/cvd/pivot error: {type(e).__name__}: {e}")
+
+        with timing.stage("vwap"):
+            # --- VWAP intraday (ancorato a UTC day-start) ---
+            try:
+                # calcola quante candele 1m dalla mezzanotte UTC
+                utc_now = int(clock())
+                utc_day_start = utc_now - (utc_now % 86400)  # 00:00:00 UTC
+                minutes_since_day_start = max(1, int((utc_now - utc_day_start) / 60))
+                limit_1m = min(1440, minutes_since_day_start + 1)
+
+                kl1m = await api.get_klines(symbol, interval="1m", limit=limit_1m)
+                num, den = 0.0, 0.0
+                bars_1m = []
+                for k in kl1m:
+                    high = float(k[2]); low = float(k[3]); close = float(k[4]); vol = float(k[5])
+                    tp = (high + low + close) / 3.0
+                    num += tp * vol
+                    den += vol
+                    bars_1m.append((int(k[0]), tp, vol))
+                vwap = (num / den) if den > 0 else float('nan')
+
+                # riusa le close del timeframe scelto (stage klines)
+                times  = [int(k[0]) for k in kl] if 'kl' in locals() else []
+                closes = [float(k[4]) for k in kl] if 'kl' in locals() else []
+                last_close = closes[-1] if closes else 0.0
+
+                if vwap == vwap:  # NaN-safe
+                    above_vwap = (last_close > vwap)
+                    # livello per barra: VWAP cumulato alla chiusura di ciascuna (l'ultima = vwap)
+                    broke_vwap_up, broke_vwap_down = breakout.tracker(
+                        ("binance", symbol, interval, "vwap"), n_confirm, step_ms).update(
+                        times, closes, breakout.running_vwap(times, step_ms, bars_1m))
+                    vwap_distance_pct = (abs(last_close - vwap) / vwap * 100.0) if vwap != 0 else 0.0
+                else:
+                    above_vwap = False
+                    broke_vwap_up = False
+                    broke_vwap_down = False
+                    vwap_distance_pct = 0.0
+            except Exception as e:
+                if args.debug: log(f"vwap calc error: {type(e).__name__}: {e}")
+                above_vwap = False
+                broke_vwap_up = False
+                broke_vwap_down = False
+                vwap_distance_pct = 0.0
+
+    # ===== Aggregato: BINANCE + BYBIT =====
+    elif args.exchange == "aggregate":
+        with timing.stage("aggregate"):
+            agg, venue_summary = aggregate.build_inputs(venues, piv_primary, thresholds, step_ms,
+                                                        key=("aggregate", symbol, interval))
+            funding_rate      = agg["funding_rate"]
+            oi_drop_pct       = agg["oi_drop_pct"]
+            oi_rise_pct       = agg["oi_rise_pct"]
+            liq_usd           = agg["liq_usd_15m"]
+            cvd_slope         = agg["cvd_slope"]
+            broke_pivot_down  = agg["broke_pivot_down"]
+            broke_pivot_up    = agg["broke_pivot_up"]
+            above_vwap        = agg["above_vwap"]
+            broke_vwap_up     = agg["broke_vwap_up"]
+            broke_vwap_down   = agg["broke_vwap_down"]
+            vwap_distance_pct = agg["vwap_distance_pct"]
+            if args.debug:
+                for name, v in venue_summary.items():
+                    if v["errors"]:
+                        log(f"aggregate {name} errors: {v['errors']}")
+
+    # ===== Exchange: BYBIT =====
+    else:
+        from .data_sources import bybit as byapi
+        with timing.stage("funding"):
+            # --- Funding ---
+            try:
+                frj = await byapi.get_funding_history(symbol, category="linear", limit=1)
+                funding_rate = float(frj.get("result", {}).get("list", [{"fundingRate": 0.0}])[-1]["fundingRate"])
+            except Exception as e:
+                if args.debug: log(f"bybit funding_history error: {type(e).__name__}: {e}")
+
+        with timing.stage("open_interest"):
+            # --- Open Interest (7d hourly) ---
+            try:
+                oij = await byapi.get_open_interest(symbol, interval="1h", category="linear", limit=168)
+                lst = oij.get("result", {}).get("list", [])
+                vals = [float(x["openInterest"]) for x in lst]
+                if vals:
+                    cur    = vals[-1]
+                    peak   = max(vals)
+                    trough = min(vals)
+                    if peak > 0:
+                        oi_drop_pct = (peak - cur) / peak * 100.0
+                    if trough > 0 and cur >= trough:
+                        oi_rise_pct = (cur - trough) / trough * 100.0
+            except Exception as e:
+                if args.debug: log(f"bybit open_interest error: {type(e).__name__}: {e}")
+
+        # --- Klines Bybit per break pivot + VWAP ---
+        try:
+            with timing.stage("klines"):
+                # klines sul timeframe richiesto per determinare close e break pivot
+                kl_by = await byapi.get_klines(symbol, interval=interval, category="linear", limit=max(lookback, 30))
+                # struttura bybit: [start, open, high, low, close, volume, turnover]
+                times  = [int(k[0]) for k in kl_by]
+                closes = [float(k[4]) for k in kl_by]
+                last_close = closes[-1] if closes else 0.0
+
+                # usa pivot dinamico
+                piv = piv_primary
+                broke_pivot_up, broke_pivot_down = breakout.tracker(
+                    ("bybit", symbol, interval, "pivot"), n_confirm, step_ms).update(times, closes, [piv] * len(kl_by))
+
+            with timing.stage("vwap"):
+                # VWAP intraday Bybit (1m dal giorno UTC)
+                utc_now = int(clock())
+                utc_day_start = utc_now - (utc_now % 86400)
+                minutes_since_day_start = max(1, int((utc_now - utc_day_start) / 60))
+                limit_1m = min(1440, minutes_since_day_start + 1)
+
+                kl1m_by = await byapi.get_klines(symbol, interval="1m", category="linear", limit=limit_1m)
+
+                num, den = 0.0, 0.0
+                bars_1m = []
+                for k in kl1m_by:
+                    high = float(k[2]); low = float(k[3]); close = float(k[4]); vol = float(k[5])
+                    tp = (high + low + close) / 3.0
+                    num += tp * vol
+                    den += vol
+                    bars_1m.append((int(k[0]), tp, vol))
+                vwap = (num / den) if den > 0 else float('nan')
+
+                if vwap == vwap:
+                    above_vwap = (last_close > vwap)
+                    broke_vwap_up, broke_vwap_down = breakout.tracker(
+                        ("bybit", symbol, interval, "vwap"), n_confirm, step_ms).update(
+                        times, closes, breakout.running_vwap(times, step_ms, bars_1m))
+                    vwap_distance_pct = (abs(last_close - vwap) / vwap * 100.0) if vwap != 0 else 0.0
+                else:
+                    above_vwap = False
+                    broke_vwap_up = False
+                    broke_vwap_down = False
+                    vwap_distance_pct = 0.0
+
+            # CVD proxy: Bybit kline non espone taker_buy (per WS aggiungeremo in futuro)
+            cvd_slope = 0.0
+        except Exception as e:
+            if args.debug: log(f"bybit klines/vwap/pivot error: {type(e).__name__}: {e}")
+            liq_usd = 0.0
+            cvd_slope = 0.0
+            broke_pivot_down = False
+            broke_pivot_up   = False
+            above_vwap = False
+            broke_vwap_up = False
+            broke_vwap_down = False
+            vwap_distance_pct = 0.0
+
+    # --- Whales (opzionale; richiede SANTIMENT_API_KEY e flag) ---
+    whales_net_selling = None
+    if args.with_whales and os.getenv("SANTIMENT_API_KEY"):
+        from .data_sources import santiment as snt
+        with timing.stage("santiment"):
+            try:
+                # serie giornaliera: dalla cache fino al prossimo punto (una richiesta al giorno)
+                slug = snt.slug_for(symbol)
+                if slug:
+                    whales_net_selling = (await snt.whales_net_selling([slug]))[slug]
+                if args.debug:
+                    log(f"santiment {slug}: whales_net_selling={whales_net_selling} usage={snt.client().usage()}")
+            except Exception as e:
+                if args.debug: log(f"santiment whales error: {type(e).__name__}: {e}")
+                whales_net_selling = None
+
+    # Fallback "whales" se Santiment non ha dato segnale
+    with timing.stage("whales_fallback"):
+        if whales_net_selling is None:
+            try:
+                # Usa 4h x ~7d ≈ 42 barre (usiamo 60 per stare larghi)
+                top = await api.get_top_accounts_long_short_ratio(symbol, period=WHALES_RATIO_PERIOD,
+                                                                  limit=WHALES_RATIO_POINTS)
+                # longShortRatio > 1 -> long dominance; <1 -> short dominance
+                ratios = [float(x.get("longShortRatio", 0.0)) for x in top if x.get("longShortRatio") is not None]
+                if len(ratios) >= 2:
+                    first, last = ratios[0], ratios[-1]
+                    # Variazione percentuale richiesta dal config
+                    min_change = float(thresholds.get("whales_ratio_min_change_pct", 8.0))
+                    change_pct = ((last - first) / first * 100.0) if first > 0 else 0.0
+                    if abs(change_pct) >= min_change:
+                        whales_net_selling = (last < first)  # True=bear, False=bull
+                        if args.debug:
+                            dir_str = "net_selling" if whales_net_selling else "net_buying"
+                            log(f"fallback whales L/S change={change_pct:.2f}% (>= {min_change}%) -> {dir_str}")
+                    else:
+                        whales_net_selling = None  # variazione troppo piccola
+                        if args.debug:
+                            log(f"fallback whales L/S change too small: {change_pct:.2f}% (< {min_change}%) -> no-signal")
+            except Exception as e:
+                if args.debug: log(f"fallback whales ratio error: {type(e).__name__}: {e}")
+                whales_net_selling = None
+
+    # --- On-chain Glassnode (opzionale, --with-onchain): dallo store locale, refresh incrementale ---
+    exchange_netflow_7d = None
+    onchain = None
+    if args.with_onchain:
+        from .data_sources import glassnode as gn
+        with timing.stage("glassnode"):
+            try:
+                onchain = await gn.snapshot(symbol, clock=clock)
+                exchange_netflow_7d = onchain["exchange_netflow_7d"]
+                if args.debug:
+                    log(f"glassnode {gn.asset_for(symbol)}: {onchain}")
+            except Exception as e:
+                if args.debug: log(f"glassnode error: {type(e).__name__}: {e}")
+
+    # --- Order book (opzionale, --with-depth): book locale da WebSocket, aggiornato in background ---
+    book_imbalance = microprice_skew = None
+    depth_out = None
+    if book is not None:
+        with timing.stage("depth"):
+            try:
+                await book.wait_synced(depth.SYNC_TIMEOUT_S)   # immediato se gia' sincronizzato
+                depth_out = book.metrics()
+                book_imbalance, microprice_skew = depth_out["book_imbalance"], depth_out["microprice_skew"]
+                if args.debug:
+                    log(f"depth {book.name}: {depth_out}")
+            except Exception as e:
+                if args.debug: log(f"depth error: {type(e).__name__}: {e}")
+
+    # --- Build inputs e compute ---
+    x = SignalInputs(
+        funding_rate=funding_rate,
+        oi_drop_pct=oi_drop_pct,
+        oi_rise_pct=oi_rise_pct,
+        liq_usd_15m=liq_usd,
+        cvd_slope=cvd_slope,
+        broke_pivot_down=broke_pivot_down,
+        broke_pivot_up=broke_pivot_up,
+        above_vwap=above_vwap,
+        broke_vwap_up=broke_vwap_up,
+        broke_vwap_down=broke_vwap_down,
+        vwap_distance_pct=vwap_distance_pct,
+        whales_net_selling_7d=whales_net_selling,
+        exchange_netflow_7d=exchange_netflow_7d,
+        book_imbalance=book_imbalance,
+        microprice_skew=microprice_skew
+    )
+    with timing.stage("compute_score"):
+        out = model.evaluate(x)
+
+    result = {
+        "symbol": symbol,
+        "exchange": args.exchange,
+        "inputs": x.__dict__,
+        "score": out["score"],        # {"bear": X, "bull": Y}
+        "decision": out["decision"],  # BUY / SELL / NEUTRAL
+        "reasons": out["reasons"]     # motivi (lato vincente o entrambi se neutrale)
+    }
+    if venues is not None:
+        result["venues"] = venue_summary  # componenti per venue (modalita' aggregate)
+    if onchain is not None:
+        result["onchain"] = onchain
+    if depth_out is not None:
+        result["depth"] = depth_out
+    if shadows:
+        with timing.stage("shadow_score"):
+            result["shadows"] = {label: model_for(scfg).evaluate(x) for label, scfg in shadows.items()}
+    return result
+
+async def evaluate_timed(args: argparse.Namespace, cfg: Dict[str, Any], collect: bool,
+                         shadows: Optional[Dict[str, Dict[str, Any]]] = None):
+    """evaluate() con collector di latenza attivo; ritorna (output, timings dict | None)."""
+    if not collect:
+        return await evaluate(args, cfg, shadows=shadows), None
+    tm = timing.Timings()
+    with timing.collect(tm):
+        out = await evaluate(args, cfg, shadows=shadows)
+    return out, tm.as_dict()
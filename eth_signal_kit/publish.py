@@ -0,0 +1,219 @@
+from __future__ import annotations
+import asyncio, json, mmap, os, struct, sys, time
+from typing import Dict, Any, List, Optional, Callable
+
+from . import metrics
+
+# ----------------------------
+# Encoding
+# ----------------------------
+# pretty  : JSON indentato (output storico della CLI one-shot, senza envelope)
+# ndjson  : una riga JSON compatta per decisione, con seq/ts
+# msgpack : binario (richiede `pip install msgpack`), stream auto-delimitato
+FORMATS = ("pretty", "ndjson", "msgpack")
+
+def _encoder(fmt: str) -> Callable[[Dict[str, Any]], bytes]:
+    if fmt == "pretty":
+        return lambda d: (json.dumps(d, indent=2) + "\n").encode()
+    if fmt == "ndjson":
+        return lambda d: (json.dumps(d, separators=(",", ":")) + "\n").encode()
+    if fmt == "msgpack":
+        try:
+            import msgpack
+        except ImportError as e:
+            raise RuntimeError("--output msgpack richiede il pacchetto 'msgpack'") from e
+        return msgpack.Packer(use_bin_type=True).pack
+    raise ValueError(f"formato sconosciuto: {fmt}")
+
+# ----------------------------
+# Sinks
+# ----------------------------
+class StdoutSink:
+    def __init__(self):
+        self.out = sys.stdout.buffer
+
+    async def start(self):
+        pass
+
+    def send(self, payload: bytes, msg: Dict[str, Any]):
+        self.out.write(payload)
+        self.out.flush()
+
+    async def close(self):
+        pass
+
+class UnixSocketSink:
+    """
+    Server Unix domain socket: ogni client connesso riceve lo stream (NDJSON o msgpack).
+    I client lenti (buffer > max_buffer byte) vengono disconnessi per non bloccare il loop.
+    """
+    def __init__(self, path: str, max_buffer: int = 1 << 20):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.clients: List[asyncio.StreamWriter] = []
+        self.server: Optional[asyncio.AbstractServer] = None
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self.server = await asyncio.start_unix_server(self._on_client, path=self.path)
+
+    async def _on_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.clients.append(writer)
+        try:
+            await reader.read()  # attende la chiusura lato client
+        finally:
+            if writer in self.clients:
+                self.clients.remove(writer)
+            writer.close()
+
+    def send(self, payload: bytes, msg: Dict[str, Any]):
+        for w in list(self.clients):
+            if w.is_closing() or w.transport.get_write_buffer_size() > self.max_buffer:
+                self.clients.remove(w)
+                w.close()
+                continue
+            w.write(payload)
+        metrics.QUEUE_DEPTH.set(sum(w.transport.get_write_buffer_size() for w in self.clients),
+                                queue=f"unix:{self.path}")
+
+    async def close(self):
+        for w in self.clients:
+            w.close()
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+class LocalBus:
+    """
+    Pub/sub in-process (stand-in di un broker): ogni subscriber ha una coda limitata;
+    se piena si scarta il messaggio piu' vecchio (conta l'ultima decisione).
+    Riceve i dict, non i byte: nessun encode per i consumer nello stesso processo.
+    """
+    def __init__(self, maxsize: int = 1024, name: str = "bus"):
+        self.maxsize = maxsize
+        self.name = name
+        self.queues: List[asyncio.Queue] = []
+
+    def subscribe(self) -> asyncio.Queue:
+        q: asyncio.Queue = asyncio.Queue(self.maxsize)
+        self.queues.append(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue):
+        if q in self.queues:
+            self.queues.remove(q)
+
+    async def start(self):
+        pass
+
+    def send(self, payload: bytes, msg: Dict[str, Any]):
+        for q in self.queues:
+            if q.full():
+                q.get_nowait()
+            q.put_nowait(msg)
+        metrics.QUEUE_DEPTH.set(max((q.qsize() for q in self.queues), default=0), queue=self.name)
+
+    async def close(self):
+        pass
+
+# Slot in memoria condivisa (mmap su file, es. /dev/shm/etherpulse):
+# header = seq (u64, seqlock: dispari = scrittura in corso) + len (u32), poi il payload.
+_SHM_HEADER = struct.Struct("<QI")
+
+class ShmSink:
+    """Ultima decisione in un'area mmap; i consumer fanno polling su `seq` (vedi ShmReader)."""
+    def __init__(self, path: str, size: int = 1 << 16):
+        self.path = path
+        self.size = size
+        self.mm: Optional[mmap.mmap] = None
+        self.version = 0
+
+    async def start(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            os.ftruncate(fd, self.size)
+            self.mm = mmap.mmap(fd, self.size)
+        finally:
+            os.close(fd)
+
+    def send(self, payload: bytes, msg: Dict[str, Any]):
+        n = len(payload)
+        if n > self.size - _SHM_HEADER.size:
+            raise ValueError(f"payload {n}B oltre la dimensione dello slot shm ({self.size}B)")
+        self.version += 1
+        _SHM_HEADER.pack_into(self.mm, 0, 2 * self.version - 1, n)   # scrittura in corso
+        self.mm[_SHM_HEADER.size:_SHM_HEADER.size + n] = payload
+        _SHM_HEADER.pack_into(self.mm, 0, 2 * self.version, n)       # pubblicato
+
+    async def close(self):
+        if self.mm is not None:
+            self.mm.close()
+
+class ShmReader:
+    """Lettore dello slot ShmSink: read() ritorna il payload se e' cambiato dall'ultima lettura."""
+    def __init__(self, path: str):
+        with open(path, "r+b") as f:
+            self.mm = mmap.mmap(f.fileno(), 0)
+        self.last = 0
+
+    def read(self) -> Optional[bytes]:
+        while True:
+            seq, n = _SHM_HEADER.unpack_from(self.mm, 0)
+            if seq == self.last or seq == 0:
+                return None
+            if seq & 1:
+                continue  # writer a meta' scrittura
+            data = bytes(self.mm[_SHM_HEADER.size:_SHM_HEADER.size + n])
+            if _SHM_HEADER.unpack_from(self.mm, 0)[0] == seq:
+                self.last = seq
+                return data
+
+def make_sink(target: str):
+    """stdout | unix:/percorso.sock | shm:/dev/shm/nome | bus"""
+    if target == "stdout":
+        return StdoutSink()
+    if target == "bus":
+        return LocalBus()
+    kind, _, path = target.partition(":")
+    if kind == "unix" and path:
+        return UnixSocketSink(path)
+    if kind == "shm" and path:
+        return ShmSink(path)
+    raise ValueError(f"target di pubblicazione non valido: {target}")
+
+# ----------------------------
+# Publisher
+# ----------------------------
+class Publisher:
+    """
+    Codifica una volta ogni decisione e la inoltra a tutti i sink.
+    Nei formati compatti aggiunge `seq` (monotono per processo), `ts_ns` (wall clock)
+    e `mono_ns` (clock monotono) per misurare la latenza lato consumer.
+    """
+    def __init__(self, sinks: List[Any], fmt: str = "ndjson"):
+        self.sinks = sinks
+        self.fmt = fmt
+        self.encode = _encoder(fmt)
+        self.seq = 0
+
+    async def start(self):
+        for s in self.sinks:
+            await s.start()
+
+    def publish(self, out: Dict[str, Any]) -> Dict[str, Any]:
+        if self.fmt == "pretty":
+            msg = out
+        else:
+            self.seq += 1
+            msg = {"seq": self.seq, "ts_ns": time.time_ns(), "mono_ns": time.monotonic_ns(), **out}
+        payload = self.encode(msg)
+        for s in self.sinks:
+            s.send(payload, msg)
+        return msg
+
+    async def close(self):
+        for s in self.sinks:
+            await s.close()
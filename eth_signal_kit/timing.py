@@ -0,0 +1,161 @@
+from __future__ import annotations
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Deque
+
+# ----------------------------
+# Timing per singola valutazione
+# ----------------------------
+# Fasi HTTP riportate per ogni chiamata (ms). "setup" = creazione client (contesto SSL).
+# Il DNS e' incluso in "connect": httpcore risolve il nome dentro connect_tcp
+# e non espone un evento separato.
+HTTP_STAGES = ("setup", "connect", "tls", "send", "wait", "transfer", "parse")
+
+# evento trace httpcore (senza prefisso http11./http2./connection.) -> fase
+_TRACE_STAGE = {
+    "connect_tcp": "connect",
+    "start_tls": "tls",
+    "send_request_headers": "send",
+    "send_request_body": "send",
+    "receive_response_headers": "wait",
+    "receive_response_body": "transfer",
+}
+
+_current: ContextVar[Optional["Timings"]] = ContextVar("eth_signal_kit_timings", default=None)
+
+def current() -> Optional["Timings"]:
+    """Collector attivo nel task corrente (None = timing disattivato, zero overhead)."""
+    return _current.get()
+
+class HttpTiming:
+    """Breakdown di una chiamata HTTP; `trace` va passato come extension httpx."""
+    __slots__ = ("label", "stage", "status", "attempt", "source", "age_s", "ms", "_open")
+
+    def __init__(self, label: str, stage: Optional[str]):
+        self.label = label
+        self.stage = stage
+        self.status: Optional[int] = None
+        self.attempt = 0                 # 0 = primo tentativo, >0 = retry
+        self.source = "net"              # net | hedge | stale (last-known value, nessuna richiesta)
+        self.age_s: Optional[float] = None
+        self.ms: Dict[str, float] = dict.fromkeys(HTTP_STAGES, 0.0)
+        self.ms["total"] = 0.0
+        self._open: Dict[str, float] = {}
+
+    async def trace(self, event: str, info: Dict[str, Any]) -> None:
+        # event: "<prefix>.<name>.<started|complete|failed>"
+        head, _, phase = event.rpartition(".")
+        name = head.split(".", 1)[-1]
+        if phase == "started":
+            self._open[name] = time.perf_counter()
+        else:
+            t0 = self._open.pop(name, None)
+            stage = _TRACE_STAGE.get(name)
+            if t0 is not None and stage is not None:
+                self.ms[stage] += (time.perf_counter() - t0) * 1000.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        d = {"label": self.label, "stage": self.stage, "status": self.status,
+             "attempt": self.attempt, "source": self.source}
+        if self.age_s is not None:
+            d["age_s"] = self.age_s
+        return {**d, **{f"{k}_ms": round(v, 3) for k, v in self.ms.items()}}
+
+class Timings:
+    """
+    Raccoglie la durata dei blocchi di una valutazione (funding, oi, klines, ...)
+    e il breakdown di ogni chiamata HTTP fatta al loro interno.
+    """
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+        self.http: List[HttpTiming] = []
+        self._stage: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str):
+        prev, self._stage = self._stage, name
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + (time.perf_counter() - t0) * 1000.0
+            self._stage = prev
+
+    def http_call(self, label: str) -> HttpTiming:
+        rec = HttpTiming(label, self._stage)
+        self.http.append(rec)
+        return rec
+
+    def as_dict(self) -> Dict[str, Any]:
+        # compute = tempo del blocco non speso in I/O HTTP (parsing incluso nell'HTTP)
+        io_ms: Dict[str, float] = {}
+        for h in self.http:
+            io_ms[h.stage] = io_ms.get(h.stage, 0.0) + h.ms["total"]
+        stages = {
+            name: {"total_ms": round(ms, 3),
+                   "http_ms": round(io_ms.get(name, 0.0), 3),
+                   "compute_ms": round(max(0.0, ms - io_ms.get(name, 0.0)), 3)}
+            for name, ms in self.stages.items()
+        }
+        return {
+            "total_ms": round((time.perf_counter() - self.t0) * 1000.0, 3),
+            "stages": stages,
+            "http": [h.as_dict() for h in self.http],
+        }
+
+@contextmanager
+def collect(timings: Optional[Timings]):
+    """Attiva `timings` come collector per il task corrente (None -> no-op)."""
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def stage(name: str):
+    """Come Timings.stage sul collector attivo; no-op se il timing e' spento."""
+    t = _current.get()
+    if t is None:
+        yield
+    else:
+        with t.stage(name):
+            yield
+
+# ----------------------------
+# Istogrammi (daemon mode)
+# ----------------------------
+def _pct(xs: List[float], p: float) -> float:
+    return xs[min(len(xs) - 1, int(p * len(xs)))]
+
+class LatencyStats:
+    """Finestra scorrevole di campioni (ms) per chiave, con percentili su richiesta."""
+    def __init__(self, maxlen: int = 2048):
+        self.maxlen = maxlen
+        self.samples: Dict[str, Deque[float]] = {}
+
+    def add(self, key: str, ms: float) -> None:
+        q = self.samples.get(key)
+        if q is None:
+            q = self.samples[key] = deque(maxlen=self.maxlen)
+        q.append(ms)
+
+    def add_timings(self, t: Dict[str, Any]) -> None:
+        """Accumula l'output di Timings.as_dict()."""
+        self.add("evaluation", t["total_ms"])
+        for name, s in t["stages"].items():
+            self.add(f"stage.{name}", s["total_ms"])
+        for h in t["http"]:
+            for st in HTTP_STAGES + ("total",):
+                self.add(f"http.{h['label']}.{st}", h[f"{st}_ms"])
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        out = {}
+        for key, q in sorted(self.samples.items()):
+            xs = sorted(q)
+            out[key] = {"n": len(xs), "p50": round(_pct(xs, 0.50), 3), "p90": round(_pct(xs, 0.90), 3),
+                        "p99": round(_pct(xs, 0.99), 3), "max": round(xs[-1], 3)}
+        return out